@@ -1,10 +1,18 @@
 import os
+import sys
 import pandas as pd
 import folium
-import plotly.express as px
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename as _secure_filename
 from datetime import datetime, timedelta
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portal import charts, columnar, figures, ingest
+from portal.gazetteer import Gazetteer
+from portal.manifest import SetManifest
+from portal.geocoder import Geocoder
+from portal.render import render_all
+from portal.search import DateIndex, day_range, epoch_dates, parse_epoch
+
 pincode_coords = {
     "400078": [19.1011, 72.8376], "410206": [19.0330, 73.0297], "401105": [19.3000, 72.8500],
     "360001": [22.3039, 70.8022], "421301": [19.2333, 73.1333], "400003": [18.9500, 72.8333],
@@ -23,44 +31,48 @@ city_coords = {
     "Vashi": [19.0771, 72.9986], "Sion": [19.0400, 72.8600], "Ambdiha": [22.8000, 85.3333]
 }
 
+geocoder = Geocoder(pincode_coords, city_coords, gazetteer=Gazetteer.from_env())
+
+manifest = SetManifest('/tmp/Uploads')
+
 def get_next_set_number():
-    set_folders = [f for f in os.listdir('/tmp/Uploads') if f.startswith('set_')]
-    return 1 if not set_folders else max(int(f.split('_')[1]) for f in set_folders) + 1
+    """Allocate a set number in the manifest; safe across concurrent invocations."""
+    return manifest.allocate()
 
 def secure_filename(filename):
-    return secure_filename(filename)
+    return _secure_filename(filename)
 
 def process_users_data(file_path):
     df = pd.read_csv(file_path, dtype={'userid': str}, usecols=['userid', 'pincode', 'locality', 'state', 'createEpoch'])
     df['pincode'] = df['pincode'].astype(str).str.extract(r'(\d{6})')
     df['city'] = df['locality'].fillna(df['state'].fillna('Mumbai'))
-    df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0])
-    df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1])
-    mask = df['latitude'].isna() | df['longitude'].isna()
-    df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-    df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
+    geocoder.assign(df)
     return df.dropna(subset=['latitude', 'longitude'])
 
+# read_csv options shared by the whole-file loaders and streamed chunks; a chunk
+# without any pincode would otherwise read user_pincode as float.
+DEALS_FULL_CSV_OPTIONS = {'usecols': ['user_id', 'user_pincode', 'req_qty', 'created_at'], 'dtype': {'user_pincode': str}}
+DEALS_CSV_OPTIONS = {'usecols': ['user_id', 'user_pincode', 'req_qty', 'created_at', 'dealerinfo.coname', 'dealerinfo.dealer_id'],
+                     'dtype': {'user_pincode': str}}
+
 def process_deals_full_data(file_path):
-    df = pd.read_csv(file_path, usecols=['user_id', 'user_pincode', 'req_qty', 'created_at'])
+    return clean_deals_full_data(pd.read_csv(file_path, **DEALS_FULL_CSV_OPTIONS))
+
+def clean_deals_full_data(df):
     df['pincode'] = df['user_pincode'].fillna('').astype(str).str.extract(r'(\d{6})')
     df['city'] = df['user_pincode'].fillna('').str.split(',').str[0].str.strip().replace('', 'Mumbai')
-    df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0] if pd.notna(x) else None)
-    df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1] if pd.notna(x) else None)
-    mask = df['latitude'].isna() | df['longitude'].isna()
-    df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-    df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
+    df['created_epoch'] = parse_epoch(df['created_at'])
+    geocoder.assign(df)
     return df.dropna(subset=['latitude', 'longitude'])
 
 def process_deals_data(file_path):
-    df = pd.read_csv(file_path, usecols=['user_id', 'user_pincode', 'req_qty', 'created_at', 'dealerinfo.coname', 'dealerinfo.dealer_id'])
+    return clean_deals_data(pd.read_csv(file_path, **DEALS_CSV_OPTIONS))
+
+def clean_deals_data(df):
     df['pincode'] = df['user_pincode'].str.extract(r'(\d{6})')
-    df['city'] = df['user_pincode'].str.split(',').str[0].str.strip()
-    df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0] if pd.notna(x) else None)
-    df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1] if pd.notna(x) else None)
-    mask = df['latitude'].isna() | df['longitude'].isna()
-    df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-    df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
+    df['city'] = df['user_pincode'].str.extract(r'^([^,]*)', expand=False).str.strip()
+    df['created_epoch'] = parse_epoch(df['created_at'])
+    geocoder.assign(df)
     return df.dropna(subset=['latitude', 'longitude'])
 
 def process_dealers_data(file_path):
@@ -126,42 +138,56 @@ def create_new_users_map(users_df):
 def create_graphs(deals_df, dealers_df, users_df):
     if deals_df.empty or dealers_df.empty or users_df.empty:
         return ({'data': [], 'layout': {}},) * 5
-    fig1 = px.bar(deals_df.groupby('pincode').size().reset_index(name='users'), x='pincode', y='users', title="Users per Pincode", color_discrete_sequence=['#1f77b4'], template='plotly_dark')
-    fig2 = px.bar(dealers_df.groupby('pincode').size().reset_index(name='dealers'), x='pincode', y='dealers', title="Dealers per Pincode", color_discrete_sequence=['#ff7f0e'], template='plotly_dark')
-    fig3 = px.bar(deals_df, x='user_id', y='req_qty', title="Deal Requests per User", color='pincode', template='plotly_dark')
-    fig4 = px.bar(dealers_df.assign(cat_disp_names=dealers_df['cat_disp_names'].str.split(r' \| ')).explode('cat_disp_names'), x='coname', y='cat_disp_names', title="Dealer Product Categories", color='pincode', template='plotly_dark')
+    fig1 = figures.bar(deals_df.groupby('pincode').size().reset_index(name='users'), x='pincode', y='users', title="Users per Pincode", color_discrete='#1f77b4')
+    fig2 = figures.bar(dealers_df.groupby('pincode').size().reset_index(name='dealers'), x='pincode', y='dealers', title="Dealers per Pincode", color_discrete='#ff7f0e')
+    user_totals, user_order = charts.user_totals(deals_df)
+    fig3 = figures.bar(user_totals, x='user_id', y='req_qty', title="Deal Requests per User", color='pincode', category_orders={'user_id': user_order})
+    fig4 = figures.bar(dealers_df.assign(cat_disp_names=dealers_df['cat_disp_names'].str.split(r' \| ')).explode('cat_disp_names'), x='coname', y='cat_disp_names', title="Dealer Product Categories", color='pincode')
     current_date = datetime(2025, 4, 15)
     thirty_days_ago = current_date - timedelta(days=30)
-    new_users = users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())].copy()
-    new_users['onboarding_date'] = pd.to_datetime(new_users['createEpoch'], unit='s').dt.strftime('%Y-%m-%d')
-    fig5 = px.scatter(new_users, x='userid', y='onboarding_date', title="New Users Onboarding Timeline", color='pincode', template='plotly_dark')
+    onboarding = charts.daily_onboarding(users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())])
+    fig5 = figures.line(onboarding, x='onboarding_date', y='new_users', title="New Users Onboarding Timeline", color='pincode', markers=True, render_mode=charts.render_mode(len(onboarding)))
     for fig in [fig1, fig2, fig3, fig4, fig5]:
-        fig.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), xaxis=dict(tickangle=45, automargin=True), yaxis=dict(automargin=True))
-    return tuple(fig.to_json() for fig in [fig1, fig2, fig3, fig4, fig5])
-
-def filter_deals_by_date(deals_df, deals_full_df, date_str):
-    target_date = pd.to_datetime(date_str).date()
-    combined_df = pd.concat([deals_df, deals_full_df])
-    combined_df['deal_date'] = pd.to_datetime(combined_df['created_at'], errors='coerce').dt.date
-    filtered = combined_df[combined_df['deal_date'] == target_date][['user_id', 'user_name', 'pincode', 'req_qty', 'deal_date']].dropna()
+        figures.update_layout(fig, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), xaxis=dict(tickangle=45, automargin=True), yaxis=dict(automargin=True))
+    return tuple(figures.to_json(fig) for fig in [fig1, fig2, fig3, fig4, fig5])
+
+def _deal_dates(deals_df):
+    epochs = deals_df['created_epoch'] if 'created_epoch' in deals_df.columns else parse_epoch(deals_df['created_at'])
+    return epoch_dates(epochs).to_numpy()
+
+def filter_deals_by_date(deals_df, deals_full_df, date_str, date_to=None, date_index=None):
+    start, stop = day_range(date_str, date_to)
+    if date_index is None:
+        date_index = DateIndex.from_frames('created_epoch', deals_df, deals_full_df)
+    filtered = date_index.take(start, stop, deals_df, deals_full_df).copy()
+    filtered['deal_date'] = _deal_dates(filtered)
+    # user_name is not among the columns the loaders keep.
+    filtered = filtered[[col for col in ['user_id', 'user_name', 'pincode', 'req_qty', 'deal_date'] if col in filtered.columns]].dropna()
     return filtered.to_dict('records') if not filtered.empty else []
 
-def filter_dealers_by_category(dealers_df, category):
+def filter_dealers_by_category(dealers_df, category, category_index=None):
     if not category:
         return []
+    if category_index is not None:
+        return dealers_df.iloc[category_index.search(category)][['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names']].to_dict('records')
     return dealers_df[dealers_df['cat_disp_names'].str.contains(category, case=False, na=False)][['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names']].to_dict('records')
 
-def filter_dealers_by_pincode(dealers_df, pincode):
+def filter_dealers_by_pincode(dealers_df, pincode, pincode_index=None):
     if not pincode:
         return []
+    if pincode_index is not None:
+        return pincode_index.take(pincode, dealers_df)[['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names']].to_dict('records')
     return dealers_df[dealers_df['pincode'] == pincode][['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names']].to_dict('records')
 
-def filter_deals_by_pincode(deals_df, deals_full_df, dealers_df, pincode):
+def filter_deals_by_pincode(deals_df, deals_full_df, dealers_df, pincode, pincode_index=None):
     if not pincode:
         return []
-    combined_df = pd.concat([deals_df, deals_full_df])
-    combined_df['deal_date'] = pd.to_datetime(combined_df['created_at'], errors='coerce').dt.date
-    filtered = combined_df[combined_df['pincode'] == pincode]
+    if pincode_index is not None:
+        filtered = pincode_index.take(pincode, deals_df, deals_full_df).copy()
+    else:
+        combined_df = pd.concat([deals_df, deals_full_df])
+        filtered = combined_df[combined_df['pincode'] == pincode].copy()
+    filtered['deal_date'] = _deal_dates(filtered)
     results = []
     for _, deal in filtered.iterrows():
         dealer_name = deal.get('dealerinfo.coname', '')
@@ -178,28 +204,51 @@ def filter_deals_by_pincode(deals_df, deals_full_df, dealers_df, pincode):
         })
     return results
 
-def perform_analysis(deals_path, dealers_path, users_path, deals_full_path):
-    deals_df = process_deals_data(deals_path)
-    dealers_df = process_dealers_data(dealers_path)
-    users_df = process_users_data(users_path)
-    deals_full_df = process_deals_full_data(deals_full_path)
+def _no_progress(stage):
+    pass
+
+def perform_analysis(deals_path, dealers_path, users_path, deals_full_path, progress=_no_progress):
+    # KPI aggregates, updated chunk by chunk when a deal export is streamed.
+    deal_rows = ingest.RowCount()
+    deal_users = ingest.Distinct(['user_id'], dropna=True)
+    deal_pairs = ingest.Distinct(['user_id', 'req_qty'])
+    responded_pairs = ingest.Distinct(['user_id', 'req_qty'], where=lambda df: df['req_qty'] > 0)
+    progress('process_deals')
+    deals_df = ingest.load(deals_path, 'deals', process_deals_data, clean_deals_data,
+                           [deal_rows, deal_users, deal_pairs, responded_pairs], **DEALS_CSV_OPTIONS)
+    progress('process_dealers')
+    dealers_df = columnar.load_or_process(dealers_path, 'dealers', process_dealers_data)
+    progress('process_users')
+    users_df = columnar.load_or_process(users_path, 'users', process_users_data)
+    progress('process_deals_full')
+    deals_full_df = ingest.load(deals_full_path, 'deals_full', process_deals_full_data, clean_deals_full_data,
+                                [deal_rows, deal_pairs], **DEALS_FULL_CSV_OPTIONS)
     if any(df.empty for df in [deals_df, dealers_df, users_df, deals_full_df]):
         return None, "Error: No valid data found in one or more files."
-    users_map = create_users_map(deals_df)
-    dealers_map = create_dealers_map(dealers_df)
-    relation_map = create_relational_map(deals_df, dealers_df)
-    new_users_map = create_new_users_map(users_df)
-    graph1, graph2, graph3, graph4, graph5 = create_graphs(deals_df, dealers_df, users_df)
+    progress('render')
+    rendered = render_all({
+        'users_map': (create_users_map, 'deals'),
+        'dealers_map': (create_dealers_map, 'dealers'),
+        'relation_map': (create_relational_map, 'deals', 'dealers'),
+        'new_users_map': (create_new_users_map, 'users'),
+        'graphs': (create_graphs, 'deals', 'dealers', 'users')
+    }, {'deals': deals_df, 'dealers': dealers_df, 'users': users_df}, os.path.dirname(deals_path))
+    users_map = rendered['users_map']
+    dealers_map = rendered['dealers_map']
+    relation_map = rendered['relation_map']
+    new_users_map = rendered['new_users_map']
+    graph1, graph2, graph3, graph4, graph5 = rendered['graphs']
+    progress('kpis')
     total_users = users_df['userid'].nunique()
-    total_visits = len(deals_df) + len(deals_full_df)
+    total_visits = len(deal_rows)
     current_date = datetime(2025, 4, 15)
     thirty_days_ago = current_date - timedelta(days=30)
     new_users = (users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())]['userid'].nunique())
-    active_users = deals_df['user_id'].drop_duplicates().count()
-    total_deals = len(deals_df) + len(deals_full_df)
-    unique_deals = pd.concat([deals_df, deals_full_df]).drop_duplicates(subset=['user_id', 'req_qty']).shape[0]
+    active_users = len(deal_users)
+    total_deals = len(deal_rows)
+    unique_deals = len(deal_pairs)
     new_user_deal_ratio = (unique_deals / new_users * 100) if new_users > 0 else 0
-    unique_deals_with_response = deals_df[deals_df['req_qty'] > 0].drop_duplicates(subset=['user_id', 'req_qty']).shape[0]
+    unique_deals_with_response = len(responded_pairs)
     response_ratio = (unique_deals_with_response / unique_deals * 100) if unique_deals > 0 else 0
     return {
         'users_map': users_map,
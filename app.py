@@ -1,12 +1,20 @@
-from flask import Flask, render_template_string, request, session
+from flask import Flask, render_template_string, request, session, jsonify, send_file, abort
 from flask_session import Session
 import folium
 import pandas as pd
-import plotly.express as px
 import json
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
+from portal import charts, columnar, figures
+from portal.gazetteer import Gazetteer
+from portal.geocoder import Geocoder
+from portal.dealer_layer import add_clustered_dealers, use_clustered_layer
+from portal.relations import build_edges, edge_thickness
+from portal.render import render_all
+from portal.artifacts import ArtifactStore
+from portal.jobs import JobQueue
+from portal.manifest import ANALYZING, FAILED, READY, SetManifest, describe_files
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
@@ -15,6 +23,9 @@ app.config['UPLOAD_FOLDER'] = '/tmp/Uploads'
 Session(app)
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+artifact_store = ArtifactStore(app.config['UPLOAD_FOLDER'])
+job_queue = JobQueue(app.config['UPLOAD_FOLDER'], max_workers=int(os.environ.get('ANALYSIS_WORKERS', 2)))
+manifest = SetManifest(app.config['UPLOAD_FOLDER'])
 
 pincode_coords = {
     "400078": [19.1011, 72.8376], "410206": [19.0330, 73.0297], "401105": [19.3000, 72.8500],
@@ -34,19 +45,17 @@ city_coords = {
     "Vashi": [19.0771, 72.9986], "Sion": [19.0400, 72.8600], "Ambdiha": [22.8000, 85.3333]
 }
 
+geocoder = Geocoder(pincode_coords, city_coords, gazetteer=Gazetteer.from_env())
+
 def get_next_set_number():
-    set_folders = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.startswith('set_')]
-    return 1 if not set_folders else max(int(f.split('_')[1]) for f in set_folders) + 1
+    """Allocate a set number in the manifest; safe across threads and worker processes."""
+    return manifest.allocate()
 
 def process_users_data(file_path):
     df = pd.read_csv(file_path, dtype={'userid': str})
     df['pincode'] = df['pincode'].astype(str).str.extract(r'(\d{6})')
     df['city'] = df['locality'].fillna(df.get('state', 'Mumbai'))
-    df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0])
-    df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1])
-    mask = df['latitude'].isna() | df['longitude'].isna()
-    df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-    df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
+    geocoder.assign(df)
     print(f"Users columns: {df.columns.tolist()}")
     return df
 
@@ -54,11 +63,7 @@ def process_deals_full_data(file_path):
     df = pd.read_csv(file_path)
     df['pincode'] = df['user_pincode'].fillna('').astype(str).str.extract(r'(\d{6})')
     df['city'] = df['user_pincode'].fillna('').str.split(',').str[0].str.strip().replace('', 'Mumbai').fillna('Mumbai')
-    df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0] if pd.notna(x) else None)
-    df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1] if pd.notna(x) else None)
-    mask = df['latitude'].isna() | df['longitude'].isna()
-    df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-    df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
+    geocoder.assign(df)
     df = df.dropna(subset=['latitude', 'longitude'])
     print(f"Deals Full columns: {df.columns.tolist()}")
     return df
@@ -67,11 +72,7 @@ def process_deals_data(file_path):
     df = pd.read_csv(file_path)
     df['pincode'] = df['user_pincode'].str.extract(r'(\d{6})')
     df['city'] = df['user_pincode'].str.split(',').str[0].str.strip()
-    df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0] if pd.notna(x) else None)
-    df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1] if pd.notna(x) else None)
-    mask = df['latitude'].isna() | df['longitude'].isna()
-    df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-    df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
+    geocoder.assign(df)
     df = df.dropna(subset=['latitude', 'longitude'])
     print(f"Deals columns: {df.columns.tolist()}")
     return df
@@ -105,6 +106,10 @@ def create_users_map(deals_df):
     return mumbai_map._repr_html_()
 
 def create_dealers_map(dealers_df):
+    if use_clustered_layer(dealers_df):
+        dealers_map = folium.Map(location=[19.0760, 72.8777], zoom_start=11, tiles="cartodbpositron", prefer_canvas=True)
+        add_clustered_dealers(dealers_map, dealers_df)
+        return dealers_map._repr_html_()
     dealers_map = folium.Map(location=[19.0760, 72.8777], zoom_start=11, tiles="cartodbpositron")
     for _, row in dealers_df.iterrows():
         img_links = row['Imgurl'] if pd.notna(row['Imgurl']) else "No images available"
@@ -159,38 +164,15 @@ def create_relational_map(deals_df, dealers_df):
         ).add_to(relation_map)
         dealer_locations[row['pincode']] = (row['latitude'], row['longitude'])
     
-    for _, deal in deals_df.iterrows():
-        user_pincode = deal['pincode']
-        if user_pincode in user_locations:
-            if 'dealerinfo.coname' in deal and pd.notna(deal['dealerinfo.coname']):
-                matching_dealers = dealers_df[dealers_df['coname'] == deal['dealerinfo.coname']]
-                if not matching_dealers.empty:
-                    dealer_pincode = matching_dealers.iloc[0]['pincode']
-                    if dealer_pincode in dealer_locations:
-                        folium.PolyLine(
-                            locations=[user_locations[user_pincode], dealer_locations[dealer_pincode]],
-                            color="grey",
-                            weight=1,
-                            opacity=0.5
-                        ).add_to(relation_map)
-            elif 'dealerinfo.dealer_id' in deal and pd.notna(deal['dealerinfo.dealer_id']):
-                matching_dealers = dealers_df[dealers_df['_id'] == deal['dealerinfo.dealer_id']]
-                if not matching_dealers.empty:
-                    dealer_pincode = matching_dealers.iloc[0]['pincode']
-                    if dealer_pincode in dealer_locations:
-                        folium.PolyLine(
-                            locations=[user_locations[user_pincode], dealer_locations[dealer_pincode]],
-                            color="grey",
-                            weight=1,
-                            opacity=0.5
-                        ).add_to(relation_map)
-            elif user_pincode in dealer_locations:
-                folium.PolyLine(
-                    locations=[user_locations[user_pincode], dealer_locations[user_pincode]],
-                    color="grey",
-                    weight=1,
-                    opacity=0.5
-                ).add_to(relation_map)
+    edges = build_edges(deals_df, dealers_df, user_locations, dealer_locations)
+    for user_pincode, dealer_pincode, weight in edges.itertuples(index=False):
+        folium.PolyLine(
+            locations=[user_locations[user_pincode], dealer_locations[dealer_pincode]],
+            color="grey",
+            weight=edge_thickness(weight),
+            opacity=0.5,
+            tooltip=f"{weight} deal(s)"
+        ).add_to(relation_map)
     
     return relation_map._repr_html_()
 
@@ -247,54 +229,65 @@ def create_graphs(deals_df, dealers_df, users_df):
     dealers_df_exp = dealers_df.assign(cat_disp_names=dealers_df['cat_disp_names'].str.split(r' \| ')).explode('cat_disp_names')
     current_date = datetime(2025, 4, 15)
     thirty_days_ago = current_date - timedelta(days=30)
-    new_users = users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())].copy()
-    if not new_users.empty:
-        new_users['onboarding_date'] = new_users['createEpoch'].apply(lambda x: datetime.fromtimestamp(x).strftime('%Y-%m-%d'))
-    else:
-        new_users = pd.DataFrame(columns=['userid', 'onboarding_date', 'pincode', 'name', 'phone'])
+    new_users = users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())]
+    user_totals, user_order = charts.user_totals(deals_df)
+    onboarding = charts.daily_onboarding(new_users)
 
-    fig1 = px.bar(users_per_pin, x='pincode', y='users', title="Users per Pincode", 
-                  color_discrete_sequence=['#1f77b4'], template='plotly_dark')
-    fig1.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                       xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+    fig1 = figures.bar(users_per_pin, x='pincode', y='users', title="Users per Pincode", color_discrete='#1f77b4')
+    figures.update_layout(fig1, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                          xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
 
-    fig2 = px.bar(dealers_per_pin, x='pincode', y='dealers', title="Dealers per Pincode", 
-                  color_discrete_sequence=['#ff7f0e'], template='plotly_dark')
-    fig2.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                       xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+    fig2 = figures.bar(dealers_per_pin, x='pincode', y='dealers', title="Dealers per Pincode", color_discrete='#ff7f0e')
+    figures.update_layout(fig2, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                          xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
 
-    fig3 = px.bar(deals_df, x='user_id', y='req_qty', title="Deal Requests per User", 
-                  color='pincode', template='plotly_dark')
-    fig3.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                       xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+    fig3 = figures.bar(user_totals, x='user_id', y='req_qty', title="Deal Requests per User", 
+                       color='pincode', category_orders={'user_id': user_order})
+    figures.update_layout(fig3, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                          xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
 
-    fig4 = px.bar(dealers_df_exp, x='coname' if 'coname' in dealers_df_exp.columns else '_id', y='cat_disp_names', 
-                  title="Dealer Product Categories", color='pincode', 
-                  hover_data=['phone_no', 'addr1', 'addr2', 'landmark', 'city', 'subcat_disp_names', 'Imgurl'], 
-                  template='plotly_dark')
-    fig4.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                       xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+    fig4 = figures.bar(dealers_df_exp, x='coname' if 'coname' in dealers_df_exp.columns else '_id', y='cat_disp_names', 
+                       title="Dealer Product Categories", color='pincode', 
+                       hover_data=['phone_no', 'addr1', 'addr2', 'landmark', 'city', 'subcat_disp_names', 'Imgurl'])
+    figures.update_layout(fig4, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                          xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
 
-    fig5 = px.scatter(new_users, x='userid', y='onboarding_date', title="New Users Onboarding Timeline", 
-                      color='pincode', hover_data=['name', 'phone', 'pincode'], template='plotly_dark')
-    fig5.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                       xaxis={'tickangle': 0, 'automargin': True}, 
-                       yaxis={'type': 'category', 'title': 'Onboarding Date', 'automargin': True})
+    fig5 = figures.line(onboarding, x='onboarding_date', y='new_users', title="New Users Onboarding Timeline", 
+                        color='pincode', markers=True, render_mode=charts.render_mode(len(onboarding)))
+    figures.update_layout(fig5, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                          xaxis={'tickangle': 0, 'title': 'Onboarding Date', 'automargin': True}, 
+                          yaxis={'title': 'New Users', 'automargin': True})
 
-    return fig1.to_json(), fig2.to_json(), fig3.to_json(), fig4.to_json(), fig5.to_json()
+    return figures.to_json(fig1), figures.to_json(fig2), figures.to_json(fig3), figures.to_json(fig4), figures.to_json(fig5)
 
-def perform_analysis(deals_path, dealers_path, users_path, deals_full_path):
-    deals_df = process_deals_data(deals_path)
-    dealers_df = process_dealers_data(dealers_path)
-    users_df = process_users_data(users_path)
-    deals_full_df = process_deals_full_data(deals_full_path)
+def _no_progress(stage):
+    pass
+
+def perform_analysis(deals_path, dealers_path, users_path, deals_full_path, progress=_no_progress):
+    progress('process_deals')
+    deals_df = columnar.load_or_process(deals_path, 'deals', process_deals_data)
+    progress('process_dealers')
+    dealers_df = columnar.load_or_process(dealers_path, 'dealers', process_dealers_data)
+    progress('process_users')
+    users_df = columnar.load_or_process(users_path, 'users', process_users_data)
+    progress('process_deals_full')
+    deals_full_df = columnar.load_or_process(deals_full_path, 'deals_full', process_deals_full_data)
     if deals_df.empty or dealers_df.empty or users_df.empty or deals_full_df.empty:
         return None, f"Error: No valid data found. Dealers: {len(dealers_df)}, Deals: {len(deals_df)}, Users: {len(users_df)}, Deals Full: {len(deals_full_df)}"
-    users_map = create_users_map(deals_df)
-    dealers_map = create_dealers_map(dealers_df)
-    relation_map = create_relational_map(deals_df, dealers_df)
-    new_users_map = create_new_users_map(users_df)
-    graph1, graph2, graph3, graph4, graph5 = create_graphs(deals_df, dealers_df, users_df)
+    progress('render')
+    rendered = render_all({
+        'users_map': (create_users_map, 'deals'),
+        'dealers_map': (create_dealers_map, 'dealers'),
+        'relation_map': (create_relational_map, 'deals', 'dealers'),
+        'new_users_map': (create_new_users_map, 'users'),
+        'graphs': (create_graphs, 'deals', 'dealers', 'users')
+    }, {'deals': deals_df, 'dealers': dealers_df, 'users': users_df}, os.path.dirname(deals_path))
+    users_map = rendered['users_map']
+    dealers_map = rendered['dealers_map']
+    relation_map = rendered['relation_map']
+    new_users_map = rendered['new_users_map']
+    graph1, graph2, graph3, graph4, graph5 = rendered['graphs']
+    progress('kpis')
     total_users = len(users_df)
     total_visits = len(deals_df) + len(deals_full_df)
     current_date = datetime(2025, 4, 15)
@@ -332,11 +325,56 @@ def perform_analysis(deals_path, dealers_path, users_path, deals_full_path):
         }
     }, None
 
+def run_analysis_job(job, set_number, deals_path, dealers_path, users_path, deals_full_path):
+    try:
+        analysis_data, error = perform_analysis(deals_path, dealers_path, users_path, deals_full_path, progress=job.enter_stage)
+        if error:
+            raise RuntimeError(error)
+        job.enter_stage('store')
+        artifact_store.save(set_number, analysis_data)
+    except Exception:
+        manifest.set_state(set_number, FAILED)
+        raise
+    manifest.set_state(set_number, READY)
+
+def owns_set(set_number):
+    """Whether ``set_number`` is one of the sets uploaded in this session."""
+    return set_number is not None and set_number in session.get('analysis_sets', [])
+
+def load_owned_set(set_number):
+    """The stored analysis of ``set_number``, or None unless the set belongs to this session."""
+    return artifact_store.load(set_number) if owns_set(set_number) else None
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = job_queue.status(job_id)
+    # Jobs of other sessions are as unknown as jobs that do not exist.
+    if status is None or not (job_id in session.get('pending_jobs', {}).values()
+                              or owns_set(status.get('set_number'))):
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+@app.route('/sets/<int:set_number>/graphs/<graph_id>')
+def graph_artifact(set_number, graph_id):
+    if not owns_set(set_number):
+        abort(404)
+    stored = artifact_store.graph_file(set_number, graph_id)
+    if stored is None:
+        abort(404)
+    path, etag = stored
+    response = send_file(path, mimetype='application/json', etag=etag, conditional=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/', methods=['GET', 'POST'])
 def dashboard():
-    if 'analysis_sessions' not in session:
-        session['analysis_sessions'] = []
+    if 'analysis_sets' not in session:
+        session.pop('analysis_sessions', None)
+        session['analysis_sets'] = []
         session['current_set'] = None
+    if 'pending_jobs' not in session:
+        session['pending_jobs'] = {}
     if request.method == 'POST':
         if 'file_upload' in request.form:
             deals_file = request.files.get('deals_file')
@@ -355,31 +393,38 @@ def dashboard():
                 dealers_file.save(dealers_path)
                 users_file.save(users_path)
                 deals_full_file.save(deals_full_path)
-                analysis_data, error = perform_analysis(deals_path, dealers_path, users_path, deals_full_path)
-                if error:
-                    return error
-                session['analysis_sessions'].append({
-                    'set_number': set_number,
-                    'analysis': analysis_data
-                })
+                manifest.record_files(set_number, describe_files(
+                    {'deals': deals_path, 'dealers': dealers_path, 'users': users_path, 'deals_full': deals_full_path}),
+                    state=ANALYZING)
+                job_id = job_queue.submit(run_analysis_job, set_number, deals_path, dealers_path, users_path, deals_full_path,
+                                          meta={'set_number': set_number})
+                session['analysis_sets'].append(set_number)
+                session['pending_jobs'][str(set_number)] = job_id
                 session['current_set'] = set_number
                 session.modified = True
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify({'job_id': job_id, 'set_number': set_number}), 202
         elif 'load_session' in request.form:
-            set_number = int(request.form['set_number'])
+            set_number = request.form.get('set_number', type=int)
+            if not owns_set(set_number):
+                abort(404)
             session['current_set'] = set_number
             session.modified = True
-    current_analysis = None
-    if session['current_set']:
-        for s in session['analysis_sessions']:
-            if s['set_number'] == session['current_set']:
-                current_analysis = s['analysis']
-                break
+    current_analysis = load_owned_set(session['current_set'])
+    pending_job = None
+    if session['current_set'] is not None:
+        job_id = session['pending_jobs'].get(str(session['current_set']))
+        if job_id and current_analysis:
+            session['pending_jobs'].pop(str(session['current_set']))
+            session.modified = True
+        elif job_id:
+            pending_job = {'job_id': job_id, 'set_number': session['current_set']}
     html_template = """
     <!DOCTYPE html>
     <html>
     <head>
         <title>Business Analytics Portal</title>
-        <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+        <script src="{{ plotlyjs_url }}"></script>
         <style>
             body { margin: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #0e1111; color: #F0F0F0; }
             .header { background: #0e1111; padding: 15px; text-align: center; box-shadow: 0 4px 12px rgba(0,0,0,0.3); position: relative; }
@@ -411,8 +456,9 @@ def dashboard():
             .map-title, .graph-title { padding: 10px; background: #FAF9F6; text-align: center; font-size: 16px; font-weight: bold; color: #09141C; }
             .fullscreen-btn { position: absolute; top: 10px; right: 10px; padding: 5px 10px; background: #3498db; border: none; border-radius: 5px; color: #000; cursor: pointer; }
             .fullscreen-btn:hover { background: #2980b9; }
+            .job-banner { margin: 10px 10px 10px 220px; padding: 10px; border-radius: 8px; background: #FAF9F6; color: #09141C; text-align: center; font-size: 14px; }
             @media (max-width: 1000px) {
-                .container, .overview { margin-left: 10px; }
+                .container, .overview, .job-banner { margin-left: 10px; }
                 .sidebar { position: static; width: 100%; height: auto; transform: none; }
                 .toggle-sidebar { display: none; }
                 .map-box, .graph-box { width: 90%; }
@@ -426,8 +472,8 @@ def dashboard():
             <div class="controls">
                 <select onchange="loadSession(this.value)">
                     <option value="">Select Previous Set</option>
-                    {% for s in analysis_sessions %}
-                        <option value="{{ s.set_number }}" {% if s.set_number == current_set %}selected{% endif %}>Set {{ s.set_number }}</option>
+                    {% for set_number in analysis_sets %}
+                        <option value="{{ set_number }}" {% if set_number == current_set %}selected{% endif %}>Set {{ set_number }}</option>
                     {% endfor %}
                 </select>
                 <button onclick="refreshData()">Refresh</button>
@@ -448,6 +494,9 @@ def dashboard():
                 <button type="submit">Analyze</button>
             </form>
         </div>
+        {% if pending_job %}
+            <div class="job-banner" id="job-banner">Analyzing Set {{ pending_job.set_number }}... (job {{ pending_job.job_id }})</div>
+        {% endif %}
         {% if current_analysis %}
             <div class="overview">
                 <div class="card">
@@ -568,15 +617,20 @@ def dashboard():
         {% endif %}
         <script>
             {% if current_analysis %}
-                try {
-                    Plotly.newPlot('graph1', JSON.parse('{{ current_analysis.graph1 | safe }}').data, JSON.parse('{{ current_analysis.graph1 | safe }}').layout);
-                    Plotly.newPlot('graph2', JSON.parse('{{ current_analysis.graph2 | safe }}').data, JSON.parse('{{ current_analysis.graph2 | safe }}').layout);
-                    Plotly.newPlot('graph3', JSON.parse('{{ current_analysis.graph3 | safe }}').data, JSON.parse('{{ current_analysis.graph3 | safe }}').layout);
-                    Plotly.newPlot('graph4', JSON.parse('{{ current_analysis.graph4 | safe }}').data, JSON.parse('{{ current_analysis.graph4 | safe }}').layout);
-                    Plotly.newPlot('graph5', JSON.parse('{{ current_analysis.graph5 | safe }}').data, JSON.parse('{{ current_analysis.graph5 | safe }}').layout);
-                } catch (e) {
-                    console.error('Error rendering graphs:', e);
-                }
+                // Each figure is fetched once the page is up and plotted when it arrives; the
+                // layout template they share is sent once here.
+                var plotlyTemplate = {{ plotly_template | tojson }};
+                ['graph1', 'graph2', 'graph3', 'graph4', 'graph5'].forEach(function(graphId) {
+                    fetch('/sets/{{ current_set }}/graphs/' + graphId)
+                        .then(function(response) {
+                            if (!response.ok) throw new Error('HTTP ' + response.status);
+                            return response.json();
+                        })
+                        .then(function(figure) {
+                            Plotly.newPlot(graphId, figure.data, Object.assign({ template: plotlyTemplate }, figure.layout));
+                        })
+                        .catch(function(e) { console.error('Error rendering ' + graphId + ':', e); });
+                });
             {% endif %}
             function toggleFullscreen(graphId) {
                 var graphDiv = document.getElementById(graphId);
@@ -623,6 +677,29 @@ def dashboard():
                 overviews.forEach(overview => overview.classList.toggle('no-sidebar'));
                 toggleBtn.textContent = sidebar.classList.contains('hidden') ? '▶' : '◀';
             }
+            {% if pending_job %}
+                function pollJob() {
+                    fetch('/jobs/{{ pending_job.job_id }}')
+                        .then(function(response) { return response.json(); })
+                        .then(function(job) {
+                            var banner = document.getElementById('job-banner');
+                            if (job.state === 'done') {
+                                loadSession('{{ pending_job.set_number }}');
+                            } else if (job.state === 'failed' || job.error) {
+                                banner.textContent = 'Analysis of Set {{ pending_job.set_number }} failed: ' + job.error;
+                            } else {
+                                var stage = job.stages && job.stages.length ? job.stages[job.stages.length - 1].name : job.state;
+                                banner.textContent = 'Analyzing Set {{ pending_job.set_number }}... (' + stage + ')';
+                                setTimeout(pollJob, 2000);
+                            }
+                        })
+                        .catch(function(e) {
+                            console.error('Error polling job:', e);
+                            setTimeout(pollJob, 5000);
+                        });
+                }
+                pollJob();
+            {% endif %}
             window.onload = function() {
                 var sidebar = document.getElementById('sidebar');
                 var container = document.getElementById('container');
@@ -639,8 +716,11 @@ def dashboard():
     """
     return render_template_string(html_template, 
                                  current_analysis=current_analysis, 
-                                 analysis_sessions=session['analysis_sessions'], 
-                                 current_set=session['current_set'])
+                                 analysis_sets=session['analysis_sets'], 
+                                 current_set=session['current_set'],
+                                 pending_job=pending_job,
+                                 plotlyjs_url=figures.plotlyjs_url(),
+                                 plotly_template=figures.template() if current_analysis else None)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8001))
@@ -0,0 +1,254 @@
+"""Per-stage benchmark of the analysis pipeline on synthetic exports.
+
+    python benchmark.py --rows 10k,100k,1m,10m --out benchmark_report.json
+
+For every size, ``portal.synthetic`` generates (or reuses) the four exports
+under ``--data-dir`` and each stage of ``newapp``'s analysis is timed on its
+own: the loaders and their compaction, the KPIs, the filter indexes, every
+``create_*_map``, ``create_graphs`` and every filter (match plus the first
+page of records). Stages run in pipeline order on the frames the previous
+stages produced, ``--repeat`` times each.
+
+The JSON report holds the environment (versions, git commit, relevant
+environment variables) and per size the input files and per stage the run
+times, the rows produced and the process's peak RSS after the stage. It is
+rewritten after every size, so a long run that dies still leaves the sizes
+it finished. ``--only``/``--skip`` take comma-separated stage name patterns,
+e.g. ``--skip 'create_*'`` for the largest sizes.
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from portal import synthetic
+
+# Settings that change what the timed stages do.
+ENV_VARS = ['COMPACT_FRAMES', 'COMPACT_CATEGORY_RATIO', 'DEALER_MAP_MODE', 'DEALER_CLUSTER_THRESHOLD', 'PINCODE_GAZETTEER']
+PACKAGES = ['pandas', 'numpy', 'pyarrow', 'plotly', 'folium', 'flask']
+FILTER_PAGE_SIZE = 100
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': versions,
+        'git_commit': git_commit(),
+        'env': {name: os.environ[name] for name in ENV_VARS if name in os.environ}
+    }
+
+
+def _size(result):
+    """Rows (frames, arrays) or characters (rendered HTML/JSON) of a stage result, when meaningful."""
+    if isinstance(result, tuple):
+        return sum(_size(part) or 0 for part in result)
+    if isinstance(result, dict) and 'total' in result:
+        return result['total']
+    if hasattr(result, '__len__') and not isinstance(result, dict):
+        return len(result)
+    return None
+
+
+class StageRunner:
+    """Times stages in order and collects their report entries."""
+
+    def __init__(self, repeat, only=None, skip=None):
+        self.repeat = repeat
+        self.only = only
+        self.skip = skip or []
+        self.stages = []
+
+    def wanted(self, name):
+        if self.only and not any(fnmatch.fnmatch(name, pattern) for pattern in self.only):
+            return False
+        return not any(fnmatch.fnmatch(name, pattern) for pattern in self.skip)
+
+    def run(self, name, func, *args, required=False):
+        """Time ``func(*args)``; returns its last result, or None if skipped or failed.
+
+        ``required`` stages produce inputs for later ones and run even when
+        filtered out, without being reported.
+        """
+        report = self.wanted(name)
+        if not report and not required:
+            return None
+        seconds = []
+        result = None
+        error = None
+        for _ in range(self.repeat if report else 1):
+            start = time.perf_counter()
+            try:
+                result = func(*args)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+            finally:
+                seconds.append(time.perf_counter() - start)
+        if report:
+            entry = {
+                'name': name,
+                'seconds': [round(s, 4) for s in seconds],
+                'best': round(min(seconds), 4),
+                'median': round(statistics.median(seconds), 4),
+                'size': _size(result),
+                'peak_rss_mb': peak_rss_mb()
+            }
+            if error:
+                entry['error'] = error
+            self.stages.append(entry)
+            print(f"  {name:<28} {entry['best']:>9.3f} s  {entry['peak_rss_mb'] or '-':>8} MB"
+                  + (f"  {error}" if error else ''), flush=True)
+        return None if error else result
+
+
+def _busiest(df, column):
+    counts = df[column].astype(object).value_counts()
+    return counts.index[0] if len(counts) else ''
+
+
+def benchmark_size(newapp, rows, args):
+    from portal import ingest
+    from portal.paging import paginate, query_key
+    from portal.search import CategoryIndex, DateIndex, GroupIndex
+
+    folder = os.path.join(args.data_dir, f'rows_{rows}')
+    print(f"{rows} rows ({folder})", flush=True)
+    start = time.perf_counter()
+    manifest = synthetic.generate(folder, rows, args.seed)
+    generate_seconds = round(time.perf_counter() - start, 2)
+    paths = {name: entry['path'] for name, entry in manifest['files'].items()}
+
+    runner = StageRunner(args.repeat, args.only, args.skip)
+    run = runner.run
+    deals_df = run('process_deals', newapp.process_deals_data, paths['deals'], required=True)
+    dealers_df = run('process_dealers', newapp.process_dealers_data, paths['dealers'], required=True)
+    users_df = run('process_users', newapp.process_users_data, paths['users'], required=True)
+    deals_full_df = run('process_deals_full', newapp.process_deals_full_data, paths['deals_full'], required=True)
+    if any(df is None or df.empty for df in (deals_df, dealers_df, users_df, deals_full_df)):
+        raise RuntimeError(f"A loader returned no rows for {folder}")
+    deals_df = run('compact_deals', newapp.compact_deals, deals_df, required=True)
+    dealers_df = run('compact_dealers', newapp.compact_dealers, dealers_df, required=True)
+    users_df = run('compact_users', newapp.compact_users, users_df, required=True)
+    deals_full_df = run('compact_deals_full', newapp.compact_deals_full, deals_full_df, required=True)
+
+    def kpis():
+        deal_rows = ingest.RowCount()
+        aggregates = newapp.deal_aggregates()
+        for aggregate in (deal_rows, *aggregates.values()):
+            aggregate.update(deals_df)
+        for aggregate in (deal_rows, aggregates['deal_pairs']):
+            aggregate.update(deals_full_df)
+        return newapp.deal_kpis(len(users_df), newapp.count_new_users(users_df), len(deal_rows), aggregates)
+
+    run('kpis', kpis)
+    analysis = {
+        'deals_df': deals_df, 'dealers_df': dealers_df, 'users_df': users_df, 'deals_full_df': deals_full_df,
+        'category_index': run('index_category', CategoryIndex.from_frame, dealers_df, required=True),
+        'dealers_pincode_index': run('index_dealers_pincode', GroupIndex.from_frames, 'pincode', dealers_df,
+                                     required=True),
+        'deals_pincode_index': run('index_deals_pincode', GroupIndex.from_frames, 'pincode', deals_df, deals_full_df,
+                                   required=True),
+        'deals_date_index': run('index_deals_date', DateIndex.from_frames, 'created_epoch', deals_df, deals_full_df,
+                                required=True)
+    }
+    run('create_users_map', newapp.create_users_map, deals_df)
+    run('create_dealers_map', newapp.create_dealers_map, dealers_df)
+    run('create_relational_map', newapp.create_relational_map, deals_df, dealers_df)
+    run('create_new_users_map', newapp.create_new_users_map, users_df)
+    run('create_graphs', newapp.create_graphs, deals_df, dealers_df, users_df)
+
+    def first_page(filter_type, value, value_to=None):
+        matches, to_records = newapp.match_filter(analysis, filter_type, value, value_to)
+        return paginate(matches, query_key(rows, filter_type, value, value_to), to_records, limit=FILTER_PAGE_SIZE)
+
+    run('filter_deal_date', first_page, 'deal_date', '2025-03-01', '2025-03-07')
+    run('filter_dealer_category', first_page, 'dealer_category', 'kitchen')
+    run('filter_dealer_pincode', first_page, 'dealer_pincode', _busiest(dealers_df, 'pincode'))
+    run('filter_deals_pincode', first_page, 'deals_pincode', _busiest(deals_df, 'pincode'))
+    return {
+        'rows': rows,
+        'generate_seconds': generate_seconds,
+        'files': {name: {'rows': entry['rows'], 'bytes': entry['bytes']} for name, entry in manifest['files'].items()},
+        'frames': {name: len(df) for name, df in (('deals', deals_df), ('dealers', dealers_df), ('users', users_df),
+                                                   ('deals_full', deals_full_df))},
+        'stages': runner.stages
+    }
+
+
+def _patterns(text):
+    return [pattern.strip() for pattern in text.split(',') if pattern.strip()] if text else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each analysis stage on synthetic exports.")
+    parser.add_argument('--rows', default='10k,100k,1m,10m',
+                        help="comma-separated deal row counts, e.g. 10k,100k,1m,10m")
+    parser.add_argument('--out', default='benchmark_report.json', help="JSON report path")
+    parser.add_argument('--data-dir', default=os.path.join('/tmp', 'benchmark_data'),
+                        help="where synthetic exports are generated and reused")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help="runs per stage")
+    parser.add_argument('--only', type=_patterns, help="comma-separated stage name patterns to report")
+    parser.add_argument('--skip', type=_patterns, help="comma-separated stage name patterns to leave out")
+    parser.add_argument('--verbose', action='store_true', help="keep the app's debug logging")
+    args = parser.parse_args(argv)
+    sizes = [synthetic.parse_rows(size) for size in args.rows.split(',') if size.strip()]
+
+    import newapp
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'environment': environment(),
+        'runs': []
+    }
+    for rows in sizes:
+        report['runs'].append(benchmark_size(newapp, rows, args))
+        tmp_path = f'{args.out}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, args.out)
+    print(f"Report written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,30 @@
-from flask import Flask, render_template_string, request, session
+from flask import Flask, Response, render_template_string, request, session, jsonify, send_file, abort, g, url_for
 from flask_session import Session
 import folium
 import pandas as pd
-import plotly.express as px
 import json
 import os
+import shutil
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
+from functools import partial
+from portal import charts, columnar, delta, figures, ingest, logs, metrics
+from portal.gazetteer import Gazetteer
+from portal.geocoder import Geocoder
+from portal.dealer_layer import add_clustered_dealers, use_clustered_layer
+from portal.relations import build_edges, edge_thickness
+from portal.render import render_all
+from portal.artifacts import ArtifactStore, FRAME_KEYS, GRAPH_KEYS
+from portal.compact import Compaction
+from portal.content import ContentCache, save_hashed
+from portal.jobs import JobQueue, QUEUED, RUNNING
+from portal.manifest import ANALYZING, FAILED, READY, SetManifest, describe_files
+from portal.paging import paginate, query_key
+from portal.search import CategoryIndex, DateIndex, GroupIndex, day_range, epoch_dates, parse_epoch
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[
-    logging.StreamHandler(),
-    logging.FileHandler('app.log')
-])
+# JSON records written by a background thread; see portal.logs for the LOG_* settings.
+logs.configure('app.log')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -23,6 +34,14 @@ app.config['UPLOAD_FOLDER'] = '/tmp/Uploads'
 Session(app)
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Frames and artifacts of files uploaded before, by content hash; see portal.content.
+content_cache = ContentCache(os.path.join(app.config['UPLOAD_FOLDER'], 'cache'))
+artifact_store = ArtifactStore(app.config['UPLOAD_FOLDER'], cache=content_cache)
+# Set numbers and per-set metadata; see portal.manifest.
+manifest = SetManifest(app.config['UPLOAD_FOLDER'])
+job_queue = JobQueue(app.config['UPLOAD_FOLDER'], max_workers=int(os.environ.get('ANALYSIS_WORKERS', 2)))
+# With LAZY_ARTIFACTS=0 every map and graph is rendered during the upload job.
+LAZY_ARTIFACTS = os.environ.get('LAZY_ARTIFACTS', '1') != '0'
 
 pincode_coords = {
     "400078": [19.1011, 72.8376], "410206": [19.0330, 73.0297], "401105": [19.3000, 72.8500],
@@ -42,54 +61,56 @@ city_coords = {
     "Vashi": [19.0771, 72.9986], "Sion": [19.0400, 72.8600], "Ambdiha": [22.8000, 85.3333]
 }
 
+geocoder = Geocoder(pincode_coords, city_coords, gazetteer=Gazetteer.from_env())
+
 def get_next_set_number():
-    set_folders = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.startswith('set_')]
-    return 1 if not set_folders else max(int(f.split('_')[1]) for f in set_folders) + 1
+    """Allocate a set number in the manifest; safe across threads and worker processes."""
+    return manifest.allocate()
 
 def process_users_data(file_path):
     try:
         df = pd.read_csv(file_path, dtype={'userid': str})
         df['pincode'] = df['pincode'].astype(str).str.extract(r'(\d{6})')
         df['city'] = df['locality'].fillna(df.get('state', 'Mumbai'))
-        df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0])
-        df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1])
-        mask = df['latitude'].isna() | df['longitude'].isna()
-        df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-        df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
+        geocoder.assign(df)
         logger.debug(f"Users columns: {df.columns.tolist()}")
         return df
     except Exception as e:
         logger.error(f"Error processing users data: {e}")
         return pd.DataFrame()
 
+# read_csv options shared by the whole-file loaders and streamed chunks; a chunk
+# without any pincode would otherwise read user_pincode as float.
+DEALS_CSV_OPTIONS = {'dtype': {'user_pincode': str}}
+
+def clean_deals_full_data(df):
+    df['pincode'] = df['user_pincode'].fillna('').astype(str).str.extract(r'(\d{6})')
+    df['city'] = df['user_pincode'].fillna('').str.split(',').str[0].str.strip().replace('', 'Mumbai').fillna('Mumbai')
+    if 'created_at' in df.columns:
+        df['created_epoch'] = parse_epoch(df['created_at'])
+    geocoder.assign(df)
+    return df.dropna(subset=['latitude', 'longitude'])
+
 def process_deals_full_data(file_path):
     try:
-        df = pd.read_csv(file_path)
-        df['pincode'] = df['user_pincode'].fillna('').astype(str).str.extract(r'(\d{6})')
-        df['city'] = df['user_pincode'].fillna('').str.split(',').str[0].str.strip().replace('', 'Mumbai').fillna('Mumbai')
-        df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0] if pd.notna(x) else None)
-        df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1] if pd.notna(x) else None)
-        mask = df['latitude'].isna() | df['longitude'].isna()
-        df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-        df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
-        df = df.dropna(subset=['latitude', 'longitude'])
+        df = clean_deals_full_data(pd.read_csv(file_path, **DEALS_CSV_OPTIONS))
         logger.debug(f"Deals Full columns: {df.columns.tolist()}")
         return df
     except Exception as e:
         logger.error(f"Error processing deals full data: {e}")
         return pd.DataFrame()
 
+def clean_deals_data(df):
+    df['pincode'] = df['user_pincode'].str.extract(r'(\d{6})')
+    df['city'] = df['user_pincode'].str.extract(r'^([^,]*)', expand=False).str.strip()
+    if 'created_at' in df.columns:
+        df['created_epoch'] = parse_epoch(df['created_at'])
+    geocoder.assign(df)
+    return df.dropna(subset=['latitude', 'longitude'])
+
 def process_deals_data(file_path):
     try:
-        df = pd.read_csv(file_path)
-        df['pincode'] = df['user_pincode'].str.extract(r'(\d{6})')
-        df['city'] = df['user_pincode'].str.split(',').str[0].str.strip()
-        df['latitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[0] if pd.notna(x) else None)
-        df['longitude'] = df['pincode'].map(lambda x: pincode_coords.get(x, [None, None])[1] if pd.notna(x) else None)
-        mask = df['latitude'].isna() | df['longitude'].isna()
-        df.loc[mask, 'latitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[0])
-        df.loc[mask, 'longitude'] = df.loc[mask, 'city'].map(lambda x: city_coords.get(x, [19.0760, 72.8777])[1])
-        df = df.dropna(subset=['latitude', 'longitude'])
+        df = clean_deals_data(pd.read_csv(file_path, **DEALS_CSV_OPTIONS))
         logger.debug(f"Deals columns: {df.columns.tolist()}")
         return df
     except Exception as e:
@@ -110,12 +131,26 @@ def process_dealers_data(file_path):
         logger.error(f"Error processing dealers data: {e}")
         return pd.DataFrame()
 
+# Compaction after the process_* loaders (see portal.compact): each frame keeps
+# only the columns the maps, graphs, filters and appends read.
+COORDINATES = ['latitude', 'longitude']
+compact_deals = Compaction('deals', categories=['user_id', 'user_name', 'pincode', 'dealerinfo.coname'],
+                           keep=['_id', 'user_id', 'user_name', 'pincode', 'req_qty', 'created_epoch', *COORDINATES,
+                                 'dealerinfo.coname', 'dealerinfo.dealer_id'],
+                           float32=COORDINATES, integers=['req_qty'])
+compact_deals_full = compact_deals.renamed('deals_full')
+compact_users = Compaction('users', categories=['pincode'],
+                           keep=['userid', 'pincode', 'createEpoch', 'name', 'phone', *COORDINATES], float32=COORDINATES)
+compact_dealers = Compaction('dealers', categories=['coname', 'pincode', 'city', 'cat_disp_names', 'subcat_disp_names'],
+                             float32=COORDINATES)
+
 def create_users_map(deals_df):
     mumbai_map = folium.Map(location=[19.0760, 72.8777], zoom_start=11, tiles="cartodbpositron")
     grouped = deals_df.groupby('pincode')
     for pincode, group in grouped:
         unique_users = group['user_name'].drop_duplicates().tolist()
-        user_counts = group['user_name'].value_counts()
+        # As objects, so a categorical column does not list every other group's users with a count of 0.
+        user_counts = group['user_name'].astype(object).value_counts()
         user_display = "<br>".join([f"{user} ({count})" for user, count in user_counts.items()])
         lat, lon = pincode_coords.get(pincode, [group['latitude'].iloc[0], group['longitude'].iloc[0]])
         folium.CircleMarker(
@@ -126,9 +161,13 @@ def create_users_map(deals_df):
             fill=True,
             fill_opacity=0.7
         ).add_to(mumbai_map)
-    return mumbai_map._repr_html_()
+    return mumbai_map.get_root().render()
 
 def create_dealers_map(dealers_df):
+    if use_clustered_layer(dealers_df):
+        dealers_map = folium.Map(location=[19.0760, 72.8777], zoom_start=11, tiles="cartodbpositron", prefer_canvas=True)
+        add_clustered_dealers(dealers_map, dealers_df)
+        return dealers_map.get_root().render()
     dealers_map = folium.Map(location=[19.0760, 72.8777], zoom_start=11, tiles="cartodbpositron")
     for _, row in dealers_df.iterrows():
         img_links = row['Imgurl'] if pd.notna(row['Imgurl']) else "No images available"
@@ -150,7 +189,7 @@ def create_dealers_map(dealers_df):
             fill=True,
             fill_opacity=0.7
         ).add_to(dealers_map)
-    return dealers_map._repr_html_()
+    return dealers_map.get_root().render()
 
 def create_relational_map(deals_df, dealers_df):
     relation_map = folium.Map(location=[19.0760, 72.8777], zoom_start=11, tiles="cartodbpositron")
@@ -158,7 +197,7 @@ def create_relational_map(deals_df, dealers_df):
     user_locations = {}
     for pincode, group in grouped_users:
         unique_users = group['user_name'].drop_duplicates().tolist()
-        user_counts = group['user_name'].value_counts()
+        user_counts = group['user_name'].astype(object).value_counts()
         user_display = "<br>".join([f"{user} ({count})" for user, count in user_counts.items()])
         lat, lon = pincode_coords.get(pincode, [group['latitude'].iloc[0], group['longitude'].iloc[0]])
         folium.CircleMarker(
@@ -183,40 +222,17 @@ def create_relational_map(deals_df, dealers_df):
         ).add_to(relation_map)
         dealer_locations[row['pincode']] = (row['latitude'], row['longitude'])
     
-    for _, deal in deals_df.iterrows():
-        user_pincode = deal['pincode']
-        if user_pincode in user_locations:
-            if 'dealerinfo.coname' in deal and pd.notna(deal['dealerinfo.coname']):
-                matching_dealers = dealers_df[dealers_df['coname'] == deal['dealerinfo.coname']]
-                if not matching_dealers.empty:
-                    dealer_pincode = matching_dealers.iloc[0]['pincode']
-                    if dealer_pincode in dealer_locations:
-                        folium.PolyLine(
-                            locations=[user_locations[user_pincode], dealer_locations[dealer_pincode]],
-                            color="grey",
-                            weight=1,
-                            opacity=0.5
-                        ).add_to(relation_map)
-            elif 'dealerinfo.dealer_id' in deal and pd.notna(deal['dealerinfo.dealer_id']):
-                matching_dealers = dealers_df[dealers_df['_id'] == deal['dealerinfo.dealer_id']]
-                if not matching_dealers.empty:
-                    dealer_pincode = matching_dealers.iloc[0]['pincode']
-                    if dealer_pincode in dealer_locations:
-                        folium.PolyLine(
-                            locations=[user_locations[user_pincode], dealer_locations[dealer_pincode]],
-                            color="grey",
-                            weight=1,
-                            opacity=0.5
-                        ).add_to(relation_map)
-            elif user_pincode in dealer_locations:
-                folium.PolyLine(
-                    locations=[user_locations[user_pincode], dealer_locations[user_pincode]],
-                    color="grey",
-                    weight=1,
-                    opacity=0.5
-                ).add_to(relation_map)
+    edges = build_edges(deals_df, dealers_df, user_locations, dealer_locations)
+    for user_pincode, dealer_pincode, weight in edges.itertuples(index=False):
+        folium.PolyLine(
+            locations=[user_locations[user_pincode], dealer_locations[dealer_pincode]],
+            color="grey",
+            weight=edge_thickness(weight),
+            opacity=0.5,
+            tooltip=f"{weight} deal(s)"
+        ).add_to(relation_map)
     
-    return relation_map._repr_html_()
+    return relation_map.get_root().render()
 
 def create_new_users_map(users_df):
     if users_df.empty:
@@ -262,7 +278,7 @@ def create_new_users_map(users_df):
             fill=True,
             fill_opacity=0.7
         ).add_to(new_users_map)
-    return new_users_map._repr_html_()
+    return new_users_map.get_root().render()
 
 def create_graphs(deals_df, dealers_df, users_df):
     try:
@@ -284,79 +300,109 @@ def create_graphs(deals_df, dealers_df, users_df):
         dealers_df_exp = dealers_df.assign(cat_disp_names=dealers_df['cat_disp_names'].str.split(r' \| ')).explode('cat_disp_names')
         current_date = datetime(2025, 4, 15)
         thirty_days_ago = current_date - timedelta(days=30)
-        new_users = users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())].copy()
-        new_users['onboarding_date'] = new_users['createEpoch'].apply(lambda x: datetime.fromtimestamp(x).strftime('%Y-%m-%d'))
-
-        fig1 = px.bar(users_per_pin, x='pincode', y='users', title="Users per Pincode", 
-                      color_discrete_sequence=['#1f77b4'], template='plotly_dark')
-        fig1.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                           xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
-
-        fig2 = px.bar(dealers_per_pin, x='pincode', y='dealers', title="Dealers per Pincode", 
-                      color_discrete_sequence=['#ff7f0e'], template='plotly_dark')
-        fig2.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                           xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
-
-        fig3 = px.bar(deals_df, x='user_id', y='req_qty', title="Deal Requests per User", 
-                      color='pincode', template='plotly_dark')
-        fig3.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                           xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
-
-        fig4 = px.bar(dealers_df_exp, x='coname' if 'coname' in dealers_df_exp.columns else '_id', y='cat_disp_names', 
-                      title="Dealer Product Categories", color='pincode', 
-                      hover_data=['phone_no', 'addr1', 'addr2', 'landmark', 'city', 'subcat_disp_names', 'Imgurl'], 
-                      template='plotly_dark')
-        fig4.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                           xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
-
-        fig5 = px.scatter(new_users, x='userid', y='onboarding_date', title="New Users Onboarding Timeline", 
-                          color='pincode', hover_data=['name', 'phone', 'pincode'], template='plotly_dark')
-        fig5.update_layout(autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
-                           xaxis={'tickangle': 0, 'automargin': True}, 
-                           yaxis={'type': 'category', 'title': 'Onboarding Date', 'automargin': True})
-
-        return fig1.to_json(), fig2.to_json(), fig3.to_json(), fig4.to_json(), fig5.to_json()
+        new_users = users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())]
+        # Aggregated here so the deal and onboarding charts stay the same size however many rows there are.
+        user_totals, user_order = charts.user_totals(deals_df)
+        onboarding = charts.daily_onboarding(new_users)
+
+        fig1 = figures.bar(users_per_pin, x='pincode', y='users', title="Users per Pincode", color_discrete='#1f77b4')
+        figures.update_layout(fig1, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                              xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+
+        fig2 = figures.bar(dealers_per_pin, x='pincode', y='dealers', title="Dealers per Pincode", color_discrete='#ff7f0e')
+        figures.update_layout(fig2, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                              xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+
+        fig3 = figures.bar(user_totals, x='user_id', y='req_qty', title="Deal Requests per User", 
+                           color='pincode', category_orders={'user_id': user_order})
+        figures.update_layout(fig3, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                              xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+
+        fig4 = figures.bar(dealers_df_exp, x='coname' if 'coname' in dealers_df_exp.columns else '_id', y='cat_disp_names', 
+                           title="Dealer Product Categories", color='pincode', 
+                           hover_data=['phone_no', 'addr1', 'addr2', 'landmark', 'city', 'subcat_disp_names', 'Imgurl'])
+        figures.update_layout(fig4, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                              xaxis={'tickangle': 45, 'tickmode': 'auto', 'automargin': True}, yaxis={'automargin': True})
+
+        fig5 = figures.line(onboarding, x='onboarding_date', y='new_users', title="New Users Onboarding Timeline", 
+                            color='pincode', markers=True, render_mode=charts.render_mode(len(onboarding)))
+        figures.update_layout(fig5, autosize=True, height=300, margin=dict(l=40, r=20, t=40, b=60), 
+                              xaxis={'tickangle': 0, 'title': 'Onboarding Date', 'automargin': True}, 
+                              yaxis={'title': 'New Users', 'automargin': True})
+
+        return figures.to_json(fig1), figures.to_json(fig2), figures.to_json(fig3), figures.to_json(fig4), figures.to_json(fig5)
     except Exception as e:
         logger.error(f"Error creating graphs: {e}")
         return {'data': [], 'layout': {}}, {'data': [], 'layout': {}}, {'data': [], 'layout': {}}, {'data': [], 'layout': {}}, {'data': [], 'layout': {}}
 
-def filter_deals_by_date(deals_df, deals_full_df, date_str):
-    try:
-        target_date = pd.to_datetime(date_str).date()
-        deals_df['deal_date'] = pd.to_datetime(deals_df.get('created_at', deals_df.get('deal_date', pd.Series([pd.NaT] * len(deals_df))))).dt.date
-        deals_full_df['deal_date'] = pd.to_datetime(deals_full_df.get('created_at', deals_full_df.get('deal_date', pd.Series([pd.NaT] * len(deals_full_df))))).dt.date
-        filtered_deals = pd.concat([
-            deals_df[deals_df['deal_date'] == target_date],
-            deals_full_df[deals_full_df['deal_date'] == target_date]
-        ])
-        return filtered_deals[['user_id', 'user_name', 'pincode', 'req_qty', 'deal_date']].to_dict('records')
-    except ValueError as e:
-        logger.error(f"Error filtering deals by date: {e}")
-        return []
+artifact_store.register('users_map', create_users_map, 'deals_df')
+artifact_store.register('dealers_map', create_dealers_map, 'dealers_df')
+artifact_store.register('relation_map', create_relational_map, 'deals_df', 'dealers_df')
+artifact_store.register('new_users_map', create_new_users_map, 'users_df')
+artifact_store.register(GRAPH_KEYS, create_graphs, 'deals_df', 'dealers_df', 'users_df')
+artifact_store.register('category_index', CategoryIndex.from_frame, 'dealers_df')
+artifact_store.register('dealers_pincode_index', partial(GroupIndex.from_frames, 'pincode'), 'dealers_df')
+artifact_store.register('deals_pincode_index', partial(GroupIndex.from_frames, 'pincode'), 'deals_df', 'deals_full_df')
+artifact_store.register('deals_date_index', partial(DateIndex.from_frames, 'created_epoch'), 'deals_df', 'deals_full_df')
 
-def filter_dealers_by_category(dealers_df, category):
+def _deal_dates(deals_df):
+    epochs = deals_df['created_epoch'] if 'created_epoch' in deals_df.columns else parse_epoch(deals_df['created_at'])
+    return epoch_dates(epochs).to_numpy()
+
+DEAL_DATE_COLUMNS = ['user_id', 'user_name', 'pincode', 'req_qty', 'deal_date']
+DEALER_COLUMNS = ['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names']
+
+@metrics.timed('filter.deal_date')
+def match_deals_by_date(deals_df, deals_full_df, date_str, date_to=None, date_index=None):
+    start, stop = day_range(date_str, date_to)
+    if date_index is None:
+        date_index = DateIndex.from_frames('created_epoch', deals_df, deals_full_df)
+    return date_index.take(start, stop, deals_df, deals_full_df)
+
+@metrics.timed('filter.dealer_category')
+def match_dealers_by_category(dealers_df, category, category_index=None):
     if not category:
-        return []
-    filtered_dealers = dealers_df[dealers_df['cat_disp_names'].str.contains(category, case=False, na=False)]
-    return filtered_dealers[['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names']].to_dict('records')
+        return dealers_df.iloc[:0]
+    if category_index is not None:
+        return dealers_df.iloc[category_index.search(category)]
+    return dealers_df[dealers_df['cat_disp_names'].str.contains(category, case=False, na=False)]
 
-def filter_dealers_by_pincode(dealers_df, pincode):
+@metrics.timed('filter.dealer_pincode')
+def match_dealers_by_pincode(dealers_df, pincode, pincode_index=None):
     if not pincode:
-        return []
-    filtered_dealers = dealers_df[dealers_df['pincode'] == pincode]
-    return filtered_dealers[['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names']].to_dict('records')
+        return dealers_df.iloc[:0]
+    if pincode_index is not None:
+        return pincode_index.take(pincode, dealers_df)
+    return dealers_df[dealers_df['pincode'] == pincode]
 
-def filter_deals_by_pincode(deals_df, deals_full_df, dealers_df, pincode):
+@metrics.timed('filter.deals_pincode')
+def match_deals_by_pincode(deals_df, deals_full_df, pincode, pincode_index=None):
     if not pincode:
-        return []
-    deals_df['deal_date'] = pd.to_datetime(deals_df.get('created_at', deals_df.get('deal_date', pd.Series([pd.NaT] * len(deals_df))))).dt.date
-    deals_full_df['deal_date'] = pd.to_datetime(deals_full_df.get('created_at', deals_full_df.get('deal_date', pd.Series([pd.NaT] * len(deals_full_df))))).dt.date
-    filtered_deals = pd.concat([
+        return deals_df.iloc[:0]
+    if pincode_index is not None:
+        return pincode_index.take(pincode, deals_df, deals_full_df)
+    return pd.concat([
         deals_df[deals_df['pincode'] == pincode],
         deals_full_df[deals_full_df['pincode'] == pincode]
     ])
+
+def _records(df):
+    # NaN is not valid JSON; missing cells become None.
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def deal_date_records(deals):
+    deals = deals.copy()
+    deals['deal_date'] = [date.isoformat() if pd.notna(date) else 'N/A' for date in _deal_dates(deals)]
+    return _records(deals[DEAL_DATE_COLUMNS])
+
+def dealer_records(dealers):
+    return _records(dealers[DEALER_COLUMNS])
+
+def deal_pincode_records(deals, dealers_df):
+    deals = deals.copy()
+    deals['deal_date'] = _deal_dates(deals)
     results = []
-    for _, deal in filtered_deals.iterrows():
+    for _, deal in deals.iterrows():
         dealer_name = deal.get('dealerinfo.coname', '')
         if not dealer_name:
             dealer_id = deal.get('dealerinfo.dealer_id', '')
@@ -370,56 +416,142 @@ def filter_deals_by_pincode(deals_df, deals_full_df, dealers_df, pincode):
             'req_qty': deal['req_qty'],
             'deal_date': deal['deal_date'].strftime('%Y-%m-%d') if pd.notna(deal['deal_date']) else 'N/A'
         })
-    return results
+    return _records(pd.DataFrame(results)) if results else []
+
+def match_filter(analysis, filter_type, filter_value, filter_value_to=None):
+    """Return ``(matches, to_records)`` for a filter; ``to_records`` serializes any slice of ``matches``.
+
+    Raises ValueError for an unknown filter type or an unparseable date.
+    """
+    if filter_type == 'deal_date':
+        matches = match_deals_by_date(analysis['deals_df'], analysis['deals_full_df'], filter_value, filter_value_to,
+                                      analysis['deals_date_index'])
+        return matches, deal_date_records
+    if filter_type == 'dealer_category':
+        return match_dealers_by_category(analysis['dealers_df'], filter_value, analysis['category_index']), dealer_records
+    if filter_type == 'dealer_pincode':
+        return match_dealers_by_pincode(analysis['dealers_df'], filter_value, analysis['dealers_pincode_index']), dealer_records
+    if filter_type == 'deals_pincode':
+        matches = match_deals_by_pincode(analysis['deals_df'], analysis['deals_full_df'], filter_value,
+                                         analysis['deals_pincode_index'])
+        return matches, partial(deal_pincode_records, dealers_df=analysis['dealers_df'])
+    raise ValueError(f"Unknown filter type: {filter_type}")
+
+def filter_page(analysis, filter_type, filter_value, filter_value_to=None, cursor=None, limit=None):
+    matches, to_records = match_filter(analysis, filter_type, filter_value, filter_value_to)
+    # The version changes when rows are appended, so cursors from before no longer match.
+    key = query_key(analysis.set_number, analysis.get('version', 0), filter_type, filter_value, filter_value_to)
+    return paginate(matches, key, metrics.timed('filter.records')(to_records), cursor, limit)
+
+def _no_progress(stage):
+    pass
+
+# Natural keys used to drop rows of a delta upload that are already in the set.
+DEAL_KEYS = ['_id']
+USER_KEYS = ['userid']
+
+def deal_aggregates():
+    """Distinct-row aggregates behind the deal KPIs, keyed by the name they are stored under."""
+    return {
+        'deal_users': ingest.Distinct(['user_id']),
+        'deal_pairs': ingest.Distinct(['user_id', 'req_qty']),
+        'responded_pairs': ingest.Distinct(['user_id', 'req_qty'], where=lambda df: df['req_qty'] > 0)
+    }
+
+def save_deal_aggregates(set_folder, aggregates):
+    for name, aggregate in aggregates.items():
+        aggregate.save(set_folder, f'kpi_{name}')
+
+def count_new_users(users_df):
+    current_date = datetime(2025, 4, 15)
+    thirty_days_ago = current_date - timedelta(days=30)
+    return len(users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())])
 
-def perform_analysis(deals_path, dealers_path, users_path, deals_full_path):
+def deal_kpis(total_users, new_users, total_deals, aggregates):
+    unique_deals = len(aggregates['deal_pairs'])
+    unique_deals_with_response = len(aggregates['responded_pairs'])
+    return {
+        'total_users': total_users,
+        'total_visits': total_deals,
+        'new_users': new_users,
+        'active_users': len(aggregates['deal_users']),
+        'total_deals': total_deals,
+        'unique_deals': unique_deals,
+        'new_user_deal_ratio': (unique_deals / new_users) * 100 if new_users > 0 else 0,
+        'response_ratio': (unique_deals_with_response / unique_deals) * 100 if unique_deals > 0 else 0
+    }
+
+def perform_analysis(deals_path, dealers_path, users_path, deals_full_path, progress=_no_progress, render=True,
+                     file_hashes=None):
+    """Analyse the four exports; ``file_hashes`` (``{kind: digest}``) lets files seen before reuse their frames."""
     try:
-        deals_df = process_deals_data(deals_path)
-        dealers_df = process_dealers_data(dealers_path)
-        users_df = process_users_data(users_path)
-        deals_full_df = process_deals_full_data(deals_full_path)
+        file_hashes = file_hashes or {}
+        # KPI aggregates, updated chunk by chunk when a deal export is streamed.
+        deal_rows = ingest.RowCount()
+        aggregates = deal_aggregates()
+        progress('process_deals')
+        deals_df = content_cache.frame(
+            file_hashes.get('deals'), deals_path, 'deals',
+            lambda: ingest.load(deals_path, 'deals', process_deals_data, clean_deals_data,
+                                [deal_rows, *aggregates.values()], compact_deals, **DEALS_CSV_OPTIONS))
+        progress('process_dealers')
+        dealers_df = content_cache.frame(
+            file_hashes.get('dealers'), dealers_path, 'dealers',
+            lambda: columnar.load_or_process(dealers_path, 'dealers', process_dealers_data, compact_dealers))
+        progress('process_users')
+        users_df = content_cache.frame(
+            file_hashes.get('users'), users_path, 'users',
+            lambda: columnar.load_or_process(users_path, 'users', process_users_data, compact_users))
+        progress('process_deals_full')
+        deals_full_df = content_cache.frame(
+            file_hashes.get('deals_full'), deals_full_path, 'deals_full',
+            lambda: ingest.load(deals_full_path, 'deals_full', process_deals_full_data, clean_deals_full_data,
+                                [deal_rows, aggregates['deal_pairs']], compact_deals_full, **DEALS_CSV_OPTIONS))
         if deals_df.empty or dealers_df.empty or users_df.empty or deals_full_df.empty:
             error_msg = f"Error: No valid data found. Dealers: {len(dealers_df)}, Deals: {len(deals_df)}, Users: {len(users_df)}, Deals Full: {len(deals_full_df)}"
             logger.error(error_msg)
             return None, error_msg
-        users_map = create_users_map(deals_df)
-        dealers_map = create_dealers_map(dealers_df)
-        relation_map = create_relational_map(deals_df, dealers_df)
-        new_users_map = create_new_users_map(users_df)
-        graph1, graph2, graph3, graph4, graph5 = create_graphs(deals_df, dealers_df, users_df)
-        if not all([graph1, graph2, graph3, graph4, graph5]):
-            error_msg = "Error: Failed to create one or more graphs."
-            logger.error(error_msg)
-            return None, error_msg
-        total_users = len(users_df)
-        total_visits = len(deals_df) + len(deals_full_df)
-        current_date = datetime(2025, 4, 15)
-        thirty_days_ago = current_date - timedelta(days=30)
-        new_users = len(users_df[users_df['createEpoch'] >= int(thirty_days_ago.timestamp())])
-        active_users = len(deals_df['user_id'].drop_duplicates())
-        total_deals = len(deals_df) + len(deals_full_df)
-        unique_deals = len(pd.concat([deals_df, deals_full_df]).drop_duplicates(subset=['user_id', 'req_qty']))
-        new_user_deal_ratio = (unique_deals / new_users) * 100 if new_users > 0 else 0
-        unique_deals_with_response = len(deals_df[deals_df['req_qty'] > 0].drop_duplicates(subset=['user_id', 'req_qty']))
-        response_ratio = (unique_deals_with_response / unique_deals) * 100 if unique_deals > 0 else 0
+        for name, df in (('deals', deals_df), ('dealers', dealers_df), ('users', users_df), ('deals_full', deals_full_df)):
+            metrics.ROWS_PROCESSED.inc(len(df), frame=name)
+        progress('index')
+        artifacts = {
+            'category_index': CategoryIndex.from_frame(dealers_df),
+            'dealers_pincode_index': GroupIndex.from_frames('pincode', dealers_df),
+            'deals_pincode_index': GroupIndex.from_frames('pincode', deals_df, deals_full_df),
+            'deals_date_index': DateIndex.from_frames('created_epoch', deals_df, deals_full_df)
+        }
+        if render:
+            progress('render')
+            rendered = render_all({
+                'users_map': (create_users_map, 'deals'),
+                'dealers_map': (create_dealers_map, 'dealers'),
+                'relation_map': (create_relational_map, 'deals', 'dealers'),
+                'new_users_map': (create_new_users_map, 'users'),
+                'graphs': (create_graphs, 'deals', 'dealers', 'users')
+            }, {'deals': deals_df, 'dealers': dealers_df, 'users': users_df}, os.path.dirname(deals_path))
+            graph1, graph2, graph3, graph4, graph5 = rendered['graphs']
+            if not all([graph1, graph2, graph3, graph4, graph5]):
+                error_msg = "Error: Failed to create one or more graphs."
+                logger.error(error_msg)
+                return None, error_msg
+            artifacts.update({
+                'users_map': rendered['users_map'],
+                'dealers_map': rendered['dealers_map'],
+                'relation_map': rendered['relation_map'],
+                'new_users_map': rendered['new_users_map'],
+                'graph1': graph1,
+                'graph2': graph2,
+                'graph3': graph3,
+                'graph4': graph4,
+                'graph5': graph5
+            })
+        progress('kpis')
+        # Kept with the set so appended deltas only have to update them.
+        save_deal_aggregates(os.path.dirname(deals_path), aggregates)
         return {
-            'users_map': users_map,
-            'dealers_map': dealers_map,
-            'relation_map': relation_map,
-            'new_users_map': new_users_map,
-            'graph1': graph1,
-            'graph2': graph2,
-            'graph3': graph3,
-            'graph4': graph4,
-            'graph5': graph5,
-            'total_users': total_users,
-            'total_visits': total_visits,
-            'new_users': new_users,
-            'active_users': active_users,
-            'total_deals': total_deals,
-            'unique_deals': unique_deals,
-            'new_user_deal_ratio': new_user_deal_ratio,
-            'response_ratio': response_ratio,
+            **artifacts,
+            **deal_kpis(len(users_df), count_new_users(users_df), len(deal_rows), aggregates),
+            'file_hashes': file_hashes,
             'file_paths': {
                 'deals': deals_path,
                 'dealers': dealers_path,
@@ -436,14 +568,203 @@ def perform_analysis(deals_path, dealers_path, users_path, deals_full_path):
         logger.error(error_msg)
         return None, error_msg
 
+def append_to_analysis(set_number, deals_path=None, users_path=None, deals_full_path=None, progress=_no_progress):
+    """Append delta exports to a stored set and update its KPIs from the new rows only.
+
+    Rows whose natural key the set already has are skipped. Returns
+    ``(added, error)`` with the number of new rows per file; maps, graphs and
+    indexes are rebuilt on next access.
+    """
+    try:
+        with artifact_store.update_lock(set_number):
+            analysis = artifact_store.load(set_number)
+            if analysis is None:
+                return None, f"Error: Set {set_number} does not exist."
+            set_folder = analysis.set_folder
+            aggregates = deal_aggregates()
+            if not all(aggregate.restore(set_folder, f'kpi_{name}') for name, aggregate in aggregates.items()):
+                # Sets analysed before the aggregates were stored rebuild them once from their frames.
+                progress('restore_kpis')
+                aggregates = deal_aggregates()
+                for aggregate in aggregates.values():
+                    aggregate.update(analysis['deals_df'])
+                aggregates['deal_pairs'].update(analysis['deals_full_df'])
+            added = {}
+            for name, path, loader, keys, compaction in (
+                    ('deals', deals_path, process_deals_data, DEAL_KEYS, compact_deals),
+                    ('deals_full', deals_full_path, process_deals_full_data, DEAL_KEYS, compact_deals_full),
+                    ('users', users_path, process_users_data, USER_KEYS, compact_users)):
+                if path:
+                    progress(f'read_{name}')
+                    added[name] = delta.load_new_rows(path, set_folder, name, loader, keys, compaction)
+            if all(df.empty for df in added.values()):
+                logger.info(f"Nothing new to append to set {set_number}")
+                return {name: 0 for name in added}, None
+            progress('append')
+            for name, df in added.items():
+                if not df.empty:
+                    columnar.append_frame(df, set_folder, name)
+                    metrics.ROWS_PROCESSED.inc(len(df), frame=name)
+            progress('kpis')
+            new_deals = added.get('deals', pd.DataFrame())
+            new_deals_full = added.get('deals_full', pd.DataFrame())
+            new_users_df = added.get('users', pd.DataFrame())
+            if not new_deals.empty:
+                for aggregate in aggregates.values():
+                    aggregate.update(new_deals)
+            if not new_deals_full.empty:
+                aggregates['deal_pairs'].update(new_deals_full)
+            save_deal_aggregates(set_folder, aggregates)
+            total_users = analysis['total_users'] + len(new_users_df)
+            new_users = analysis['new_users'] + (count_new_users(new_users_df) if not new_users_df.empty else 0)
+            total_deals = analysis['total_deals'] + len(new_deals) + len(new_deals_full)
+            file_paths = dict(analysis['file_paths'])
+            file_paths['deltas'] = [*file_paths.get('deltas', []),
+                                    {'deals': deals_path, 'users': users_path, 'deals_full': deals_full_path}]
+            progress('store')
+            artifact_store.update(set_number, {**deal_kpis(total_users, new_users, total_deals, aggregates),
+                                               'file_paths': file_paths})
+            return {name: len(df) for name, df in added.items()}, None
+    except Exception as e:
+        error_msg = f"Error appending to set {set_number}: {e}"
+        logger.error(error_msg)
+        return None, error_msg
+
+def run_analysis_job(job, set_number, deals_path, dealers_path, users_path, deals_full_path, file_hashes=None):
+    try:
+        with metrics.Stages('analysis', job.enter_stage) as stages:
+            analysis_data, error = perform_analysis(deals_path, dealers_path, users_path, deals_full_path,
+                                                    progress=stages, render=not LAZY_ARTIFACTS, file_hashes=file_hashes)
+            if error:
+                raise RuntimeError(error)
+            stages('store')
+            artifact_store.save(set_number, analysis_data)
+    except Exception:
+        manifest.set_state(set_number, FAILED)
+        raise
+    manifest.set_state(set_number, READY, rows={name: len(analysis_data[key]) for key, name in FRAME_KEYS.items()})
+
+def run_append_job(job, set_number, deals_path, users_path, deals_full_path):
+    with metrics.Stages('append', job.enter_stage) as stages:
+        added, error = append_to_analysis(set_number, deals_path, users_path, deals_full_path, progress=stages)
+    if error:
+        raise RuntimeError(error)
+    manifest.add_rows(set_number, added)
+
+def save_upload(file, path, kind):
+    """Write an uploaded file to ``path`` and return the SHA-256 of its content."""
+    digest = save_hashed(file.stream, path)
+    metrics.UPLOAD_BYTES.inc(os.path.getsize(path), kind=kind)
+    return digest
+
+def existing_analysis(file_hashes):
+    """``(set_number, job_id)`` of this session's analysis of exactly these files, or None.
+
+    ``job_id`` is None when that analysis is done, or the job still running
+    it. A set that has since been appended to no longer counts. Sets of other
+    sessions are never reused; a new set made from the same files gets their
+    frames and artifacts from the content cache instead.
+    """
+    for entry in reversed(manifest.sets(session.get('analysis_sets', []))):
+        if {kind: file.get('sha256') for kind, file in entry['files'].items()} != file_hashes:
+            continue
+        set_number = entry['set_number']
+        analysis = artifact_store.load(set_number)
+        if analysis is not None:
+            if not analysis.get('version', 0):
+                return set_number, None
+            continue
+        job_id = session['pending_jobs'].get(str(set_number))
+        job = job_queue.status(job_id) if job_id else None
+        if job and job['state'] in (QUEUED, RUNNING):
+            return set_number, job_id
+    return None
+
+def owns_set(set_number):
+    """Whether ``set_number`` is one of the sets uploaded in this session."""
+    return set_number is not None and set_number in session.get('analysis_sets', [])
+
+def load_owned_set(set_number):
+    """The stored analysis of ``set_number``, or None unless the set belongs to this session."""
+    return artifact_store.load(set_number) if owns_set(set_number) else None
+
+@app.before_request
+def start_request_timing():
+    g.request_started = metrics.start_request()
+
+@app.after_request
+def add_server_timing(response):
+    if 'request_started' in g:
+        response.headers['Server-Timing'] = metrics.server_timing(g.request_started)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.exposition(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = job_queue.status(job_id)
+    # Jobs of other sessions are as unknown as jobs that do not exist.
+    if status is None or not (job_id in session.get('pending_jobs', {}).values()
+                              or owns_set(status.get('set_number'))):
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+def send_artifact(path, etag, mimetype):
+    # Artifacts only change when a set is re-analysed, so browsers keep them and revalidate by ETag.
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = None
+    return response
+
+@app.route('/sets/<int:set_number>/maps/<kind>')
+def map_artifact(set_number, kind):
+    if not owns_set(set_number):
+        abort(404)
+    stored = artifact_store.map_file(set_number, kind)
+    if stored is None:
+        abort(404)
+    return send_artifact(*stored, 'text/html')
+
+@app.route('/sets/<int:set_number>/graphs/<graph_id>')
+def graph_artifact(set_number, graph_id):
+    if not owns_set(set_number):
+        abort(404)
+    # Numeric arrays come as base64 typed arrays, which the pinned plotly.js decodes.
+    stored = artifact_store.graph_file(set_number, graph_id)
+    if stored is None:
+        abort(404)
+    return send_artifact(*stored, 'application/json')
+
+@app.route('/api/sets/<int:set_number>/filter', methods=['GET', 'POST'])
+def filter_api(set_number):
+    analysis = load_owned_set(set_number)
+    if analysis is None:
+        return jsonify({'error': 'Unknown set'}), 404
+    try:
+        page = filter_page(analysis, request.values.get('filter_type'), request.values.get('filter_value'),
+                           request.values.get('filter_value_to') or None, request.values.get('cursor'),
+                           request.values.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
 @app.route('/', methods=['GET', 'POST'])
 def dashboard():
-    if 'analysis_sessions' not in session:
-        session['analysis_sessions'] = []
+    if 'analysis_sets' not in session:
+        session.pop('analysis_sessions', None)
+        session['analysis_sets'] = []
         session['current_set'] = None
+    if 'pending_jobs' not in session:
+        session['pending_jobs'] = {}
     filtered_data = None
+    filtered_page = None
     filter_type = None
     filter_value = None
+    filter_value_to = None
     if request.method == 'POST':
         if 'file_upload' in request.form:
             deals_file = request.files.get('deals_file')
@@ -458,53 +779,92 @@ def dashboard():
                 dealers_path = os.path.join(set_folder, secure_filename(dealers_file.filename))
                 users_path = os.path.join(set_folder, secure_filename(users_file.filename))
                 deals_full_path = os.path.join(set_folder, secure_filename(deals_full_file.filename))
-                deals_file.save(deals_path)
-                dealers_file.save(dealers_path)
-                users_file.save(users_path)
-                deals_full_file.save(deals_full_path)
-                analysis_data, error = perform_analysis(deals_path, dealers_path, users_path, deals_full_path)
-                if error:
-                    return error
-                session['analysis_sessions'].append({
-                    'set_number': set_number,
-                    'analysis': analysis_data
-                })
+                file_hashes = {
+                    'deals': save_upload(deals_file, deals_path, 'deals'),
+                    'dealers': save_upload(dealers_file, dealers_path, 'dealers'),
+                    'users': save_upload(users_file, users_path, 'users'),
+                    'deals_full': save_upload(deals_full_file, deals_full_path, 'deals_full')
+                }
+                existing = existing_analysis(file_hashes)
+                if existing:
+                    # This session uploaded the same four files before: show the analysis made from them.
+                    manifest.remove(set_number)
+                    shutil.rmtree(set_folder, ignore_errors=True)
+                    set_number, job_id = existing
+                    logger.info(f"Upload matches set {set_number}; reusing it")
+                else:
+                    manifest.record_files(set_number, describe_files(
+                        {'deals': deals_path, 'dealers': dealers_path, 'users': users_path, 'deals_full': deals_full_path},
+                        file_hashes), state=ANALYZING)
+                    job_id = job_queue.submit(run_analysis_job, set_number, deals_path, dealers_path, users_path,
+                                              deals_full_path, file_hashes=file_hashes, meta={'set_number': set_number})
+                if set_number not in session['analysis_sets']:
+                    session['analysis_sets'].append(set_number)
+                if job_id:
+                    session['pending_jobs'][str(set_number)] = job_id
                 session['current_set'] = set_number
                 session.modified = True
+                if request.accept_mimetypes.best == 'application/json':
+                    if job_id:
+                        return jsonify({'job_id': job_id, 'set_number': set_number}), 202
+                    return jsonify({'set_number': set_number, 'reused': True})
+        elif 'append_upload' in request.form:
+            set_number = session['current_set']
+            if not owns_set(set_number):
+                abort(404)
+            delta_files = {kind: request.files.get(f'{kind}_file') for kind in ('deals', 'users', 'deals_full')}
+            delta_files = {kind: file for kind, file in delta_files.items() if file}
+            if delta_files and artifact_store.exists(set_number):
+                delta_folder = os.path.join(artifact_store.set_folder(set_number), 'deltas',
+                                            datetime.now().strftime('%Y%m%d%H%M%S%f'))
+                os.makedirs(delta_folder, exist_ok=True)
+                delta_paths = {}
+                for kind, file in delta_files.items():
+                    delta_paths[kind] = os.path.join(delta_folder, f'{kind}_{secure_filename(file.filename)}')
+                    save_upload(file, delta_paths[kind], f'{kind}_delta')
+                job_id = job_queue.submit(run_append_job, set_number, delta_paths.get('deals'), delta_paths.get('users'),
+                                          delta_paths.get('deals_full'), meta={'set_number': set_number, 'action': 'append'})
+                session['pending_jobs'][str(set_number)] = job_id
+                session.modified = True
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify({'job_id': job_id, 'set_number': set_number}), 202
         elif 'load_session' in request.form:
-            set_number = int(request.form['set_number'])
+            set_number = request.form.get('set_number', type=int)
+            if not owns_set(set_number):
+                abort(404)
             session['current_set'] = set_number
             session.modified = True
         elif 'filter' in request.form:
             filter_type = request.form.get('filter_type')
             filter_value = request.form.get('filter_value')
-            current_analysis = None
-            if session['current_set']:
-                for s in session['analysis_sessions']:
-                    if s['set_number'] == session['current_set']:
-                        current_analysis = s['analysis']
-                        break
+            filter_value_to = request.form.get('filter_value_to')
+            current_analysis = load_owned_set(session['current_set'])
             if current_analysis:
-                if filter_type == 'deal_date':
-                    filtered_data = filter_deals_by_date(current_analysis['deals_df'], current_analysis['deals_full_df'], filter_value)
-                elif filter_type == 'dealer_category':
-                    filtered_data = filter_dealers_by_category(current_analysis['dealers_df'], filter_value)
-                elif filter_type == 'dealer_pincode':
-                    filtered_data = filter_dealers_by_pincode(current_analysis['dealers_df'], filter_value)
-                elif filter_type == 'deals_pincode':
-                    filtered_data = filter_deals_by_pincode(current_analysis['deals_df'], current_analysis['deals_full_df'], current_analysis['dealers_df'], filter_value)
-    current_analysis = None
-    if session['current_set']:
-        for s in session['analysis_sessions']:
-            if s['set_number'] == session['current_set']:
-                current_analysis = s['analysis']
-                break
+                try:
+                    # Only the first page is rendered; the table pulls further pages from the filter API.
+                    filtered_page = filter_page(current_analysis, filter_type, filter_value, filter_value_to)
+                    filtered_data = filtered_page['items']
+                except ValueError as e:
+                    logger.error(f"Error applying filter {filter_type}: {e}")
+                    filtered_data = []
+    current_analysis = load_owned_set(session['current_set'])
+    pending_job = None
+    if session['current_set'] is not None:
+        job_id = session['pending_jobs'].get(str(session['current_set']))
+        job = job_queue.status(job_id) if job_id else None
+        # An append job runs on a set that already has an analysis, so its state decides.
+        if job_id and (not current_analysis or job and job['state'] in (QUEUED, RUNNING)):
+            pending_job = {'job_id': job_id, 'set_number': session['current_set'],
+                           'verb': 'Appending to' if job and job.get('action') == 'append' else 'Analyzing'}
+        elif job_id:
+            session['pending_jobs'].pop(str(session['current_set']))
+            session.modified = True
     html_template = """
     <!DOCTYPE html>
     <html>
     <head>
         <title>Business Analytics Portal</title>
-        <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+        <script src="{{ plotlyjs_url }}"></script>
         <style>
             body { margin: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #0e1111; color: #F0F0F0; }
             .header { background: #0e1111; padding: 15px; text-align: center; box-shadow: 0 4px 12px rgba(0,0,0,0.3); position: relative; }
@@ -533,6 +893,7 @@ def dashboard():
             .container.no-sidebar { margin-left: 0; }
             .map-box, .graph-box { background: #0e1111; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 12px rgba(0,0,0,0.2); text-align: center; }
             .map-box { height: 400px; width: 45%; min-width: 300px; }
+            .map-frame { width: 100%; height: calc(100% - 40px); border: none; display: block; }
             .graph-box { height: 350px; width: 45%; min-width: 300px; position: relative; }
             .map-title, .graph-title { padding: 10px; background: #FAF9F6; text-align: center; font-size: 16px; font-weight: bold; color: #09141C; }
             .fullscreen-btn { position: absolute; top: 10px; right: 10px; padding: 5px 10px; background: #3498db; border: none; border-radius: 5px; color: #000; cursor: pointer; }
@@ -549,8 +910,10 @@ def dashboard():
             .data-table tr:hover { background: #ddd; }
             .export-btn { display: block; margin: 10px auto; padding: 8px 16px; background: #3498db; color: #000; border: none; border-radius: 5px; cursor: pointer; }
             .export-btn:hover { background: #2980b9; }
+            .page-status { text-align: center; color: #F0F0F0; font-size: 14px; }
+            .job-banner { margin: 10px 10px 10px 220px; padding: 10px; border-radius: 8px; background: #FAF9F6; color: #09141C; text-align: center; font-size: 14px; }
             @media (max-width: 1000px) {
-                .container, .overview { margin-left: 0; }
+                .container, .overview, .job-banner { margin-left: 0; }
                 .sidebar { position: static; width: 100%; height: auto; transform: none; }
                 .toggle-sidebar { display: none; }
                 .map-box, .graph-box { width: 90%; }
@@ -565,8 +928,9 @@ def dashboard():
             <div class="controls">
                 <select onchange="loadSession(this.value)">
                     <option value="">Select Previous Set</option>
-                    {% for s in analysis_sessions %}
-                        <option value="{{ s.set_number }}" {% if s.set_number == current_set %}selected{% endif %}>Set {{ s.set_number }}</option>
+                    {% for set_number in analysis_sets %}
+                        {% set info = set_info.get(set_number) %}
+                        <option value="{{ set_number }}" {% if set_number == current_set %}selected{% endif %}>Set {{ set_number }}{% if info %} ({{ info.created_at[:16] | replace('T', ' ') }}{% if info.rows.deals %}, {{ info.rows.deals }} deals{% endif %}{% if info.state == 'failed' %}, failed{% endif %}){% endif %}</option>
                     {% endfor %}
                 </select>
                 <button onclick="refreshData()">Refresh</button>
@@ -586,7 +950,23 @@ def dashboard():
                 <input type="file" name="dealers_file" id="dealers_file" accept=".csv" required>
                 <button type="submit">Analyze</button>
             </form>
+            {% if current_analysis %}
+                <form method="post" enctype="multipart/form-data" style="margin-top: 20px;">
+                    <input type="hidden" name="append_upload" value="true">
+                    <label>Append to Set {{ current_set }}</label>
+                    <label for="append_users_file">New Users CSV</label>
+                    <input type="file" name="users_file" id="append_users_file" accept=".csv">
+                    <label for="append_deals_full_file">New Deals Full Dump CSV</label>
+                    <input type="file" name="deals_full_file" id="append_deals_full_file" accept=".csv">
+                    <label for="append_deals_file">New Deals vs Dealers CSV</label>
+                    <input type="file" name="deals_file" id="append_deals_file" accept=".csv">
+                    <button type="submit">Append</button>
+                </form>
+            {% endif %}
         </div>
+        {% if pending_job %}
+            <div class="job-banner" id="job-banner">{{ pending_job.verb }} Set {{ pending_job.set_number }}... (job {{ pending_job.job_id }})</div>
+        {% endif %}
         {% if current_analysis %}
             <div class="overview">
                 <div class="card">
@@ -643,20 +1023,20 @@ def dashboard():
             <div class="container" id="container">
                 <div class="map-box">
                     <div class="map-title">Users Map</div>
-                    {{ current_analysis.users_map|safe }}
+                    <iframe class="map-frame" src="{{ url_for('map_artifact', set_number=current_set, kind='users_map') }}" loading="lazy" title="Users Map"></iframe>
                 </div>
                 <div class="map-box">
                     <div class="map-title">Dealers Map</div>
-                    {{ current_analysis.dealers_map|safe }}
+                    <iframe class="map-frame" src="{{ url_for('map_artifact', set_number=current_set, kind='dealers_map') }}" loading="lazy" title="Dealers Map"></iframe>
                 </div>
                 <div class="map-box">
                     <div class="map-title">Relational Map</div>
-                    {{ current_analysis.relation_map|safe }}
+                    <iframe class="map-frame" src="{{ url_for('map_artifact', set_number=current_set, kind='relation_map') }}" loading="lazy" title="Relational Map"></iframe>
                 </div>
-                {% if current_analysis.new_users_map %}
+                {% if current_analysis.new_users %}
                     <div class="map-box">
                         <div class="map-title">New Users Map</div>
-                        {{ current_analysis.new_users_map|safe }}
+                        <iframe class="map-frame" src="{{ url_for('map_artifact', set_number=current_set, kind='new_users_map') }}" loading="lazy" title="New Users Map"></iframe>
                     </div>
                 {% endif %}
                 <div class="graph-box">
@@ -695,6 +1075,7 @@ def dashboard():
                             <option value="deals_pincode">Deals by Pincode</option>
                         </select>
                         <input type="text" name="filter_value" placeholder="e.g., 2025-04-01 or Kitchen" required>
+                        <input type="text" name="filter_value_to" placeholder="to date, e.g., 2025-04-15 (optional)">
                         <button type="submit">Filter</button>
                     </form>
                     {% if filtered_data %}
@@ -750,6 +1131,10 @@ def dashboard():
                                 {% endfor %}
                             </tbody>
                         </table>
+                        {% if filtered_page and filtered_page.next_cursor %}
+                            <p class="page-status" id="page-status">Showing {{ filtered_data|length }} of {{ filtered_page.total }}</p>
+                            <button class="export-btn" id="load-more" onclick="loadMoreRows()">Load more</button>
+                        {% endif %}
                         <button class="export-btn" onclick="exportTableToCSV()">Export to CSV</button>
                     {% endif %}
                 </div>
@@ -775,45 +1160,95 @@ def dashboard():
             </div>
         {% endif %}
         <script>
-            {% if current_analysis %}
-                var graphData = {
-                    graph1: {{ current_analysis.graph1 | tojson | default('{"data": [], "layout": {}}') | safe }},
-                    graph2: {{ current_analysis.graph2 | tojson | default('{"data": [], "layout": {}}') | safe }},
-                    graph3: {{ current_analysis.graph3 | tojson | default('{"data": [], "layout": {}}') | safe }},
-                    graph4: {{ current_analysis.graph4 | tojson | default('{"data": [], "layout": {}}') | safe }},
-                    graph5: {{ current_analysis.graph5 | tojson | default('{"data": [], "layout": {}}') | safe }}
-                };
-            {% else %}
-                var graphData = {
-                    graph1: {"data": [], "layout": {}},
-                    graph2: {"data": [], "layout": {}},
-                    graph3: {"data": [], "layout": {}},
-                    graph4: {"data": [], "layout": {}},
-                    graph5: {"data": [], "layout": {}}
-                };
-            {% endif %}
+            // Figures are fetched after the page is shown; graphData fills in as they arrive.
+            var graphData = {};
+            var graphUrls = {{ graph_urls | tojson }};
+            // The figures leave out the layout template they share; it is sent once here.
+            var plotlyTemplate = {{ plotly_template | tojson }};
 
-            function renderGraphs() {
-                if (!graphData || Object.keys(graphData).length === 0) {
-                    console.warn('No graph data available');
-                    return;
+            function plotGraph(graphId) {
+                var figure = graphData[graphId];
+                if (figure && Array.isArray(figure.data)) {
+                    Plotly.newPlot(graphId, figure.data, figure.layout || {}, { responsive: true });
+                } else {
+                    console.warn('Invalid data for ' + graphId + ':', figure);
+                    Plotly.newPlot(graphId, [], {}, { responsive: true }); // Render empty graph as fallback
                 }
+            }
+
+            function loadGraphs() {
+                Object.keys(graphUrls).forEach(function(graphId) {
+                    fetch(graphUrls[graphId])
+                        .then(function(response) {
+                            if (!response.ok) throw new Error('HTTP ' + response.status);
+                            return response.json();
+                        })
+                        .then(function(figure) {
+                            figure.layout = Object.assign({ template: plotlyTemplate }, figure.layout);
+                            graphData[graphId] = figure;
+                        })
+                        .catch(function(e) {
+                            console.error('Error loading ' + graphId + ':', e);
+                            graphData[graphId] = null;
+                        })
+                        .then(function() { plotGraph(graphId); });
+                });
+            }
+
+            function renderGraphs() {
                 try {
-                    ['graph1', 'graph2', 'graph3', 'graph4', 'graph5'].forEach(function(graphId) {
-                        var data = graphData[graphId];
-                        console.log('Rendering ' + graphId + ':', JSON.stringify(data)); // Detailed logging
-                        if (data && data.data && Array.isArray(data.data)) {
-                            Plotly.newPlot(graphId, data.data, data.layout || {}, { responsive: true });
-                        } else {
-                            console.warn('Invalid data for ' + graphId + ':', data);
-                            Plotly.newPlot(graphId, [], {}, { responsive: true }); // Render empty graph as fallback
-                        }
-                    });
+                    Object.keys(graphData).forEach(plotGraph);
                 } catch (e) {
-                    console.error('Error rendering graphs:', e, 'Graph data:', JSON.stringify(graphData));
+                    console.error('Error rendering graphs:', e);
                 }
             }
 
+            loadGraphs();
+
+            {% if filtered_page %}
+                var filterQuery = {
+                    filter_type: {{ filter_type | tojson }},
+                    filter_value: {{ filter_value | tojson }},
+                    filter_value_to: {{ (filter_value_to or '') | tojson }}
+                };
+                var nextCursor = {{ filtered_page.next_cursor | tojson }};
+                var filterTotal = {{ filtered_page.total }};
+                var filterColumns = {
+                    deal_date: ['user_id', 'user_name', 'pincode', 'req_qty', 'deal_date'],
+                    dealer_category: ['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names'],
+                    dealer_pincode: ['coname', 'pincode', 'phone_no', 'cat_disp_names', 'subcat_disp_names'],
+                    deals_pincode: ['user_id', 'user_name', 'dealer_name', 'pincode', 'req_qty', 'deal_date']
+                };
+
+                function loadMoreRows() {
+                    if (!nextCursor) return;
+                    var params = new URLSearchParams(filterQuery);
+                    params.set('cursor', nextCursor);
+                    fetch('{{ url_for('filter_api', set_number=current_set) }}?' + params.toString())
+                        .then(function(response) { return response.json(); })
+                        .then(function(page) {
+                            if (page.error) {
+                                console.error('Error loading rows:', page.error);
+                                return;
+                            }
+                            var tbody = document.querySelector('.data-table tbody');
+                            page.items.forEach(function(item) {
+                                var tr = document.createElement('tr');
+                                filterColumns[filterQuery.filter_type].forEach(function(column) {
+                                    var td = document.createElement('td');
+                                    td.textContent = item[column] === null || item[column] === undefined ? 'None' : item[column];
+                                    tr.appendChild(td);
+                                });
+                                tbody.appendChild(tr);
+                            });
+                            nextCursor = page.next_cursor;
+                            document.getElementById('page-status').textContent = 'Showing ' + tbody.rows.length + ' of ' + filterTotal;
+                            if (!nextCursor) document.getElementById('load-more').style.display = 'none';
+                        })
+                        .catch(function(e) { console.error('Error loading rows:', e); });
+                }
+            {% endif %}
+
             function toggleFullscreen(graphId) {
                 var graphDiv = document.getElementById(graphId);
                 if (graphDiv) {
@@ -888,7 +1323,7 @@ def dashboard():
                     }
                     csv.push(row.join(','));
                 }
-                var csvContent = 'data:text/csv;charset=utf-8,' + csv.join('\n');
+                var csvContent = 'data:text/csv;charset=utf-8,' + csv.join('\\n');
                 var encodedUri = encodeURI(csvContent);
                 var link = document.createElement('a');
                 link.setAttribute('href', encodedUri);
@@ -898,6 +1333,30 @@ def dashboard():
                 document.body.removeChild(link);
             }
 
+            {% if pending_job %}
+                function pollJob() {
+                    fetch('/jobs/{{ pending_job.job_id }}')
+                        .then(function(response) { return response.json(); })
+                        .then(function(job) {
+                            var banner = document.getElementById('job-banner');
+                            if (job.state === 'done') {
+                                loadSession('{{ pending_job.set_number }}');
+                            } else if (job.state === 'failed' || job.error) {
+                                banner.textContent = '{{ pending_job.verb }} Set {{ pending_job.set_number }} failed: ' + job.error;
+                            } else {
+                                var stage = job.stages && job.stages.length ? job.stages[job.stages.length - 1].name : job.state;
+                                banner.textContent = '{{ pending_job.verb }} Set {{ pending_job.set_number }}... (' + stage + ')';
+                                setTimeout(pollJob, 2000);
+                            }
+                        })
+                        .catch(function(e) {
+                            console.error('Error polling job:', e);
+                            setTimeout(pollJob, 5000);
+                        });
+                }
+                pollJob();
+            {% endif %}
+
             window.onload = function() {
                 var sidebar = document.getElementById('sidebar');
                 var container = document.getElementById('container');
@@ -909,7 +1368,6 @@ def dashboard():
                         overviews.forEach(overview => overview.classList.add('no-sidebar'));
                     }
                 }
-                renderGraphs();
             };
 
             window.onresize = function() {
@@ -919,13 +1377,22 @@ def dashboard():
     </body>
     </html>
     """
-    return render_template_string(html_template, 
-                                 current_analysis=current_analysis, 
-                                 analysis_sessions=session['analysis_sessions'], 
-                                 current_set=session['current_set'],
-                                 filtered_data=filtered_data,
-                                 filter_type=filter_type,
-                                 filter_value=filter_value)
+    with metrics.timer('render.dashboard'):
+        return render_template_string(html_template, 
+                                     current_analysis=current_analysis, 
+                                     analysis_sets=session['analysis_sets'], 
+                                     current_set=session['current_set'],
+                                     filtered_data=filtered_data,
+                                     filter_type=filter_type,
+                                     filter_value=filter_value,
+                                     filter_value_to=filter_value_to,
+                                     filtered_page=filtered_page,
+                                     pending_job=pending_job,
+                                     set_info={entry['set_number']: entry for entry in manifest.sets(session['analysis_sets'])},
+                                     plotlyjs_url=figures.plotlyjs_url(),
+                                     plotly_template=figures.template() if current_analysis else None,
+                                     graph_urls={key: url_for('graph_artifact', set_number=session['current_set'], graph_id=key)
+                                                 for key in GRAPH_KEYS} if current_analysis else {})
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1 @@
+"""Shared data-processing components for the Business Analytics Portal apps."""
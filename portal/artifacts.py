@@ -0,0 +1,349 @@
+"""Server-side store for the artifacts produced by ``perform_analysis``.
+
+Every analysis set owns ``set_N/artifacts`` on disk: one HTML file per folium
+map, one JSON file per Plotly figure and a ``summary.json`` with the KPIs and
+source file paths. Search indexes are stored as ``.npz`` files, and the
+cleaned frames live next to the CSVs in the columnar cache. Nothing is read
+until a key is first accessed, so the Flask session only has to remember set
+numbers.
+
+Maps and figures can also be left out of the initial save: builders
+registered with ``ArtifactStore.register`` produce them from the stored frames
+the first time they are requested, and the result is stored like any other
+artifact. Requests that arrive while a build is running wait for it instead of
+starting their own.
+
+``ArtifactStore.graph_file`` serves a figure with its numeric arrays packed
+as typed arrays (``figures.pack``); the packed copy is written next to the
+figure the first time it is asked for.
+
+With a ``ContentCache`` (``portal.content``), built artifacts are also kept
+under the hashes of the uploaded files they came from (the summary's
+``file_hashes``), and another set made from the same files gets them without
+building.
+
+When rows are appended to a set's frames, ``ArtifactStore.update`` records the
+new KPIs, bumps the set's ``version`` and drops everything the builders made,
+so maps, graphs and indexes are regenerated from the new frames.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from portal import columnar, figures, metrics
+from portal.search import CategoryIndex, DateIndex, GroupIndex
+
+logger = logging.getLogger(__name__)
+
+MAP_KEYS = ('users_map', 'dealers_map', 'relation_map', 'new_users_map')
+GRAPH_KEYS = ('graph1', 'graph2', 'graph3', 'graph4', 'graph5')
+FRAME_KEYS = {
+    'deals_df': 'deals',
+    'dealers_df': 'dealers',
+    'users_df': 'users',
+    'deals_full_df': 'deals_full'
+}
+# Index objects provide ``save(path)`` and a ``load(path)`` classmethod.
+INDEX_KEYS = {
+    'category_index': CategoryIndex,
+    'dealers_pincode_index': GroupIndex,
+    # Rows of deals_df followed by the rows of deals_full_df.
+    'deals_pincode_index': GroupIndex,
+    'deals_date_index': DateIndex
+}
+
+
+def _to_builtin(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _write_atomic(path, text):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _write_etag(path):
+    """Store the content hash of ``path`` next to it and return it."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    etag = digest.hexdigest()
+    _write_atomic(f'{path}.etag', etag)
+    return etag
+
+
+def _artifact_file(key):
+    if key in MAP_KEYS:
+        return f'{key}.html'
+    if key in INDEX_KEYS:
+        return f'{key}.npz'
+    return f'{key}.json'
+
+
+def _write_artifacts(artifact_folder, values):
+    """Write map/graph/index ``values``; a map that came out as None is recorded as absent."""
+    for key, value in values.items():
+        path = os.path.join(artifact_folder, _artifact_file(key))
+        if key in MAP_KEYS:
+            if value is None:
+                _write_atomic(f'{path}.none', '')
+                continue
+            _write_atomic(path, value)
+            _write_etag(path)
+        elif key in INDEX_KEYS:
+            value.save(path)
+        else:
+            text = value if isinstance(value, str) else json.dumps(value, default=_to_builtin)
+            _write_atomic(path, text)
+
+
+class SetArtifacts:
+    """Lazy, read-only view of one stored analysis set.
+
+    Supports ``artifacts['users_map']`` and ``artifacts.users_map`` (as used by
+    the dashboard template); each key is loaded from disk on first access, and
+    built first if it has not been generated yet.
+    """
+
+    def __init__(self, set_number, set_folder, store=None):
+        self.set_number = set_number
+        self.set_folder = set_folder
+        self.artifact_folder = os.path.join(set_folder, 'artifacts')
+        self._store = store
+        self._summary = None
+        self._loaded = {}
+
+    def _load_summary(self):
+        if self._summary is None:
+            with open(os.path.join(self.artifact_folder, 'summary.json'), encoding='utf-8') as f:
+                self._summary = json.load(f)
+        return self._summary
+
+    def _load(self, key):
+        if self._store is not None and key in self._store.builders:
+            self._store.build(self.set_number, key, self)
+        if key in MAP_KEYS:
+            path = os.path.join(self.artifact_folder, f'{key}.html')
+            if not os.path.exists(path):
+                return None
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        if key in GRAPH_KEYS:
+            with open(os.path.join(self.artifact_folder, f'{key}.json'), encoding='utf-8') as f:
+                return f.read()
+        if key in FRAME_KEYS:
+            return columnar.load_frame(self.set_folder, FRAME_KEYS[key])
+        if key in INDEX_KEYS:
+            return INDEX_KEYS[key].load(os.path.join(self.artifact_folder, _artifact_file(key)))
+        return self._load_summary()[key]
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            self._loaded[key] = self._load(key)
+        return self._loaded[key]
+
+    def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __contains__(self, key):
+        return (key in MAP_KEYS or key in GRAPH_KEYS or key in FRAME_KEYS or key in INDEX_KEYS
+                or key in self._load_summary())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class ArtifactStore:
+    """Per-set artifact store rooted at the upload folder (``<root>/set_N``)."""
+
+    def __init__(self, root, cache=None):
+        self.root = root
+        self.cache = cache
+        self.builders = {}
+        self._build_locks = {}
+        self._build_locks_guard = threading.Lock()
+
+    def set_folder(self, set_number):
+        return os.path.join(self.root, f'set_{set_number}')
+
+    def register(self, keys, func, *frame_keys):
+        """Build ``keys`` on demand with ``func(*frames)``.
+
+        ``frame_keys`` name the stored frames passed to ``func`` (e.g.
+        ``'deals_df'``). ``func`` returns the value of a single key, or a tuple
+        with one value per key when ``keys`` is a sequence.
+        """
+        keys = (keys,) if isinstance(keys, str) else tuple(keys)
+        for key in keys:
+            self.builders[key] = (keys, func, frame_keys)
+
+    def _is_stored(self, set_number, key):
+        path = os.path.join(self.set_folder(set_number), 'artifacts', _artifact_file(key))
+        return os.path.exists(path) or os.path.exists(f'{path}.none')
+
+    def _build_lock(self, set_number, keys):
+        with self._build_locks_guard:
+            return self._build_locks.setdefault((set_number, keys), threading.Lock())
+
+    def _cache_digest(self, view, keys, frame_keys):
+        """Content cache key of ``keys`` built from ``frame_keys``, or None when they cannot be cached.
+
+        Only sets whose frames are still exactly their uploaded files (never
+        appended to) qualify.
+        """
+        if self.cache is None or view.get('version', 0):
+            return None
+        file_hashes = view.get('file_hashes') or {}
+        inputs = [file_hashes.get(FRAME_KEYS[frame_key]) for frame_key in frame_keys]
+        if not frame_keys or not all(inputs):
+            return None
+        return self.cache.key(keys, inputs)
+
+    def build(self, set_number, key, view=None):
+        """Generate and store ``key`` (and the keys built with it) unless already stored."""
+        if self._is_stored(set_number, key):
+            return
+        keys, func, frame_keys = self.builders[key]
+        with self._build_lock(set_number, keys):
+            # Whoever held the lock before us may have just built it.
+            if self._is_stored(set_number, key):
+                return
+            view = view or self.load(set_number)
+            artifact_folder = os.path.join(self.set_folder(set_number), 'artifacts')
+            digest = self._cache_digest(view, keys, frame_keys)
+            files = [name for k in keys for name in (_artifact_file(k), f'{_artifact_file(k)}.etag',
+                                                     f'{_artifact_file(k)}.none')]
+            if digest and self.cache.restore_files('artifacts', digest, files, artifact_folder) \
+                    and all(self._is_stored(set_number, k) for k in keys):
+                logger.debug(f"Reused cached {', '.join(keys)} for set {set_number}")
+                return
+            # Builders of several keys (the graphs) are timed under their function name.
+            stage = keys[0] if len(keys) == 1 else getattr(func, '__name__', keys[0])
+            with metrics.timer(f'build.{stage}'):
+                result = func(*(view[frame_key] for frame_key in frame_keys))
+            values = dict(zip(keys, result if len(keys) > 1 else (result,)))
+            _write_artifacts(artifact_folder, values)
+            if digest:
+                self.cache.store_files('artifacts', digest, files, artifact_folder)
+            logger.debug(f"Built {', '.join(keys)} for set {set_number}")
+
+    def update_lock(self, set_number):
+        """Lock held while a set's frames are being changed."""
+        return self._build_lock(set_number, 'update')
+
+    def update(self, set_number, values):
+        """Merge ``values`` into a stored set's summary after its frames changed.
+
+        Every artifact with a registered builder is removed so it is rebuilt
+        from the new frames on next access; builds in progress finish first.
+        The summary's ``version`` is incremented. Returns the new summary.
+        """
+        artifact_folder = os.path.join(self.set_folder(set_number), 'artifacts')
+        summary_path = os.path.join(artifact_folder, 'summary.json')
+        with open(summary_path, encoding='utf-8') as f:
+            summary = json.load(f)
+        summary.update(values)
+        summary['version'] = summary.get('version', 0) + 1
+        for keys in {keys for keys, _, _ in self.builders.values()}:
+            with self._build_lock(set_number, keys):
+                for key in keys:
+                    path = os.path.join(artifact_folder, _artifact_file(key))
+                    for stale in (path, f'{path}.etag', f'{path}.none', f'{path}.packed', f'{path}.packed.etag'):
+                        if os.path.exists(stale):
+                            os.remove(stale)
+        _write_atomic(summary_path, json.dumps(summary, default=_to_builtin))
+        logger.debug(f"Updated set {set_number} to version {summary['version']}")
+        return summary
+
+    def exists(self, set_number):
+        return os.path.exists(os.path.join(self.set_folder(set_number), 'artifacts', 'summary.json'))
+
+    def save(self, set_number, analysis):
+        """Persist an analysis result dict as returned by ``perform_analysis``.
+
+        Maps, graphs and indexes missing from ``analysis`` are left to their
+        registered builders.
+        """
+        set_folder = self.set_folder(set_number)
+        artifact_folder = os.path.join(set_folder, 'artifacts')
+        os.makedirs(artifact_folder, exist_ok=True)
+        _write_artifacts(artifact_folder, {key: analysis[key] for key in (*MAP_KEYS, *GRAPH_KEYS, *INDEX_KEYS)
+                                           if key in analysis})
+        for key, name in FRAME_KEYS.items():
+            df = analysis.get(key)
+            if df is not None and not os.path.exists(columnar.frame_path(set_folder, name)):
+                columnar.save_frame(df, set_folder, name)
+        summary = {k: v for k, v in analysis.items()
+                   if k not in MAP_KEYS and k not in GRAPH_KEYS and k not in FRAME_KEYS and k not in INDEX_KEYS}
+        _write_atomic(os.path.join(artifact_folder, 'summary.json'), json.dumps(summary, default=_to_builtin))
+        logger.debug(f"Stored artifacts for set {set_number} in {artifact_folder}")
+
+    def map_file(self, set_number, key):
+        """Return ``(path, etag)`` of a stored map, or None if the set has no such map.
+
+        The etag is the SHA-256 of the file, computed when the map is stored.
+        A map that has not been built yet is built first.
+        """
+        if key not in MAP_KEYS or not self.exists(set_number):
+            return None
+        if key in self.builders:
+            self.build(set_number, key)
+        path = os.path.join(self.set_folder(set_number), 'artifacts', f'{key}.html')
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(f'{path}.etag', encoding='utf-8') as f:
+                etag = f.read()
+        except FileNotFoundError:
+            etag = _write_etag(path)
+        return path, etag
+
+    def graph_file(self, set_number, key):
+        """Return ``(path, etag)`` of a stored figure with packed arrays, or None if the set has no such figure.
+
+        The packed copy and its etag are written on first use; a figure that
+        has not been built yet is built first.
+        """
+        if key not in GRAPH_KEYS or not self.exists(set_number):
+            return None
+        keys = (key,)
+        if key in self.builders:
+            self.build(set_number, key)
+            keys = self.builders[key][0]
+        path = os.path.join(self.set_folder(set_number), 'artifacts', f'{key}.json')
+        packed_path = f'{path}.packed'
+        # The builder's lock, so an update cannot remove the figure while it is packed.
+        with self._build_lock(set_number, keys):
+            if not os.path.exists(path):
+                return None
+            try:
+                with open(f'{packed_path}.etag', encoding='utf-8') as f:
+                    return packed_path, f.read()
+            except FileNotFoundError:
+                pass
+            with open(path, encoding='utf-8') as f:
+                figure = json.load(f)
+            with metrics.timer(f'pack.{key}'):
+                _write_atomic(packed_path, figures.to_json(figures.pack(figure)))
+            return packed_path, _write_etag(packed_path)
+
+    def load(self, set_number):
+        """Return a lazy view of a stored set, or None if it has no artifacts."""
+        if set_number is None or not self.exists(set_number):
+            return None
+        return SetArtifacts(set_number, self.set_folder(set_number), self)
@@ -0,0 +1,67 @@
+"""Server-side aggregation for the dashboard charts.
+
+The deal and onboarding charts used to get one bar or point per row, so their
+Plotly JSON grew with the upload. The helpers here reduce the frames to a
+bounded number of marks first:
+
+- ``user_totals``: requested quantity per user for the ``$CHART_TOP_USERS``
+  busiest users, with everyone else summed into one ``Others`` bar.
+- ``daily_onboarding``: new users per onboarding day.
+
+Both split the totals by pincode for the colour legend, keeping the
+``$CHART_TOP_PINCODES`` largest pincodes and lumping the rest under
+``Others``. ``render_mode`` picks WebGL for scatter and line traces once
+they would draw more than ``$WEBGL_MIN_POINTS`` points.
+"""
+import os
+
+import pandas as pd
+
+OTHERS = 'Others'
+UNKNOWN = 'Unknown'
+TOP_USERS = int(os.environ.get('CHART_TOP_USERS', 50))
+TOP_PINCODES = int(os.environ.get('CHART_TOP_PINCODES', 10))
+WEBGL_MIN_POINTS = int(os.environ.get('WEBGL_MIN_POINTS', 1000))
+
+
+def render_mode(points):
+    """``render_mode`` for ``px.scatter``/``px.line``: ``'webgl'`` above ``WEBGL_MIN_POINTS`` points."""
+    return 'webgl' if points > WEBGL_MIN_POINTS else 'svg'
+
+
+def _keys(values):
+    # Plain objects, so categoricals group like strings and missing keys get a label.
+    return values.astype(object).where(values.notna(), UNKNOWN)
+
+
+def _lump(keys, totals, top_n):
+    """``keys`` with every value outside the ``top_n`` largest by ``totals`` replaced by ``OTHERS``."""
+    ranked = totals.groupby(keys).sum().sort_values(ascending=False, kind='stable')
+    if len(ranked) <= top_n:
+        return keys
+    return keys.where(keys.isin(ranked.index[:top_n]), OTHERS)
+
+
+def user_totals(deals_df, top_n=TOP_USERS, top_pincodes=TOP_PINCODES):
+    """``user_id``/``pincode``/``req_qty`` totals and the ``user_id`` order to plot them in.
+
+    Users are ordered by their total, largest first, and ``OTHERS`` comes last.
+    """
+    qty = pd.to_numeric(deals_df['req_qty'], errors='coerce').fillna(0)
+    users = _lump(_keys(deals_df['user_id']), qty, top_n)
+    pincodes = _lump(_keys(deals_df['pincode']), qty, top_pincodes)
+    totals = pd.DataFrame({'user_id': users, 'pincode': pincodes, 'req_qty': qty}) \
+        .groupby(['user_id', 'pincode'], sort=False)['req_qty'].sum().reset_index()
+    per_user = totals.groupby('user_id')['req_qty'].sum().sort_values(ascending=False, kind='stable')
+    order = [user for user in per_user.index if user != OTHERS] + ([OTHERS] if OTHERS in per_user.index else [])
+    return totals, order
+
+
+def daily_onboarding(new_users, top_pincodes=TOP_PINCODES):
+    """Distinct new users per ``onboarding_date`` (``YYYY-MM-DD``, UTC) and pincode, by date."""
+    dates = pd.to_datetime(new_users['createEpoch'], unit='s').dt.strftime('%Y-%m-%d')
+    pincodes = _keys(new_users['pincode'])
+    pincodes = _lump(pincodes, pd.Series(1, index=new_users.index), top_pincodes)
+    return pd.DataFrame({'onboarding_date': dates, 'pincode': pincodes, 'userid': new_users['userid'].to_numpy()}) \
+        .groupby(['onboarding_date', 'pincode'])['userid'].nunique() \
+        .reset_index(name='new_users')
@@ -0,0 +1,242 @@
+"""Columnar on-disk cache of the cleaned upload frames.
+
+Each set folder keeps its raw CSVs; the first time a ``process_*`` loader runs
+on one of them the cleaned, geocoded frame is written next to it as an
+uncompressed Feather file. Later loads memory-map that file instead of
+re-parsing the CSV.
+
+Frames are written as a single record batch so every column loads as one
+contiguous array; row selections by position (``iloc`` with an index from
+``portal.search``) then stay proportional to the rows taken instead of
+concatenating every chunk of the column first.
+"""
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+logger = logging.getLogger(__name__)
+
+FRAME_SUFFIX = '.feather'
+
+
+def frame_path(set_folder, name):
+    return os.path.join(set_folder, f'{name}{FRAME_SUFFIX}')
+
+
+def _common_type(types):
+    if all(pa.types.is_integer(t) for t in types):
+        return max(types, key=lambda t: (t.bit_width, pa.types.is_signed_integer(t)))
+    if all(pa.types.is_floating(t) for t in types):
+        return max(types, key=lambda t: t.bit_width)
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    if any(pa.types.is_dictionary(t) for t in types):
+        values = {t.value_type if pa.types.is_dictionary(t) else t for t in types}
+        if all(pa.types.is_string(t) or pa.types.is_large_string(t) for t in values):
+            return pa.dictionary(pa.int32(), pa.large_string())
+    return pa.large_string()
+
+
+def unify_schemas(schemas):
+    """One schema for tables with the columns of ``schemas[0]``.
+
+    Integers widen to the widest integer, mixed numbers to float64 and text
+    that is dictionary-encoded (categorical) anywhere stays dictionary-encoded;
+    any other conflict becomes a string. A column that is empty in one table
+    is read as float64 there, so a text column can arrive as both; casting the
+    all-null float column to string loses nothing.
+    """
+    fields = []
+    for name in schemas[0].names:
+        types = {schema.field(name).type for schema in schemas} - {pa.null()}
+        if len(types) <= 1:
+            field_type = types.pop() if types else pa.null()
+        else:
+            field_type = _common_type(types)
+        fields.append(pa.field(name, field_type))
+    return pa.schema(fields)
+
+
+def sorted_dictionary(values):
+    """Distinct non-null ``values`` in ascending order, the category order pandas uses."""
+    dictionary = pc.unique(values).drop_null()
+    return dictionary.take(pc.sort_indices(dictionary))
+
+
+def dictionary_type(dictionary):
+    """Dictionary type with the narrowest index that can address ``dictionary``."""
+    index_type = next(t for t in (pa.int8(), pa.int16(), pa.int32()) if len(dictionary) < 2 ** (t.bit_width - 1))
+    return pa.dictionary(index_type, dictionary.type)
+
+
+def encode(values, dictionary):
+    """Chunked array ``values`` encoded against ``dictionary`` (which holds every non-null value)."""
+    field_type = dictionary_type(dictionary)
+    return pa.chunked_array([pa.DictionaryArray.from_arrays(pc.index_in(chunk, value_set=dictionary)
+                                                            .cast(field_type.index_type), dictionary)
+                             for chunk in values.chunks], type=field_type)
+
+
+def _sorted_dictionary(column):
+    """Re-encode a dictionary ``column`` against one sorted dictionary."""
+    values = column.cast(column.type.value_type)
+    return encode(values, sorted_dictionary(values))
+
+
+def _write_single_batch(table, path):
+    tmp_path = f'{path}.tmp'
+    try:
+        table = table.combine_chunks()
+    except pa.ArrowInvalid:
+        # A 32-bit offset string column over 2 GiB cannot be one array; keep its chunks.
+        pass
+    feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=max(table.num_rows, 1))
+    os.replace(tmp_path, path)
+
+
+def save_frame(df, set_folder, name):
+    """Write ``df`` to the set folder; returns the path, or None if it could not be stored."""
+    path = frame_path(set_folder, name)
+    tmp_path = f'{path}.tmp'
+    try:
+        _write_single_batch(pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False), path)
+        return path
+    except Exception as e:
+        logger.warning(f"Could not cache frame '{name}' in {set_folder}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+
+def save_tables(set_folder, name, schema, tables):
+    """Write an iterable of Arrow ``tables`` sharing ``schema`` as one cached frame.
+
+    Each table becomes its own record batch, so the frame never has to be
+    held in memory as a whole. Returns the path.
+    """
+    path = frame_path(set_folder, name)
+    tmp_path = f'{path}.tmp'
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for table in tables:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def append_frame(df, set_folder, name):
+    """Append the rows of ``df`` to the cached frame ``name`` and return its path.
+
+    ``df`` is aligned to the stored columns (missing ones become null, extra
+    ones are dropped) and both sides are cast to a common schema. A frame
+    stored as one batch is rewritten as one batch; a streamed frame keeps its
+    batches and gains one for ``df``. Categorical columns end up with one
+    sorted set of categories.
+    """
+    path = frame_path(set_folder, name)
+    stored = load_table(set_folder, name)
+    if stored is None:
+        raise FileNotFoundError(f"No cached frame '{name}' in {set_folder}")
+    delta = pa.Table.from_pandas(df.reindex(columns=stored.column_names).reset_index(drop=True), preserve_index=False)
+    schema = unify_schemas([stored.schema, delta.schema])
+    # The pandas metadata only still describes the frame if no column changed type.
+    if schema.equals(stored.schema, check_metadata=False):
+        schema = schema.with_metadata(stored.schema.metadata)
+    table = pa.concat_tables([stored.cast(schema), delta.replace_schema_metadata(None).cast(schema)])
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            # Both sides bring their own dictionary; an IPC file holds one per column.
+            table = table.set_column(i, field.name, _sorted_dictionary(table.column(i)))
+    if len(stored.to_batches()) <= 1:
+        _write_single_batch(table, path)
+        return path
+    return save_tables(set_folder, name, table.schema, [table])
+
+
+def load_table(set_folder, name):
+    """Memory-map a cached frame as an Arrow table, or return None when it has not been stored."""
+    path = frame_path(set_folder, name)
+    if not os.path.exists(path):
+        return None
+    return feather.read_table(path, memory_map=True)
+
+
+class StoredFrame:
+    """A cached frame left memory-mapped, for frames that may not fit in memory.
+
+    Stands in for the DataFrame where only parts of it are read: ``len``,
+    ``empty``, ``columns`` and ``frame[column]`` (one column as a Series, or
+    a DataFrame for a list of columns) only convert what they return.
+    ``batches`` yields the frame one record batch at a time and
+    ``to_pandas`` converts all of it.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def empty(self):
+        return self.table.num_rows == 0
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def __getitem__(self, column):
+        if isinstance(column, list):
+            return self.table.select(column).to_pandas()
+        return self.table.column(column).to_pandas().rename(column)
+
+    def batches(self):
+        for batch in self.table.to_batches():
+            yield batch.to_pandas()
+
+    def to_pandas(self):
+        return self.table.to_pandas()
+
+
+def load_stored_frame(set_folder, name):
+    """A cached frame as a ``StoredFrame``, or None when it has not been stored."""
+    table = load_table(set_folder, name)
+    return None if table is None else StoredFrame(table)
+
+
+def load_frame(set_folder, name):
+    """Memory-map a cached frame, or return None when it has not been stored."""
+    table = load_table(set_folder, name)
+    return None if table is None else table.to_pandas()
+
+
+def is_fresh(file_path, name):
+    """True when the cached frame for ``file_path`` exists and is newer than the CSV."""
+    path = frame_path(os.path.dirname(file_path), name)
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(file_path)
+
+
+def load_or_process(file_path, name, loader, compaction=None):
+    """Return the cleaned frame for ``file_path``, running ``loader`` only on a cache miss.
+
+    ``compaction`` (see ``portal.compact``) is applied to the loaded frame
+    before it is cached.
+    """
+    set_folder = os.path.dirname(file_path)
+    if is_fresh(file_path, name):
+        try:
+            return load_frame(set_folder, name)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cached frame '{name}' in {set_folder}: {e}")
+    df = loader(file_path)
+    if not df.empty:
+        if compaction is not None:
+            df = compaction(df)
+        save_frame(df, set_folder, name)
+    return df
@@ -0,0 +1,204 @@
+"""Memory-compact dtypes for the cleaned upload frames.
+
+The ``process_*`` loaders return text as strings and every number as a
+64-bit value. ``compact_frame`` runs on their result before the frame is
+cached: it drops the columns nothing reads, turns repetitive text columns into
+categoricals, stores coordinates as float32 and quantities in the smallest
+integer type that holds them. Categoricals and narrow numbers survive the
+Feather cache, so every later load of the frame is compact as well.
+
+A ``Compaction`` holds the arguments for one frame. A frame streamed in
+chunks is compacted part by part instead (``Compaction.chunk`` and
+``TableCompaction``). The result has the dtypes ``compact_frame`` would give
+the whole frame, but the whole frame is never in memory.
+
+``$COMPACT_FRAMES=0`` turns compaction off.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from portal import columnar
+
+logger = logging.getLogger(__name__)
+
+COMPACT_FRAMES_ENV = 'COMPACT_FRAMES'
+# A text column becomes categorical when it has at most this many distinct values per row.
+CATEGORY_MAX_RATIO = float(os.environ.get('COMPACT_CATEGORY_RATIO', 0.5))
+# Largest whole number float32 still stores exactly.
+_FLOAT32_EXACT = 2 ** 24
+
+
+def enabled():
+    return os.environ.get(COMPACT_FRAMES_ENV, '1') != '0'
+
+
+def frame_bytes(df):
+    """Memory held by ``df``, including the contents of text columns."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _narrow(values):
+    """Smallest integer dtype for whole-number ``values``; float32 if some are missing."""
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return values
+    present = values.dropna()
+    if not (present % 1 == 0).all() or (len(present) and present.abs().max() >= _FLOAT32_EXACT):
+        return values
+    if len(present) < len(values):
+        return values.astype(np.float32)
+    return pd.to_numeric(values, downcast='integer')
+
+
+def compact_frame(df, name, keep=None, categories=(), float32=(), integers=()):
+    """Return ``df`` with compact dtypes and log its size before and after.
+
+    ``keep`` lists the columns to retain (all when None), ``categories`` the
+    text columns to store as categoricals if they repeat enough,
+    ``float32`` the columns to store in single precision and ``integers`` the
+    whole-number columns to narrow. Columns missing from ``df`` are ignored.
+    """
+    if df.empty or not enabled():
+        return df
+    before = frame_bytes(df)
+    df = df[[col for col in df.columns if keep is None or col in keep]].copy()
+    for col in categories:
+        if col in df.columns and df[col].nunique() <= CATEGORY_MAX_RATIO * len(df):
+            df[col] = df[col].astype('category')
+    for col in float32:
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+    for col in integers:
+        if col in df.columns:
+            df[col] = _narrow(df[col])
+    after = frame_bytes(df)
+    logger.info(f"Compacted {name}: {before} -> {after} bytes ({len(df)} rows)")
+    return df
+
+
+class Compaction:
+    """The ``compact_frame`` arguments for the frame ``name``; calling it compacts a DataFrame."""
+
+    def __init__(self, name, keep=None, categories=(), float32=(), integers=()):
+        self.name = name
+        self.keep = keep
+        self.categories = list(categories)
+        self.float32 = list(float32)
+        self.integers = list(integers)
+
+    def __call__(self, df):
+        return compact_frame(df, self.name, self.keep, self.categories, self.float32, self.integers)
+
+    def renamed(self, name):
+        """The same compaction for the frame ``name``."""
+        return Compaction(name, self.keep, self.categories, self.float32, self.integers)
+
+    def chunk(self, df):
+        """One chunk of a streamed frame with the columns and float32 coordinates of the compact frame.
+
+        Categories and integer widths depend on the whole frame; they are
+        left to ``TableCompaction``.
+        """
+        if not enabled():
+            return df
+        df = df[[col for col in df.columns if self.keep is None or col in self.keep]].copy()
+        for col in self.float32:
+            if col in df.columns:
+                df[col] = df[col].astype(np.float32)
+        return df
+
+    def tables(self, schema, num_rows):
+        """A ``TableCompaction`` for ``num_rows`` rows stored as tables of ``schema``, or None when compaction is off."""
+        return TableCompaction(self, schema, num_rows) if enabled() else None
+
+
+def _is_whole(values):
+    if pa.types.is_integer(values.type):
+        return True
+    return pc.all(pc.equal(pc.floor(values), values)).as_py() is not False
+
+
+class TableCompaction:
+    """Categories and integer widths for a frame stored as several Arrow tables.
+
+    ``scan`` every table (already cast to one schema) once, then ``apply``
+    converts each to ``schema``. Categorical columns share one sorted
+    dictionary, because an IPC file holds one dictionary per column. Whole
+    numbers are narrowed by the range of the whole frame. The decisions are
+    those ``compact_frame`` makes on the concatenated frame.
+    """
+
+    def __init__(self, compaction, schema, num_rows):
+        self.compaction = compaction
+        self.num_rows = num_rows
+        self._base = schema
+        self._uniques = {col: None for col in compaction.categories if col in schema.names}
+        self._ranges = {col: [None, None, 0, True] for col in compaction.integers
+                        if col in schema.names and (pa.types.is_integer(schema.field(col).type)
+                                                    or pa.types.is_floating(schema.field(col).type))}
+        self.bytes_before = 0
+        self._schema = None
+
+    def scan(self, table):
+        self.bytes_before += table.nbytes
+        for col in list(self._uniques):
+            values = table.column(col)
+            if self._uniques[col] is not None:
+                values = pa.chunked_array([self._uniques[col], *values.chunks], type=values.type)
+            uniques = pc.unique(values).drop_null()
+            if len(uniques) > CATEGORY_MAX_RATIO * self.num_rows:
+                # Too many distinct values to be categorical; stop collecting them.
+                del self._uniques[col]
+            else:
+                self._uniques[col] = uniques
+        for col, stats in self._ranges.items():
+            values = table.column(col)
+            extremes = pc.min_max(values)
+            low, high = extremes['min'], extremes['max']
+            if low.is_valid:
+                stats[0] = low.as_py() if stats[0] is None else min(stats[0], low.as_py())
+                stats[1] = high.as_py() if stats[1] is None else max(stats[1], high.as_py())
+            stats[2] += values.null_count
+            stats[3] = stats[3] and _is_whole(values)
+
+    def _narrow_type(self, col):
+        low, high, nulls, whole = self._ranges[col]
+        if low is None:
+            return pa.float32() if nulls else self._base.field(col).type
+        if not whole or max(abs(low), abs(high)) >= _FLOAT32_EXACT:
+            return self._base.field(col).type
+        if nulls:
+            return pa.float32()
+        return next(t for t in (pa.int8(), pa.int16(), pa.int32(), pa.int64())
+                    if np.iinfo(t.to_pandas_dtype()).min <= low and high <= np.iinfo(t.to_pandas_dtype()).max)
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            self._dictionaries = {col: columnar.sorted_dictionary(uniques if uniques is not None
+                                                                   else pa.array([], self._base.field(col).type))
+                                  for col, uniques in self._uniques.items()}
+            fields = []
+            for field in self._base:
+                if field.name in self._dictionaries:
+                    field = pa.field(field.name, columnar.dictionary_type(self._dictionaries[field.name]))
+                elif field.name in self._ranges:
+                    field = pa.field(field.name, self._narrow_type(field.name))
+                fields.append(field)
+            self._schema = pa.schema(fields)
+        return self._schema
+
+    def apply(self, table):
+        schema = self.schema
+        columns = []
+        for field in schema:
+            values = table.column(field.name)
+            if field.name in self._dictionaries:
+                columns.append(columnar.encode(values, self._dictionaries[field.name]))
+            else:
+                columns.append(values.cast(field.type))
+        return pa.Table.from_arrays(columns, schema=schema)
@@ -0,0 +1,130 @@
+"""Content-addressed cache of uploaded files and what is derived from them.
+
+Uploads are hashed (SHA-256) while they are written to disk, and everything
+that only depends on a file's content is kept under ``<root>``, keyed by hash:
+
+- ``frames/<file hash>/<name>.feather``: the cleaned frame a ``process_*``
+  loader made from the file, as stored in the set folder;
+- ``artifacts/<input hash>/``: the files of built maps, graphs and indexes,
+  keyed by the artifact keys and the hashes of the files they were built from.
+
+Both keys also cover ``processing_fingerprint()``: the settings that change
+what is built from the same file, and ``CACHE_FORMAT_VERSION``. Entries made
+under other settings are simply not found.
+
+Entries are hard links to the set folders' files (copies where linking is not
+possible). The set folders replace their files rather than rewrite them, so a
+cached entry never changes after it is written. Deleting ``<root>`` empties
+the cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+from portal import charts, columnar, compact, gazetteer, metrics
+from portal.dealer_layer import DEALER_CLUSTER_THRESHOLD, DEALER_MAP_MODE_ENV
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BYTES = 1 << 20
+# Bump whenever a loader or builder changes what it makes from the same file.
+CACHE_FORMAT_VERSION = 1
+LOOKUPS = metrics.Counter('dash_content_cache_lookups_total', 'Content cache lookups, per entry kind and result.',
+                          ['kind', 'result'])
+
+
+def save_hashed(stream, path):
+    """Write the binary ``stream`` to ``path`` and return the SHA-256 hex digest of its bytes."""
+    digest = hashlib.sha256()
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for block in iter(lambda: stream.read(CHUNK_BYTES), b''):
+            digest.update(block)
+            f.write(block)
+    os.replace(tmp_path, path)
+    return digest.hexdigest()
+
+
+def combined_digest(*parts):
+    """One digest for a JSON-serializable combination of keys and digests."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def processing_fingerprint():
+    """The settings, besides the files themselves, that cached frames and artifacts depend on."""
+    gazetteer_path = os.environ.get(gazetteer.GAZETTEER_ENV)
+    gazetteer_mtime = os.path.getmtime(gazetteer_path) if gazetteer_path and os.path.exists(gazetteer_path) else None
+    return {
+        'version': CACHE_FORMAT_VERSION,
+        'compact': [compact.enabled(), compact.CATEGORY_MAX_RATIO],
+        'gazetteer': [gazetteer_path, gazetteer_mtime],
+        'dealer_map': [os.environ.get(DEALER_MAP_MODE_ENV, 'auto'), DEALER_CLUSTER_THRESHOLD],
+        'charts': [charts.TOP_USERS, charts.TOP_PINCODES, charts.WEBGL_MIN_POINTS],
+    }
+
+
+def _link(source, target):
+    """Make ``target`` the same file as ``source``, replacing any ``target``."""
+    # Unique per thread: two sets may store the same entry at once.
+    tmp_path = f'{target}.{os.getpid()}-{threading.get_ident()}.link'
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+class ContentCache:
+    """Cache rooted at ``root``, usually ``<upload folder>/cache``."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def key(self, *parts):
+        """Entry digest for ``parts`` (file hashes, artifact keys) under the current settings."""
+        return combined_digest(processing_fingerprint(), *parts)
+
+    def _folder(self, kind, digest):
+        return os.path.join(self.root, kind, digest)
+
+    def restore_files(self, kind, digest, names, folder):
+        """Link the cached ``names`` of entry ``digest`` into ``folder``; returns the names found."""
+        entry = self._folder(kind, digest)
+        restored = [name for name in names if os.path.exists(os.path.join(entry, name))]
+        for name in restored:
+            _link(os.path.join(entry, name), os.path.join(folder, name))
+        LOOKUPS.inc(kind=kind, result='hit' if restored else 'miss')
+        return restored
+
+    def store_files(self, kind, digest, names, folder):
+        """Keep those of ``names`` that exist in ``folder`` as entry ``digest``."""
+        entry = self._folder(kind, digest)
+        os.makedirs(entry, exist_ok=True)
+        for name in names:
+            path = os.path.join(folder, name)
+            if os.path.exists(path) and not os.path.exists(os.path.join(entry, name)):
+                _link(path, os.path.join(entry, name))
+
+    def frame(self, digest, file_path, name, load):
+        """The cleaned frame ``name`` of ``file_path`` from ``load()``, reusing the one cached for ``digest``.
+
+        A cached frame is linked into the set folder as fresh, so ``load``
+        (``columnar.load_or_process``/``ingest.load``) reads it instead of the
+        CSV. A frame ``load`` had to make is cached afterwards.
+        """
+        if not digest:
+            return load()
+        set_folder = os.path.dirname(file_path)
+        frame_file = os.path.basename(columnar.frame_path(set_folder, name))
+        entry = self.key(name, digest)
+        if self.restore_files('frames', entry, [frame_file], set_folder):
+            # Newer than the CSV it was uploaded as, so the columnar cache takes it.
+            os.utime(os.path.join(set_folder, frame_file))
+            logger.info(f"Reusing cached {name} frame for {digest[:12]}")
+        df = load()
+        if not df.empty:
+            self.store_files('frames', entry, [frame_file], set_folder)
+        return df
@@ -0,0 +1,103 @@
+"""Clustered, canvas-rendered dealer layer for large dealer maps.
+
+Instead of one ``folium.CircleMarker`` with its own popup HTML per dealer, the
+map receives a compact ``[lat, lon, row]`` array and a column-oriented
+attribute table. Leaflet.markercluster groups the points in the browser,
+markers are drawn on the map's canvas renderer, and a popup is only built from
+the attribute table when a marker is clicked.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from folium.plugins import FastMarkerCluster
+
+DEALER_MAP_MODE_ENV = 'DEALER_MAP_MODE'
+DEALER_CLUSTER_THRESHOLD = int(os.environ.get('DEALER_CLUSTER_THRESHOLD', 1000))
+# ~1 m precision is plenty for a marker and keeps the coordinate array small.
+COORD_DECIMALS = 5
+
+_CALLBACK = """(function () {
+    var attrs = %s;
+    function esc(value) {
+        return String(value == null ? '' : value).replace(/[&<>"']/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+        });
+    }
+    function popup(i) {
+        var images = attrs.images[i] ? attrs.images[i].split(' | ').map(function (url) {
+            url = url.trim();
+            return "<a href='" + esc(url) + "' target='_blank'>" + (url ? esc(url) : 'Invalid link') + "</a>";
+        }).join('<br>') : 'No images available';
+        return 'Dealer: ' + esc(attrs.names[i]) + '<br>' +
+            'Phone: ' + esc(attrs.phones[i]) + '<br>' +
+            'Address: ' + esc(attrs.addresses[i]) + '<br>' +
+            'Categories: ' + esc(attrs.category_names[attrs.categories[i]]) + '<br>' +
+            'Subcategories: ' + esc(attrs.subcategory_names[attrs.subcategories[i]]) + '<br>' +
+            'Images: <br>' + images;
+    }
+    return function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+            radius: 5, color: '#ff7f0e', fill: true, fillOpacity: 0.7
+        });
+        marker.bindPopup(function () { return popup(row[2]); });
+        return marker;
+    };
+})()"""
+
+
+def use_clustered_layer(dealers_df):
+    """Pick the dealer map mode from ``$DEALER_MAP_MODE`` (``cluster``, ``markers`` or ``auto``).
+
+    ``auto`` (the default) clusters once there are more than
+    ``$DEALER_CLUSTER_THRESHOLD`` dealers.
+    """
+    mode = os.environ.get(DEALER_MAP_MODE_ENV, 'auto')
+    if mode == 'cluster':
+        return True
+    if mode == 'markers':
+        return False
+    return len(dealers_df) > DEALER_CLUSTER_THRESHOLD
+
+
+def _text_column(dealers_df, col):
+    if col not in dealers_df.columns:
+        return pd.Series('', index=dealers_df.index)
+    return dealers_df[col].astype(object).where(dealers_df[col].notna(), '').astype(str)
+
+
+def _factorized(dealers_df, col):
+    codes, names = pd.factorize(_text_column(dealers_df, col))
+    return codes.tolist(), list(names)
+
+
+def dealer_attribute_table(dealers_df):
+    """Column-oriented popup attributes; repeated category strings are stored once."""
+    address_parts = [_text_column(dealers_df, col) for col in ('addr1', 'addr2', 'landmark', 'city', 'pincode')]
+    addresses = address_parts[0]
+    for part in address_parts[1:]:
+        addresses = addresses + ', ' + part
+    categories, category_names = _factorized(dealers_df, 'cat_disp_names')
+    subcategories, subcategory_names = _factorized(dealers_df, 'subcat_disp_names')
+    names = _text_column(dealers_df, 'coname').replace('', 'Unknown')
+    return {
+        'names': names.tolist(),
+        'phones': _text_column(dealers_df, 'phone_no').tolist(),
+        'addresses': addresses.tolist(),
+        'categories': categories,
+        'category_names': category_names,
+        'subcategories': subcategories,
+        'subcategory_names': subcategory_names,
+        'images': _text_column(dealers_df, 'Imgurl').tolist()
+    }
+
+
+def add_clustered_dealers(folium_map, dealers_df):
+    """Add all dealers to ``folium_map`` as one client-side clustered layer."""
+    coords = np.round(dealers_df[['latitude', 'longitude']].to_numpy(dtype=np.float64), COORD_DECIMALS)
+    data = [[lat, lon, i] for i, (lat, lon) in enumerate(coords.tolist())]
+    # The table is inlined in a <script> block, so "</script>" in a dealer name must not close it.
+    attrs = json.dumps(dealer_attribute_table(dealers_df), separators=(',', ':')).replace('<', '\\u003c')
+    FastMarkerCluster(data, callback=_CALLBACK % attrs, chunkedLoading=True).add_to(folium_map)
+    return folium_map
@@ -0,0 +1,58 @@
+"""Appending delta exports to a stored analysis set.
+
+A delta CSV holds only the records that arrived since the set was uploaded.
+It is cleaned by the same ``process_*`` loader as a full upload and rows
+whose natural key is already stored (or repeated earlier in the delta) are
+dropped; what is left gets appended to the set's cached frame. Nothing already
+stored is parsed again; the stored key column is only memory-mapped to look up
+duplicates.
+"""
+import logging
+import os
+
+import pandas as pd
+
+from portal import columnar
+
+logger = logging.getLogger(__name__)
+
+
+def new_rows(df, stored, keys):
+    """Rows of ``df`` whose ``keys`` are neither in the Arrow table ``stored`` nor repeated earlier in ``df``.
+
+    Key columns missing on either side are ignored; without any key, rows are
+    compared on all shared columns.
+    """
+    keys = [key for key in keys if key in df.columns and key in stored.column_names]
+    if not keys:
+        keys = [col for col in df.columns if col in stored.column_names]
+    df = df.drop_duplicates(subset=keys)
+    if len(keys) == 1:
+        # Object arrays take pandas' hash-table path; Arrow-backed strings are looked up one by one.
+        known = df[keys[0]].astype(object).isin(stored.column(keys[0]).to_numpy())
+    else:
+        stored_keys = stored.select(keys).to_pandas()
+        known = pd.MultiIndex.from_frame(df[keys]).isin(pd.MultiIndex.from_frame(stored_keys))
+    return df[~known]
+
+
+def load_new_rows(delta_path, set_folder, name, loader, keys, compaction=None):
+    """Clean ``delta_path`` and return the rows the set's cached frame ``name`` does not have yet.
+
+    ``loader`` is the ``process_*`` function for the file, ``keys`` its
+    natural key columns and ``compaction`` the one the frame was cached with.
+    Nothing is written; the caller appends the rows with
+    ``columnar.append_frame`` once every delta of an update has been read.
+    """
+    stored = columnar.load_table(set_folder, name)
+    if stored is None:
+        raise FileNotFoundError(f"No stored '{name}' frame in {set_folder}")
+    df = loader(delta_path)
+    if df.empty:
+        logger.warning(f"No valid rows in {name} delta {os.path.basename(delta_path)}")
+        return df
+    added = new_rows(df, stored, keys)
+    logger.info(f"{len(added)} of {len(df)} {name} rows in {os.path.basename(delta_path)} are new to {set_folder}")
+    if compaction is not None and not added.empty:
+        added = compaction(added)
+    return added
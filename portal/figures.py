@@ -0,0 +1,239 @@
+"""Plotly figure dicts built directly from aggregated frames.
+
+``px.bar``/``px.line`` validate every property through plotly's object model
+and ``to_json`` runs a generic encoder over the result; for the dashboard
+charts that costs far more than the data. ``bar`` and ``line`` here emit the
+trace and layout dicts plotly.express produces for the same arguments, one
+trace per ``color`` value in order of first appearance coloured from the
+template's colorway, and ``to_json`` serializes them with orjson when it is
+installed. The ``plotly_dark`` template is converted to a dict once and
+shared by every figure.
+
+Arrays are written as plain JSON lists, which every plotly.js version reads.
+``pack`` turns the numeric ones into base64 typed arrays
+(``{'dtype': 'i4', 'bdata': ...}``), as plotly 6+ writes them, and leaves out
+the template the page supplies once. plotly.js reads typed arrays from 2.28 on,
+so pages showing packed figures load ``plotlyjs_url()``.
+"""
+import base64
+import functools
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TEMPLATE = 'plotly_dark'
+# What plotly.express adds to every Cartesian axis of a single-panel figure.
+_AXIS = {'domain': [0.0, 1.0]}
+
+
+@functools.lru_cache(maxsize=None)
+def _template(name):
+    import plotly.io as pio
+    return pio.templates[name].to_plotly_json()
+
+
+def template(name=TEMPLATE):
+    """Layout template ``name`` as a plain dict (shared; do not modify)."""
+    return _template(name)
+
+
+@functools.lru_cache(maxsize=None)
+def plotlyjs_url():
+    """CDN URL of the plotly.js version bundled with the installed plotly package."""
+    from plotly.offline import get_plotlyjs_version
+    return f'https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js'
+
+
+def _objects(df, columns):
+    """``columns`` of ``df`` as one object array of Python values, missing values as None.
+
+    Converted once per figure; traces then take their rows with a fancy index.
+    """
+    # A copy: under copy-on-write ``to_numpy`` may return a read-only view of the frame.
+    values = np.array(df[list(columns)].to_numpy(dtype=object), copy=True)
+    values[pd.isna(values)] = None
+    return values
+
+
+def _groups(df, color):
+    """``(value, positions)`` per distinct ``color`` value in order of first appearance.
+
+    Positions are in row order; without ``color`` there is one group of all rows.
+    """
+    if color is None:
+        return [(None, np.arange(len(df)))]
+    codes, uniques = pd.factorize(df[color].astype(object))
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    bounds = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))[:-1]
+    return list(zip(uniques, np.split(order, bounds)))
+
+
+def _hovertemplate(labels, color, value, hover_data):
+    parts = [f'{color}={value}'] if color is not None else []
+    parts += [f'{label}=%{{{axis}}}' for axis, label in labels]
+    parts += [f'{column}=%{{customdata[{i}]}}' for i, column in enumerate(hover_data)]
+    return '<br>'.join(parts) + '<extra></extra>'
+
+
+def _layout(title, x, y, color, category_orders, name, traces):
+    layout = {
+        'template': template(name),
+        'xaxis': {'anchor': 'y', **_AXIS, 'title': {'text': x}},
+        'yaxis': {'anchor': 'x', **_AXIS, 'title': {'text': y}},
+        # The legend is only titled when there are traces to list.
+        'legend': {'title': {'text': color}, 'tracegroupgap': 0} if color is not None and traces else {'tracegroupgap': 0},
+        'title': {'text': title}
+    }
+    for axis, column in (('xaxis', x), ('yaxis', y)):
+        if column in (category_orders or {}):
+            layout[axis].update(categoryorder='array', categoryarray=list(category_orders[column]))
+    return layout
+
+
+def _colorway(name):
+    return template(name)['layout']['colorway']
+
+
+def bar(df, x, y, title, color=None, color_discrete=None, hover_data=(), category_orders=None, template_name=TEMPLATE):
+    """What ``px.bar(df, x, y, title=..., color=..., hover_data=..., category_orders=...)`` returns, as a dict.
+
+    ``color_discrete`` is the single bar colour when there is no ``color``
+    column (``color_discrete_sequence=[...]``).
+    """
+    colorway = [color_discrete] if color_discrete else _colorway(template_name)
+    values = _objects(df, [x, y])
+    customdata = _objects(df, hover_data) if hover_data else None
+    traces = []
+    for i, (value, rows) in enumerate(_groups(df, color)):
+        trace = {}
+        if hover_data:
+            trace['customdata'] = customdata[rows].tolist()
+        trace.update({
+            'hovertemplate': _hovertemplate((('x', x), ('y', y)), color, value, hover_data),
+            'legendgroup': '' if value is None else str(value),
+            'marker': {'color': colorway[i % len(colorway)], 'pattern': {'shape': ''}},
+            'name': '' if value is None else str(value),
+            'orientation': 'v',
+            'showlegend': value is not None,
+            'textposition': 'auto',
+            'x': values[rows, 0].tolist(),
+            'xaxis': 'x',
+            'y': values[rows, 1].tolist(),
+            'yaxis': 'y',
+            'type': 'bar'
+        })
+        traces.append(trace)
+    layout = _layout(title, x, y, color, category_orders, template_name, traces)
+    layout['barmode'] = 'relative'
+    return {'data': traces, 'layout': layout}
+
+
+def line(df, x, y, title, color=None, markers=False, render_mode='svg', template_name=TEMPLATE):
+    """What ``px.line(df, x, y, title=..., color=..., markers=..., render_mode=...)`` returns, as a dict."""
+    colorway = _colorway(template_name)
+    webgl = render_mode == 'webgl'
+    values = _objects(df, [x, y])
+    traces = []
+    for i, (value, rows) in enumerate(_groups(df, color)):
+        trace = {
+            'hovertemplate': _hovertemplate((('x', x), ('y', y)), color, value, ()),
+            'legendgroup': '' if value is None else str(value),
+            'line': {'color': colorway[i % len(colorway)], 'dash': 'solid'},
+            'marker': {'symbol': 'circle'},
+            'mode': 'lines+markers' if markers else 'lines',
+            'name': '' if value is None else str(value),
+            'showlegend': value is not None,
+            'x': values[rows, 0].tolist(),
+            'xaxis': 'x',
+            'y': values[rows, 1].tolist(),
+            'yaxis': 'y',
+            'type': 'scattergl' if webgl else 'scatter'
+        }
+        if not webgl:
+            # scattergl has no orientation attribute.
+            trace['orientation'] = 'v'
+        traces.append(trace)
+    return {'data': traces, 'layout': _layout(title, x, y, color, None, template_name, traces)}
+
+
+def _merge(current, updates):
+    merged = dict(current)
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        elif isinstance(value, str) and isinstance(merged.get(key), dict) and 'text' in merged[key]:
+            # Plotly's shorthand: title='...' sets title.text.
+            merged[key] = {**merged[key], 'text': value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def update_layout(figure, **updates):
+    """``fig.update_layout(...)`` for a figure dict: nested dicts are merged, other values replaced."""
+    figure['layout'] = _merge(figure['layout'], updates)
+    return figure
+
+
+# Keys whose arrays plotly.js does not read as typed arrays (as in plotly.py).
+_UNPACKED_KEYS = frozenset(['geojson', 'layer', 'layers', 'range'])
+# Smallest first; int64 has no typed array in plotly.js.
+_INT_TYPES = ('i1', 'i2', 'i4')
+
+
+def _typed_array(values):
+    """``values`` as a typed array spec, or None unless they are all ints or floats."""
+    if not values or not all(type(value) in (int, float) for value in values):
+        return None
+    array = np.array(values)
+    if array.dtype.kind == 'f':
+        return {'dtype': 'f8', 'bdata': base64.b64encode(array.astype('<f8')).decode('ascii')}
+    if array.dtype.kind != 'i':
+        return None
+    low, high = array.min(), array.max()
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return {'dtype': dtype, 'bdata': base64.b64encode(array.astype(f'<{dtype}')).decode('ascii')}
+    return None
+
+
+def _pack(value):
+    if isinstance(value, dict):
+        return {key: item if key in _UNPACKED_KEYS else _pack(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return _typed_array(value) or [_pack(item) for item in value]
+    return value
+
+
+def pack(figure, shared_template=TEMPLATE):
+    """Copy of ``figure`` for the browser, with every all-numeric trace array as a base64 typed array.
+
+    Arrays with any missing or non-numeric value are left as they are. A
+    ``layout.template`` equal to the ``shared_template`` template is left out;
+    the page gives it once (``template(shared_template)``) for all figures.
+    """
+    layout = figure.get('layout', {})
+    if shared_template and layout.get('template') == template(shared_template):
+        layout = {key: value for key, value in layout.items() if key != 'template'}
+    return {**figure, 'data': [_pack(trace) for trace in figure.get('data', [])], 'layout': layout}
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_json(figure):
+    """Serialize a figure dict; missing values are written as null."""
+    if orjson is not None:
+        return orjson.dumps(figure, default=_default, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(figure, default=_default, separators=(',', ':'))
@@ -0,0 +1,142 @@
+"""Full India pincode gazetteer backed by a memory-mapped sorted index.
+
+The gazetteer source is a CSV with at least ``pincode``, ``latitude`` and
+``longitude`` columns (optionally ``district`` and ``statename``/``state``),
+such as the All India Pincode Directory. Post-office level rows are collapsed
+to one row per pincode and written as ``.npy`` arrays sorted by pincode in
+``<source>.idx/``. Those arrays are opened with ``mmap_mode='r'`` so every
+worker process shares the same pages, and lookups are binary searches.
+
+Nothing is read until the first lookup; the index is rebuilt only when the
+source CSV is newer than it.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_ENV = 'PINCODE_GAZETTEER'
+GAZETTEER_INDEX_ENV = 'PINCODE_GAZETTEER_INDEX'
+# Anything outside this box is a data-entry error in the source directory.
+INDIA_BOUNDS = ((6.0, 38.0), (68.0, 98.0))
+
+
+def _read_source(source_path):
+    df = pd.read_csv(source_path, dtype=str)
+    df.columns = [c.strip().lower() for c in df.columns]
+    if 'state' not in df.columns and 'statename' in df.columns:
+        df = df.rename(columns={'statename': 'state'})
+    for col in ('district', 'state'):
+        if col not in df.columns:
+            df[col] = ''
+    df['pincode'] = pd.to_numeric(df['pincode'].str.extract(r'(\d{6})', expand=False), errors='coerce')
+    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
+    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
+    (lat_min, lat_max), (lon_min, lon_max) = INDIA_BOUNDS
+    df = df[df['latitude'].between(lat_min, lat_max) & df['longitude'].between(lon_min, lon_max)]
+    df = df.dropna(subset=['pincode'])
+    return df.groupby('pincode').agg(
+        latitude=('latitude', 'median'),
+        longitude=('longitude', 'median'),
+        district=('district', 'first'),
+        state=('state', 'first')
+    ).reset_index().sort_values('pincode')
+
+
+def build_index(source_path, index_dir):
+    """Write the sorted pincode index for ``source_path`` into ``index_dir``."""
+    df = _read_source(source_path)
+    district_codes, districts = pd.factorize(df['district'].fillna('').str.title())
+    state_codes, states = pd.factorize(df['state'].fillna('').str.title())
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    tmp_dir = tempfile.mkdtemp(prefix='.gazetteer-', dir=parent)
+    np.save(os.path.join(tmp_dir, 'pincodes.npy'), df['pincode'].to_numpy(dtype=np.int32))
+    np.save(os.path.join(tmp_dir, 'coords.npy'), df[['latitude', 'longitude']].to_numpy(dtype=np.float32))
+    np.save(os.path.join(tmp_dir, 'districts.npy'), district_codes.astype(np.int32))
+    np.save(os.path.join(tmp_dir, 'states.npy'), state_codes.astype(np.int32))
+    with open(os.path.join(tmp_dir, 'names.json'), 'w', encoding='utf-8') as f:
+        json.dump({'districts': list(districts), 'states': list(states)}, f)
+    shutil.rmtree(index_dir, ignore_errors=True)
+    try:
+        os.rename(tmp_dir, index_dir)
+    except OSError:
+        # Another worker finished the same build first; keep its copy.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logger.info(f"Built pincode gazetteer index with {len(df)} pincodes in {index_dir}")
+
+
+class Gazetteer:
+    """Lazy pincode lookup against a gazetteer CSV (see module docstring)."""
+
+    def __init__(self, source_path, index_dir=None):
+        self.source_path = source_path
+        self.index_dir = index_dir or f'{source_path}.idx'
+        self._lock = threading.Lock()
+        self._pincodes = None
+
+    @classmethod
+    def from_env(cls):
+        """Gazetteer for the CSV named by ``$PINCODE_GAZETTEER``, or None when unset.
+
+        ``$PINCODE_GAZETTEER_INDEX`` overrides where the index is kept, for
+        deployments where the CSV sits on a read-only path.
+        """
+        source_path = os.environ.get(GAZETTEER_ENV)
+        if not source_path:
+            return None
+        return cls(source_path, os.environ.get(GAZETTEER_INDEX_ENV))
+
+    def _is_stale(self):
+        marker = os.path.join(self.index_dir, 'names.json')
+        return not os.path.exists(marker) or os.path.getmtime(marker) < os.path.getmtime(self.source_path)
+
+    def _load(self):
+        with self._lock:
+            if self._pincodes is not None:
+                return
+            if self._is_stale():
+                build_index(self.source_path, self.index_dir)
+            self._coords = np.load(os.path.join(self.index_dir, 'coords.npy'), mmap_mode='r')
+            self._districts = np.load(os.path.join(self.index_dir, 'districts.npy'), mmap_mode='r')
+            self._states = np.load(os.path.join(self.index_dir, 'states.npy'), mmap_mode='r')
+            with open(os.path.join(self.index_dir, 'names.json'), encoding='utf-8') as f:
+                names = json.load(f)
+            self._district_names = np.array(names['districts'], dtype=object)
+            self._state_names = np.array(names['states'], dtype=object)
+            self._pincodes = np.load(os.path.join(self.index_dir, 'pincodes.npy'), mmap_mode='r')
+
+    def __len__(self):
+        self._load()
+        return len(self._pincodes)
+
+    def _positions(self, pincodes):
+        self._load()
+        codes = pd.to_numeric(pd.Series(pincodes, dtype=object), errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+        if len(self._pincodes) == 0:
+            return np.zeros(len(codes), dtype=np.intp), np.zeros(len(codes), dtype=bool)
+        positions = np.searchsorted(self._pincodes, codes)
+        positions[positions == len(self._pincodes)] = 0
+        return positions, self._pincodes[positions] == codes
+
+    def lookup(self, pincodes):
+        """Return ``(coords, found)``: an ``(n, 2)`` float array and a boolean hit mask."""
+        positions, found = self._positions(pincodes)
+        coords = np.full((len(positions), 2), np.nan)
+        coords[found] = self._coords[positions[found]]
+        return coords, found
+
+    def describe(self, pincodes):
+        """Return ``(district, state)`` object arrays for ``pincodes`` (None where unknown)."""
+        positions, found = self._positions(pincodes)
+        districts = np.full(len(positions), None, dtype=object)
+        states = np.full(len(positions), None, dtype=object)
+        districts[found] = self._district_names[self._districts[positions[found]]]
+        states[found] = self._state_names[self._states[positions[found]]]
+        return districts, states
@@ -0,0 +1,64 @@
+"""Vectorized geocoding shared by the ``process_*`` loaders."""
+import numpy as np
+import pandas as pd
+
+DEFAULT_COORDS = (19.0760, 72.8777)
+
+
+def _build_table(coords):
+    index = pd.Index(list(coords.keys()), dtype=object)
+    values = np.array(list(coords.values()), dtype=np.float64).reshape(len(coords), 2)
+    return index, values
+
+
+class Geocoder:
+    """Resolves coordinates for whole columns with fallback pincode -> city -> default.
+
+    The ``pincode_coords``/``city_coords`` dicts are turned into lookup tables
+    once; ``locate`` then resolves a column with one hash join per level
+    instead of a Python call per row. When a ``Gazetteer`` is given, pincodes
+    missing from ``pincode_coords`` are looked up there before falling back to
+    the city.
+    """
+
+    def __init__(self, pincode_coords, city_coords, default=DEFAULT_COORDS, gazetteer=None):
+        self._pincode_index, self._pincode_values = _build_table(pincode_coords)
+        self._city_index, self._city_values = _build_table(city_coords)
+        self.default = default
+        self.gazetteer = gazetteer
+
+    @staticmethod
+    def _join(index, values, keys, out, missing):
+        positions = index.get_indexer(keys[missing])
+        found = positions >= 0
+        rows = np.flatnonzero(missing)[found]
+        out[rows] = values[positions[found]]
+        missing[rows] = False
+
+    def locate(self, pincodes, cities=None):
+        """Return ``(latitude, longitude)`` float arrays aligned with ``pincodes``.
+
+        Rows whose pincode is unknown fall back to the gazetteer, then to
+        ``cities`` (when given), and anything still unresolved gets the default
+        coordinates.
+        """
+        n = len(pincodes)
+        pincodes = np.asarray(pincodes, dtype=object)
+        out = np.empty((n, 2), dtype=np.float64)
+        missing = np.ones(n, dtype=bool)
+        self._join(self._pincode_index, self._pincode_values, pincodes, out, missing)
+        if self.gazetteer is not None and missing.any():
+            rows = np.flatnonzero(missing)
+            coords, found = self.gazetteer.lookup(pincodes[rows])
+            out[rows[found]] = coords[found]
+            missing[rows[found]] = False
+        if cities is not None and missing.any():
+            self._join(self._city_index, self._city_values, np.asarray(cities, dtype=object), out, missing)
+        out[missing] = self.default
+        return out[:, 0], out[:, 1]
+
+    def assign(self, df, pincode_col='pincode', city_col='city'):
+        """Set ``latitude``/``longitude`` on ``df`` from its pincode and city columns."""
+        cities = df[city_col] if city_col in df.columns else None
+        df['latitude'], df['longitude'] = self.locate(df[pincode_col], cities)
+        return df
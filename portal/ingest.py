@@ -0,0 +1,188 @@
+"""Chunked, bounded-memory CSV ingestion for large deal exports.
+
+In streaming mode a CSV is read ``$INGEST_CHUNK_ROWS`` rows at a time. Each
+chunk is cleaned by the app's ``clean_*`` function, fed to the aggregates,
+trimmed to the columns and float32 coordinates of the compact frame and
+spilled to disk as its own Arrow file. Once the file is consumed the parts are
+scanned for the frame's categories and integer ranges, then cast to one
+schema and written into the columnar cache batch by batch. At no point is more
+than one chunk of the raw CSV in memory, and the stored frame is returned
+memory-mapped (``columnar.StoredFrame``) rather than converted to pandas.
+
+Aggregates (``RowCount``, ``Distinct``) see every cleaned row whether the
+file was streamed, parsed whole or served from the cache, so the KPIs built
+from them do not depend on the ingest mode. A ``Distinct`` can be saved with
+the set and restored later to keep counting rows appended to it.
+
+``$INGEST_MODE`` picks the mode: ``stream``, ``full`` or ``auto`` (the
+default), which streams files larger than ``$INGEST_STREAM_THRESHOLD_MB``.
+"""
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from portal import columnar
+
+logger = logging.getLogger(__name__)
+
+INGEST_MODE_ENV = 'INGEST_MODE'
+INGEST_CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 250000))
+INGEST_STREAM_THRESHOLD_MB = int(os.environ.get('INGEST_STREAM_THRESHOLD_MB', 256))
+
+
+class RowCount:
+    """Number of rows seen."""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, df):
+        self.value += len(df)
+
+    def __len__(self):
+        return self.value
+
+
+class Distinct:
+    """Number of distinct combinations of ``columns`` over every row seen.
+
+    ``where(df)`` optionally restricts the rows (a boolean mask), and
+    ``dropna`` ignores combinations with a missing value. Integer and float
+    columns compare by value, as they do after ``pd.concat`` upcasts them.
+    Only a 64-bit hash of each combination is kept, so each chunk costs time
+    in proportion to its own rows; with 64 bits, collisions are not a concern
+    at the sizes of these exports.
+    """
+
+    def __init__(self, columns, where=None, dropna=False):
+        self.columns = list(columns)
+        self.where = where
+        self.dropna = dropna
+        self._seen = set()
+
+    def _hashes(self, df):
+        part = pd.DataFrame({col: df[col].astype('float64') if pd.api.types.is_numeric_dtype(df[col])
+                             else df[col].astype(object) for col in self.columns})
+        if self.dropna:
+            part = part.dropna()
+        return pd.util.hash_pandas_object(part, index=False).to_numpy()
+
+    def update(self, df):
+        if self.where is not None:
+            df = df[self.where(df)]
+        self._seen.update(self._hashes(df).tolist())
+
+    def __len__(self):
+        return len(self._seen)
+
+    def save(self, set_folder, name):
+        """Store the hashes seen so far as the cached frame ``name`` of the set."""
+        hashes = np.fromiter(self._seen, dtype=np.uint64, count=len(self._seen))
+        return columnar.save_frame(pd.DataFrame({'hash': hashes}), set_folder, name)
+
+    def restore(self, set_folder, name):
+        """Continue from the hashes stored by ``save``; returns False if there are none."""
+        seen = columnar.load_table(set_folder, name)
+        if seen is None:
+            return False
+        if seen.column_names == ['hash']:
+            self._seen = set(seen.column('hash').to_numpy().tolist())
+        else:
+            # Sets stored before hashing kept the distinct rows themselves.
+            self._seen = set(self._hashes(seen.to_pandas()).tolist())
+        return True
+
+
+def use_streaming(file_path):
+    mode = os.environ.get(INGEST_MODE_ENV, 'auto')
+    if mode == 'stream':
+        return True
+    if mode == 'full':
+        return False
+    return os.path.getsize(file_path) > INGEST_STREAM_THRESHOLD_MB * 1024 * 1024
+
+
+def stream_csv(file_path, name, clean, aggregates=(), compaction=None, chunk_rows=None, **read_csv_kwargs):
+    """Clean ``file_path`` chunk by chunk into the set's columnar cache and return it as a ``StoredFrame``.
+
+    ``compaction`` (a ``portal.compact.Compaction``) is applied part by part.
+    """
+    set_folder = os.path.dirname(file_path)
+    part_folder = tempfile.mkdtemp(prefix=f'.{name}-', dir=set_folder)
+    try:
+        parts = []
+        schemas = []
+        rows = 0
+        reader = pd.read_csv(file_path, chunksize=chunk_rows or INGEST_CHUNK_ROWS, **read_csv_kwargs)
+        for i, chunk in enumerate(reader):
+            chunk = clean(chunk)
+            for aggregate in aggregates:
+                aggregate.update(chunk)
+            if compaction is not None:
+                chunk = compaction.chunk(chunk)
+            table = pa.Table.from_pandas(chunk.reset_index(drop=True), preserve_index=False).replace_schema_metadata(None)
+            part = os.path.join(part_folder, f'{i:05d}.arrow')
+            feather.write_feather(table, part, compression='uncompressed')
+            parts.append(part)
+            schemas.append(table.schema)
+            rows += table.num_rows
+        if not parts:
+            return pd.DataFrame()
+        schema = columnar.unify_schemas(schemas)
+
+        def tables():
+            return (feather.read_table(part, memory_map=True).cast(schema) for part in parts)
+
+        plan = compaction.tables(schema, rows) if compaction is not None else None
+        if plan is None:
+            columnar.save_tables(set_folder, name, schema, tables())
+        else:
+            for table in tables():
+                plan.scan(table)
+            path = columnar.save_tables(set_folder, name, plan.schema, (plan.apply(table) for table in tables()))
+            logger.info(f"Compacted {name}: {plan.bytes_before} -> {os.path.getsize(path)} bytes ({rows} rows)")
+        logger.info(f"Streamed {name} from {file_path} in {len(parts)} chunks")
+    finally:
+        shutil.rmtree(part_folder, ignore_errors=True)
+    return columnar.load_stored_frame(set_folder, name)
+
+
+def load(file_path, name, loader, clean, aggregates=(), compaction=None, **read_csv_kwargs):
+    """Cleaned frame for ``file_path``, fed through ``aggregates``.
+
+    Small files go through ``loader`` and the columnar cache as before and come
+    back as a DataFrame. Large ones are streamed with ``clean``
+    (``read_csv_kwargs`` go to ``pd.read_csv``), or read back from a fresh
+    cached frame one batch at a time, and come back as a memory-mapped
+    ``columnar.StoredFrame``. ``compaction`` (a ``portal.compact.Compaction``)
+    is applied to a newly loaded frame before it is cached. Returns an empty
+    frame if streaming fails, like the loaders do.
+    """
+    if not use_streaming(file_path):
+        df = columnar.load_or_process(file_path, name, loader, compaction)
+        if not df.empty:
+            for aggregate in aggregates:
+                aggregate.update(df)
+        return df
+    if columnar.is_fresh(file_path, name):
+        try:
+            frame = columnar.load_stored_frame(os.path.dirname(file_path), name)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cached frame '{name}' for {file_path}: {e}")
+            frame = None
+        if frame is not None:
+            for batch in frame.batches():
+                for aggregate in aggregates:
+                    aggregate.update(batch)
+            return frame
+    try:
+        return stream_csv(file_path, name, clean, aggregates, compaction, **read_csv_kwargs)
+    except Exception as e:
+        logger.error(f"Error streaming {name} from {file_path}: {e}")
+        return pd.DataFrame()
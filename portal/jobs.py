@@ -0,0 +1,117 @@
+"""Background job queue for long-running analysis work.
+
+Jobs run on a local thread pool. Their status is written to
+``<root>/jobs/<job_id>.json`` on every transition, so any gunicorn worker can
+answer ``/jobs/<id>`` for a job started by another one.
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """Status record of one job; ``enter_stage`` is passed to the work function as a progress callback."""
+
+    def __init__(self, job_id, path, meta):
+        self.job_id = job_id
+        self.path = path
+        self.state = QUEUED
+        self.meta = meta
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = []
+        self._stage_started = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'state': self.state,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stages': self.stages,
+            **self.meta
+        }
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, self.path)
+
+    def _close_stage(self):
+        if self.stages and self.stages[-1]['seconds'] is None:
+            self.stages[-1]['seconds'] = round(time.perf_counter() - self._stage_started, 4)
+
+    def enter_stage(self, name):
+        """Finish timing the current stage (if any) and start timing ``name``."""
+        self._close_stage()
+        self.stages.append({'name': name, 'seconds': None})
+        self._stage_started = time.perf_counter()
+        self.save()
+
+    def _start(self):
+        self.state = RUNNING
+        self.started_at = time.time()
+        self.save()
+
+    def _finish(self, error=None):
+        self._close_stage()
+        self.state = FAILED if error else DONE
+        self.error = error
+        self.finished_at = time.time()
+        self.save()
+
+
+class JobQueue:
+    def __init__(self, root, max_workers=2):
+        self.folder = os.path.join(root, 'jobs')
+        os.makedirs(self.folder, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+
+    def _path(self, job_id):
+        return os.path.join(self.folder, f'{job_id}.json')
+
+    def submit(self, func, *args, meta=None, **kwargs):
+        """Queue ``func(job, *args, **kwargs)`` and return the new job id.
+
+        The job fails if ``func`` raises; the exception message becomes the job error.
+        """
+        job_id = uuid.uuid4().hex
+        job = Job(job_id, self._path(job_id), meta or {})
+        job.save()
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job_id
+
+    def _run(self, job, func, args, kwargs):
+        job._start()
+        try:
+            func(job, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e}")
+            job._finish(error=str(e))
+        else:
+            job._finish()
+
+    def status(self, job_id):
+        """Return the last saved status dict of a job, or None if it is unknown."""
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,172 @@
+"""Non-blocking, structured logging for the web app.
+
+``configure`` replaces a ``basicConfig`` setup. The root logger gets a single
+``QueueHandler``; a ``QueueListener`` thread takes records off the queue and
+writes them to stderr and to a size-capped, rotating log file, so a request
+thread never waits for disk I/O. Records are JSON objects, one per line, with
+any ``extra=`` fields included.
+
+Environment:
+
+- ``LOG_FORMAT``: ``json`` (default) or ``text`` for the old
+  ``asctime - level - message`` lines.
+- ``LOG_LEVEL``: root level, ``DEBUG`` by default.
+- ``LOG_LEVELS``: per-logger levels, e.g. ``werkzeug=WARNING,portal.ingest=INFO``.
+- ``LOG_DEBUG_SAMPLE``: keep one in N DEBUG records per call site (default
+  100; 1 keeps all). The first record from a call site is always kept.
+- ``LOG_MAX_BYTES``/``LOG_BACKUPS``: size at which the log file rotates and
+  how many rotated files are kept (10 MB, 3).
+- ``LOG_QUEUE_SIZE``: records waiting for the listener; beyond that, records
+  are dropped and counted in ``dash_log_records_dropped_total`` rather than
+  blocking the caller.
+
+In a child process (e.g. a render worker importing the app) ``configure``
+only writes to stderr: the log file belongs to the parent's listener, and
+several processes rotating one file would lose records.
+"""
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+from portal import metrics
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DROPPED = metrics.Counter('dash_log_records_dropped_total', 'Log records dropped because the log queue was full.')
+# Attributes every LogRecord has; anything else on a record came from ``extra=``.
+_STANDARD_ATTRS = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, thread, extras and any exception."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        entry.update((key, value) for key, value in record.__dict__.items() if key not in _STANDARD_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Pass one in ``rate`` DEBUG records from each call site; other levels always pass.
+
+    Kept records carry ``sample_rate`` so readers can scale counts back up.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(int(rate), 1)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG or self.rate == 1:
+            return True
+        site = (record.name, record.pathname, record.lineno)
+        with self._lock:
+            counter = self._counters.setdefault(site, itertools.count())
+            keep = next(counter) % self.rate == 0
+        if keep:
+            record.sample_rate = self.rate
+        return keep
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks: records are dropped when the queue is full.
+
+    The message and exception text are rendered here, in the calling thread,
+    so the listener never touches the caller's arguments; they stay separate
+    fields rather than being folded into one string.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+def parse_levels(text):
+    """``{'werkzeug': 'WARNING', ...}`` from ``'werkzeug=WARNING,...'``; malformed entries are ignored."""
+    levels = {}
+    for item in (text or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(log_file='app.log'):
+    """Route all logging through a background listener writing to stderr and ``log_file``.
+
+    Returns the listener, or None in a child process, which logs to stderr
+    directly. Safe to call more than once; later calls replace the earlier
+    setup.
+    """
+    global _listener
+    formatter = logging.Formatter(TEXT_FORMAT) if os.environ.get('LOG_FORMAT', 'json') == 'text' else JsonFormatter()
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backupCount=int(os.environ.get('LOG_BACKUPS', 3)), encoding='utf-8', delay=True)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    records = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    queue_handler = _DroppingQueueHandler(records)
+    queue_handler.addFilter(DebugSampler(os.environ.get('LOG_DEBUG_SAMPLE', 100)))
+
+    stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(os.environ.get('LOG_LEVEL', 'DEBUG').upper())
+    for name, level in parse_levels(os.environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+    if multiprocessing.parent_process() is not None:
+        stream_handler.addFilter(DebugSampler(os.environ.get('LOG_DEBUG_SAMPLE', 100)))
+        root.addHandler(stream_handler)
+        return None
+    root.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(records, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop():
+    """Write out the records still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            # No room for the stop sentinel; the listener is a daemon thread and dies with the process.
+            pass
+        _listener = None
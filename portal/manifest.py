@@ -0,0 +1,193 @@
+"""Transactional index of the analysis sets in an upload folder.
+
+Set numbers used to be found by listing the upload folder and taking the
+highest ``set_N`` plus one, on every upload. That costs a directory scan per
+upload, and two workers uploading at once could get the same number.
+``SetManifest`` keeps one SQLite row per set in ``<root>/manifest.sqlite3``
+instead:
+
+- ``allocate`` inserts a row and returns its number in one transaction, so
+  concurrent threads and processes never share a number and numbers are not
+  reused;
+- the row records when the set was created, its state (``uploading``,
+  ``analyzing``, ``ready`` or ``failed``), the uploaded files (name, bytes,
+  SHA-256 when known), their total size and the rows of each cleaned frame;
+- ``sets`` returns those rows, e.g. for the set dropdown, without touching
+  the directory tree.
+
+A manifest created in a folder that already holds ``set_N`` folders numbers
+new sets after the highest of them; that is the only time the folder is
+listed.
+"""
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.sqlite3'
+UPLOADING, ANALYZING, READY, FAILED = 'uploading', 'analyzing', 'ready', 'failed'
+# Seconds a writer waits for another process's transaction to finish.
+BUSY_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sets (
+    set_number INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    state TEXT NOT NULL,
+    files TEXT NOT NULL DEFAULT '{}',
+    bytes INTEGER NOT NULL DEFAULT 0,
+    rows TEXT NOT NULL DEFAULT '{}'
+)
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def describe_files(paths, hashes=None):
+    """``{kind: {'name', 'bytes'[, 'sha256']}}`` for ``{kind: path}``; missing paths are left out."""
+    files = {}
+    for kind, path in paths.items():
+        if not path:
+            continue
+        files[kind] = {'name': os.path.basename(path), 'bytes': os.path.getsize(path)}
+        if hashes and hashes.get(kind):
+            files[kind]['sha256'] = hashes[kind]
+    return files
+
+
+def _entry(row):
+    return {
+        'set_number': row['set_number'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'state': row['state'],
+        'files': json.loads(row['files']),
+        'bytes': row['bytes'],
+        'rows': json.loads(row['rows'])
+    }
+
+
+class SetManifest:
+    """Set numbers and per-set metadata for the upload folder ``root``."""
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST_FILE)
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _connect(self):
+        # Autocommit mode; writes take the database lock with BEGIN IMMEDIATE.
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _existing_max(self):
+        numbers = [int(name.split('_', 1)[1]) for name in os.listdir(self.root)
+                   if name.startswith('set_') and name.split('_', 1)[1].isdigit()]
+        return max(numbers, default=0)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """A connection inside a write transaction, committed unless the block raises."""
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            yield connection
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+
+    def _ensure_schema(self):
+        with self._ready_lock:
+            if self._ready:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            connection = self._connect()
+            try:
+                # WAL lets readers carry on while an upload allocates; not every filesystem supports it.
+                connection.execute('PRAGMA journal_mode=WAL')
+            finally:
+                connection.close()
+            with self._transaction() as connection:
+                connection.execute(_SCHEMA)
+                seeded = connection.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'sets'").fetchone()
+                if seeded is None and connection.execute('SELECT 1 FROM sets LIMIT 1').fetchone() is None:
+                    start = self._existing_max()
+                    if start:
+                        connection.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('sets', ?)", (start,))
+                        logger.info(f"Numbering new sets after existing set_{start}")
+            self._ready = True
+
+    def _write(self, sql, params=()):
+        self._ensure_schema()
+        with self._transaction() as connection:
+            return connection.execute(sql, params).lastrowid
+
+    def allocate(self, files=None, state=UPLOADING):
+        """Reserve the next set number and return it."""
+        now = _now()
+        files = files or {}
+        return self._write('INSERT INTO sets (created_at, updated_at, state, files, bytes) VALUES (?, ?, ?, ?, ?)',
+                           (now, now, state, json.dumps(files), sum(f['bytes'] for f in files.values())))
+
+    def record_files(self, set_number, files, state=None):
+        """Store the uploaded ``files`` (see ``describe_files``) of a set, optionally with a new state."""
+        self._write('UPDATE sets SET files = ?, bytes = ?, state = COALESCE(?, state), updated_at = ? '
+                    'WHERE set_number = ?',
+                    (json.dumps(files), sum(f['bytes'] for f in files.values()), state, _now(), set_number))
+
+    def set_state(self, set_number, state, rows=None):
+        """Change a set's state, and replace its ``{frame: rows}`` counts when given."""
+        self._write('UPDATE sets SET state = ?, rows = COALESCE(?, rows), updated_at = ? WHERE set_number = ?',
+                    (state, None if rows is None else json.dumps(rows), _now(), set_number))
+
+    def add_rows(self, set_number, added):
+        """Add ``{frame: rows}`` appended to a set to its counts."""
+        self._ensure_schema()
+        with self._transaction() as connection:
+            row = connection.execute('SELECT rows FROM sets WHERE set_number = ?', (set_number,)).fetchone()
+            if row is None:
+                return
+            rows = json.loads(row['rows'])
+            for frame, count in added.items():
+                rows[frame] = rows.get(frame, 0) + count
+            connection.execute('UPDATE sets SET rows = ?, updated_at = ? WHERE set_number = ?',
+                               (json.dumps(rows), _now(), set_number))
+
+    def remove(self, set_number):
+        """Forget a set (its number is not handed out again)."""
+        self._write('DELETE FROM sets WHERE set_number = ?', (set_number,))
+
+    def get(self, set_number):
+        """The entry of one set, or None."""
+        entries = self.sets([set_number])
+        return entries[0] if entries else None
+
+    def sets(self, set_numbers=None):
+        """Entries of ``set_numbers`` (all sets by default), by set number."""
+        self._ensure_schema()
+        connection = self._connect()
+        try:
+            if set_numbers is None:
+                rows = connection.execute('SELECT * FROM sets ORDER BY set_number').fetchall()
+            else:
+                numbers = [int(n) for n in set_numbers]
+                placeholders = ','.join('?' * len(numbers))
+                rows = connection.execute(f'SELECT * FROM sets WHERE set_number IN ({placeholders}) '
+                                          'ORDER BY set_number', numbers).fetchall() if numbers else []
+        finally:
+            connection.close()
+        return [_entry(row) for row in rows]
@@ -0,0 +1,199 @@
+"""Stage timers exposed as Prometheus metrics and ``Server-Timing`` headers.
+
+``timer``/``timed`` time a block or function as a named stage and ``Stages``
+times consecutive stages marked through a progress callback, as
+``perform_analysis`` reports them. Every timing is observed in the
+``dash_stage_seconds`` histogram; timings taken while a request is being
+served are also collected for that request's ``Server-Timing`` header (see
+``start_request`` and ``server_timing``). Stage names are dotted,
+e.g. ``analysis.process_deals`` or ``filter.deal_date``.
+
+Metrics live in the process that recorded them: with several server
+processes, each exposes its own counts.
+"""
+import contextlib
+import contextvars
+import functools
+import math
+import re
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Upper bounds in seconds; analysis stages on large uploads take minutes.
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_lock = threading.Lock()
+# Timings of the request being served in this context, or None outside a request.
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+_NON_TOKEN = re.compile(r'[^A-Za-z0-9_.\-]')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    if math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with _lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic total per label combination."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f'{self.name}{_label_text(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{_label_text(self.labelnames, key, [("le", _number(bound))])} {count}'
+            yield f'{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_label_text(self.labelnames, key)} {counts[-1]}'
+
+
+STAGE_SECONDS = Histogram('dash_stage_seconds', 'Time spent in each processing stage.', ['stage'])
+ROWS_PROCESSED = Counter('dash_rows_processed_total', 'Cleaned rows loaded or appended, per frame.', ['frame'])
+UPLOAD_BYTES = Counter('dash_upload_bytes_total', 'Bytes of uploaded CSV files, per file kind.', ['kind'])
+
+
+def exposition():
+    """All metrics in the Prometheus text format."""
+    with _lock:
+        metrics = list(_registry)
+    return '\n'.join(line for metric in metrics for line in metric.expose()) + '\n'
+
+
+def record(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextlib.contextmanager
+def timer(stage):
+    """Time the ``with`` block as ``stage``, whether or not it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    """Decorator timing every call of the function as ``stage``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Stages:
+    """Progress callback that times the stages it is called with, as ``<prefix>.<name>``.
+
+    Calling it with a stage name ends the current stage, passes the name on to
+    ``progress`` and starts timing the new one; leaving the ``with`` block ends
+    the last stage.
+    """
+
+    def __init__(self, prefix, progress=None):
+        self.prefix = prefix
+        self.progress = progress
+        self._current = None
+        self._started = None
+
+    def _close(self):
+        if self._current is not None:
+            record(f'{self.prefix}.{self._current}', time.perf_counter() - self._started)
+            self._current = None
+
+    def __call__(self, name):
+        self._close()
+        if self.progress is not None:
+            self.progress(name)
+        self._current = name
+        self._started = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._close()
+
+
+def start_request():
+    """Start collecting timings for the current request; returns its start time."""
+    _request_timings.set([])
+    return time.perf_counter()
+
+
+def server_timing(started=None):
+    """``Server-Timing`` header value for the timings collected since ``start_request``.
+
+    With ``started``, a ``total`` entry covers the whole request.
+    """
+    timings = list(_request_timings.get() or [])
+    if started is not None:
+        timings.append(('total', time.perf_counter() - started))
+    return ', '.join(f'{_NON_TOKEN.sub("_", stage)};dur={seconds * 1000:.1f}' for stage, seconds in timings)
@@ -0,0 +1,59 @@
+"""Cursor-based paging over filter results.
+
+A cursor is an opaque, URL-safe token holding the offset of the next page
+and a fingerprint of the query that produced it, so a cursor cannot be
+replayed against a different filter. Only the rows of the requested page are
+handed to the serializer.
+"""
+import base64
+import hashlib
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def query_key(*parts):
+    """Short fingerprint of the values identifying a query."""
+    return hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(offset, key):
+    payload = json.dumps({'o': offset, 'k': key}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, key):
+    """Offset stored in ``cursor``; raises ``ValueError`` if it is malformed or for another query."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset, cursor_key = int(payload['o']), payload['k']
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from None
+    if cursor_key != key or offset < 0:
+        raise ValueError("Cursor does not belong to this query")
+    return offset
+
+
+def page_size(limit):
+    """Clamp a requested page size to ``1..MAX_PAGE_SIZE`` (``DEFAULT_PAGE_SIZE`` when missing)."""
+    if limit in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def paginate(matches, key, serialize, cursor=None, limit=None):
+    """One page of the ``matches`` frame as ``{'total', 'items', 'next_cursor'}``.
+
+    ``serialize`` turns the page's rows into JSON-ready items; ``next_cursor``
+    is None on the last page.
+    """
+    offset = decode_cursor(cursor, key) if cursor else 0
+    limit = page_size(limit)
+    page = matches.iloc[offset:offset + limit]
+    next_offset = offset + len(page)
+    return {
+        'total': len(matches),
+        'items': serialize(page),
+        'next_cursor': encode_cursor(next_offset, key) if next_offset < len(matches) else None
+    }
@@ -0,0 +1,43 @@
+"""Edge builder for the user -> dealer relational map."""
+import math
+
+import pandas as pd
+
+EDGE_COLUMNS = ['user_pincode', 'dealer_pincode', 'weight']
+
+
+def _first_pincode_by(dealers_df, key):
+    if key not in dealers_df.columns:
+        return pd.Series(dtype=object)
+    first = dealers_df.dropna(subset=[key]).drop_duplicates(subset=[key], keep='first')
+    return pd.Series(first['pincode'].to_numpy(), index=first[key].to_numpy())
+
+
+def build_edges(deals_df, dealers_df, user_pincodes, dealer_pincodes):
+    """Aggregate deals into weighted ``(user pincode, dealer pincode)`` pairs.
+
+    Each deal is resolved to a dealer with one hash join on
+    ``dealerinfo.coname`` (first dealer with that ``coname``) or, when the deal
+    has no company name, on ``dealerinfo.dealer_id`` against ``_id``. Deals
+    with neither link to a dealer in their own pincode. Only pairs whose ends
+    are in ``user_pincodes``/``dealer_pincodes`` are kept, and ``weight`` counts
+    the deals behind each pair.
+    """
+    deals = deals_df[deals_df['pincode'].isin(list(user_pincodes))]
+    if deals.empty:
+        return pd.DataFrame(columns=EDGE_COLUMNS)
+    target = deals['pincode'].astype(object).copy()
+    has_name = deals['dealerinfo.coname'].notna() if 'dealerinfo.coname' in deals.columns else pd.Series(False, index=deals.index)
+    has_id = ~has_name & deals['dealerinfo.dealer_id'].notna() if 'dealerinfo.dealer_id' in deals.columns else pd.Series(False, index=deals.index)
+    if has_name.any():
+        target[has_name] = deals.loc[has_name, 'dealerinfo.coname'].map(_first_pincode_by(dealers_df, 'coname'))
+    if has_id.any():
+        target[has_id] = deals.loc[has_id, 'dealerinfo.dealer_id'].map(_first_pincode_by(dealers_df, '_id'))
+    edges = pd.DataFrame({'user_pincode': deals['pincode'].to_numpy(), 'dealer_pincode': target.to_numpy()})
+    edges = edges[edges['dealer_pincode'].isin(list(dealer_pincodes))]
+    return edges.groupby(['user_pincode', 'dealer_pincode']).size().reset_index(name='weight')
+
+
+def edge_thickness(weight):
+    """Line weight (px) for an edge carrying ``weight`` deals."""
+    return min(1 + math.log2(weight), 10)
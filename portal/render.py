@@ -0,0 +1,95 @@
+"""Parallel render stage for the map and figure builders.
+
+The ``create_*`` builders called by ``perform_analysis`` do not depend on each
+other's output, so they are submitted together to a process pool that is
+created once and reused. Where process pools are unavailable (e.g. no
+``/dev/shm`` on serverless runtimes) or ``RENDER_WORKERS`` is ``0`` or ``1``,
+the builders run one after another in the calling process.
+
+Workers are started with ``forkserver`` (``spawn`` where that is missing;
+``$RENDER_START_METHOD`` overrides it) rather than forked from the web
+process, whose job and logging threads may hold locks at the moment of the
+fork. Builders get their frames by name: a worker memory-maps the frames
+cached in the set folder (``portal.columnar``) instead of receiving pickled
+DataFrames.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from portal import columnar
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_workers():
+    return int(os.environ.get('RENDER_WORKERS', os.cpu_count() or 1))
+
+
+def start_method():
+    default = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return os.environ.get('RENDER_START_METHOD', default)
+
+
+def _get_executor(max_workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context(start_method()))
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _dataframe(frame):
+    # Builders need the whole frame; a streamed one is only memory-mapped until here.
+    return frame.to_pandas() if isinstance(frame, columnar.StoredFrame) else frame
+
+
+def _render_task(func, set_folder, frames):
+    """Run ``func`` in a worker; ``frames`` are DataFrames or names of frames cached in ``set_folder``."""
+    return func(*(columnar.load_frame(set_folder, frame) if isinstance(frame, str) else _dataframe(frame)
+                  for frame in frames))
+
+
+def _render_sequential(tasks, frames):
+    return {name: func(*(_dataframe(frames[frame]) for frame in names)) for name, (func, *names) in tasks.items()}
+
+
+def render_all(tasks, frames, set_folder=None):
+    """Run ``{name: (func, *frame_names)}`` concurrently and return ``{name: result}``.
+
+    ``frames`` maps each frame name (``'deals'``, ``'dealers'``, ...) to its
+    DataFrame or ``columnar.StoredFrame``. Workers load the frames cached
+    under those names in ``set_folder`` instead; a frame that is not cached
+    there (or every frame, without ``set_folder``) is sent to them pickled.
+    Results are the same as calling each ``func`` on the frames directly; an
+    exception raised by a builder propagates to the caller.
+    """
+    workers = min(render_workers(), len(tasks))
+    if workers <= 1:
+        return _render_sequential(tasks, frames)
+    shipped = {name: name if set_folder and os.path.exists(columnar.frame_path(set_folder, name)) else df
+               for name, df in frames.items()}
+    try:
+        executor = _get_executor(render_workers())
+        futures = {name: executor.submit(_render_task, func, set_folder, [shipped[frame] for frame in names])
+                   for name, (func, *names) in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+    except (BrokenProcessPool, OSError, NotImplementedError) as e:
+        logger.warning(f"Process pool unavailable ({e}); rendering sequentially")
+        _reset_executor()
+        return _render_sequential(tasks, frames)
@@ -0,0 +1,285 @@
+"""Precomputed row indexes for the dashboard filters.
+
+``CategoryIndex`` is an inverted token index over the dealer category columns.
+``cat_disp_names``/``subcat_disp_names`` hold ``' | '``-separated display
+names such as ``"Kitchen Sinks | Paint"``. The index maps every normalized
+name (``"kitchen sinks"``) and every word in it (``"kitchen"``, ``"sinks"``)
+to the sorted row positions of the dealers that carry it.
+
+``GroupIndex`` maps each value of a key column (e.g. ``pincode``) to its row
+positions, and ``DateIndex`` keeps row positions ordered by an epoch-seconds
+column; both can span several frames treated as one table.
+
+All of them keep their keys in a sorted array, so exact lookups, prefix and
+date ranges are binary searches and a query never touches the frame rows
+themselves.
+"""
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLUMNS = ('cat_disp_names', 'subcat_disp_names')
+# Epoch value stored for a missing or unparseable timestamp.
+MISSING_EPOCH = np.iinfo(np.int64).min
+_WORD = re.compile(r'\w+')
+# UTC offset after the time of day: ``+05:30``, ``-0800``.
+_OFFSET = r'\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*([+-])(\d{2}):?(\d{2})\s*$'
+_EMPTY = np.array([], dtype=np.int32)
+
+
+def normalize(text):
+    """Lowercase ``text`` and collapse runs of whitespace."""
+    return ' '.join(str(text).lower().split())
+
+
+def parse_epoch(values):
+    """Epoch seconds of each timestamp's own wall-clock time, ``MISSING_EPOCH`` where unparseable.
+
+    A UTC offset is dropped rather than applied, so ``2025-04-01 02:00+05:30``
+    stays on April 1st, as ``pd.to_datetime(...).dt.date`` would date it.
+    Values may carry different offsets.
+    """
+    values = pd.Series(values)
+    try:
+        timestamps = pd.to_datetime(values, errors='coerce')
+    except ValueError:
+        timestamps = None
+    if timestamps is not None and pd.api.types.is_datetime64_any_dtype(timestamps):
+        return _epoch_seconds(timestamps.dt.tz_localize(None) if timestamps.dt.tz else timestamps)
+    # Mixed offsets share no dtype: take UTC instants and add each value's offset back.
+    timestamps = pd.to_datetime(values, errors='coerce', utc=True).dt.tz_localize(None)
+    offsets = values.astype(str).str.extract(_OFFSET)
+    sign = offsets[0].map({'+': 1, '-': -1})
+    shift = sign * (offsets[1].astype(float) * 3600 + offsets[2].astype(float) * 60)
+    return _epoch_seconds(timestamps + pd.to_timedelta(shift.fillna(0), unit='s'))
+
+
+def _epoch_seconds(timestamps):
+    return timestamps.to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def epoch_dates(epochs):
+    """Calendar dates for epoch seconds from ``parse_epoch``; ``NaT`` for ``MISSING_EPOCH``."""
+    epochs = pd.Series(epochs)
+    return pd.to_datetime(epochs.where(epochs != MISSING_EPOCH), unit='s').dt.date
+
+
+def day_range(date_from, date_to=None):
+    """Epoch bounds ``(start, stop)`` covering the days ``date_from`` to ``date_to``, inclusive.
+
+    Raises ``ValueError`` for dates that cannot be parsed.
+    """
+    first = pd.Timestamp(date_from).normalize()
+    last = pd.Timestamp(date_to).normalize() if date_to else first
+    if last < first:
+        first, last = last, first
+    return int(first.timestamp()), int((last + pd.Timedelta(days=1)).timestamp())
+
+
+def _take_rows(rows, frames):
+    """Rows at sorted positions ``rows`` of ``frames`` treated as one concatenated table."""
+    parts = []
+    start = 0
+    for df in frames:
+        lo, hi = np.searchsorted(rows, [start, start + len(df)])
+        parts.append(df.iloc[rows[lo:hi] - start])
+        start += len(df)
+    return parts[0] if len(parts) == 1 else pd.concat(parts)
+
+
+def _postings(tokens, rows):
+    """Sorted unique tokens plus CSR ``offsets``/``rows`` for a token -> rows mapping."""
+    pairs = pd.DataFrame({'token': tokens, 'row': rows}).dropna()
+    pairs = pairs[pairs['token'] != ''].drop_duplicates().sort_values(['token', 'row'])
+    vocabulary, counts = np.unique(pairs['token'].to_numpy(dtype=str), return_counts=True)
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return vocabulary, offsets, pairs['row'].to_numpy(dtype=np.int32)
+
+
+def _expand(tokens, codes, rows):
+    """Postings for ``tokens`` (indexed by distinct-value code) over rows holding those codes."""
+    tokens = tokens.dropna()
+    pairs = pd.DataFrame({'code': codes, 'row': rows}).merge(
+        pd.DataFrame({'code': tokens.index.to_numpy(), 'token': tokens.to_numpy(dtype=object)}), on='code')
+    return _postings(pairs['token'].to_numpy(dtype=object), pairs['row'].to_numpy())
+
+
+class _TokenTable:
+    def __init__(self, vocabulary, offsets, rows):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.rows = rows
+
+    def exact(self, token):
+        i = np.searchsorted(self.vocabulary, token)
+        if i == len(self.vocabulary) or self.vocabulary[i] != token:
+            return _EMPTY
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def prefix(self, prefix):
+        start = np.searchsorted(self.vocabulary, prefix, side='left')
+        stop = np.searchsorted(self.vocabulary, prefix + '\uffff', side='left')
+        if stop - start == 1:
+            return self.rows[self.offsets[start]:self.offsets[stop]]
+        return np.unique(self.rows[self.offsets[start]:self.offsets[stop]])
+
+
+class _StoredIndex:
+    """Save/load as ``.npz``; by default the index is the ``_TokenTable`` attributes named in ``_TABLES``."""
+
+    _TABLES = ()
+    _FIELDS = ('vocabulary', 'offsets', 'rows')
+
+    def _arrays(self):
+        return {f'{name}_{field}': getattr(getattr(self, f'_{name}'), field)
+                for name in self._TABLES for field in self._FIELDS}
+
+    @classmethod
+    def _from_arrays(cls, data):
+        return cls(*(tuple(data[f'{name}_{field}'] for field in cls._FIELDS) for name in cls._TABLES))
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, **self._arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        return _load_cached(cls, path, os.path.getmtime(path))
+
+
+@functools.lru_cache(maxsize=64)
+def _load_cached(cls, path, mtime):
+    with np.load(path, allow_pickle=False) as data:
+        return cls._from_arrays(data)
+
+
+class CategoryIndex(_StoredIndex):
+    """Token -> dealer row index; see the module docstring.
+
+    ``search`` returns row positions into the dealers frame the index was
+    built from, in row order.
+    """
+
+    _TABLES = ('names', 'words')
+
+    def __init__(self, names, words):
+        self._names = _TokenTable(*names)
+        self._words = _TokenTable(*words)
+
+    @classmethod
+    def from_frame(cls, dealers_df):
+        columns = [dealers_df[col].to_numpy(dtype=object) for col in CATEGORY_COLUMNS if col in dealers_df.columns]
+        values = np.concatenate(columns) if columns else np.array([], dtype=object)
+        rows = np.tile(np.arange(len(dealers_df), dtype=np.int32), len(columns))
+        # Dealers share a small set of category strings, so only distinct strings are tokenized.
+        codes, uniques = pd.factorize(values)
+        known = codes >= 0
+        codes, rows = codes[known], rows[known]
+        names = pd.Series(uniques, dtype=object).astype(str).str.split(' | ', regex=False).explode().map(normalize)
+        words = names.str.findall(_WORD).explode()
+        return cls(_expand(names, codes, rows), _expand(words, codes, rows))
+
+    def exact(self, name):
+        """Rows whose categories or subcategories include ``name`` (case-insensitive)."""
+        return self._names.exact(normalize(name))
+
+    def prefix(self, prefix):
+        """Rows with a category word starting with ``prefix``."""
+        return self._words.prefix(normalize(prefix))
+
+    def search(self, query):
+        """Rows matching ``query``.
+
+        A query in double quotes is an exact category name (``"Kitchen Sinks"``).
+        Otherwise every word of the query must prefix-match some category word
+        of the dealer, so ``kitch sink`` finds ``Kitchen Sinks``.
+        """
+        query = query.strip()
+        if len(query) > 1 and query[0] == query[-1] == '"':
+            return self.exact(query[1:-1])
+        terms = _WORD.findall(normalize(query))
+        if not terms:
+            return _EMPTY
+        rows = None
+        for term in sorted(terms, key=len, reverse=True):
+            matched = self._words.prefix(term)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            if len(rows) == 0:
+                break
+        return rows
+
+
+class GroupIndex(_StoredIndex):
+    """Key -> row positions for one column; see the module docstring.
+
+    Built over several frames, positions run through the frames in order as
+    if they were concatenated, and ``take`` slices them back out without
+    building the concatenation.
+    """
+
+    _TABLES = ('groups',)
+
+    def __init__(self, groups):
+        self._groups = _TokenTable(*groups)
+
+    @classmethod
+    def from_frames(cls, column, *frames):
+        keys = np.concatenate([df[column].to_numpy(dtype=object) for df in frames])
+        codes, uniques = pd.factorize(keys, sort=True)
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        order = order[codes[order] >= 0]
+        offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)), out=offsets[1:])
+        return cls((np.asarray(uniques, dtype=str), offsets, order))
+
+    def rows(self, key):
+        """Sorted row positions whose column value equals ``key``."""
+        return self._groups.exact(str(key))
+
+    def take(self, key, *frames):
+        """Rows of ``frames`` (the frames the index was built from) matching ``key``."""
+        return _take_rows(self.rows(key), frames)
+
+
+class DateIndex(_StoredIndex):
+    """Row positions sorted by timestamp; see the module docstring.
+
+    Rows without a timestamp are left out, so they never match a range.
+    """
+
+    def __init__(self, epochs, rows):
+        self.epochs = epochs
+        self.rows = rows
+
+    @classmethod
+    def from_frames(cls, column, *frames):
+        """Index the epoch-seconds ``column`` of ``frames``.
+
+        Frames cached before that column existed have ``created_at`` parsed instead.
+        """
+        epochs = np.concatenate([df[column].to_numpy(dtype=np.int64) if column in df.columns
+                                 else parse_epoch(df['created_at']) for df in frames])
+        order = np.argsort(epochs, kind='stable').astype(np.int32)
+        order = order[epochs[order] != MISSING_EPOCH]
+        return cls(epochs[order], order)
+
+    def _arrays(self):
+        return {'epochs': self.epochs, 'rows': self.rows}
+
+    @classmethod
+    def _from_arrays(cls, data):
+        return cls(data['epochs'], data['rows'])
+
+    def between(self, start, stop):
+        """Sorted row positions with ``start <= epoch < stop``."""
+        lo, hi = np.searchsorted(self.epochs, [start, stop])
+        return np.sort(self.rows[lo:hi])
+
+    def take(self, start, stop, *frames):
+        """Rows of ``frames`` (the frames the index was built from) with ``start <= epoch < stop``."""
+        return _take_rows(self.between(start, stop), frames)
@@ -0,0 +1,200 @@
+"""Synthetic upload exports for benchmarking.
+
+``generate`` writes ``deals.csv``, ``deals_full.csv``, ``users.csv`` and
+``dealers.csv`` with the columns the ``process_*`` loaders expect. The row
+count is that of each deal export; there are ``USERS_PER_DEAL`` users and
+``DEALERS_PER_DEAL`` dealers per deal row.
+
+Activity is skewed the way real exports are: pincodes, users and dealers are
+drawn from Zipf-like distributions, so a few pincodes hold most users and
+dealers, a few users make most requests and a few dealers receive most deals.
+Files are written in chunks of ``CHUNK_ROWS`` rows so even 10M-row exports
+are generated in bounded memory, and the same ``rows`` and ``seed`` always
+produce the same files. A ``synthetic.json`` manifest records both; a folder
+whose manifest matches is reused as is.
+"""
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+USERS_PER_DEAL = 0.25
+DEALERS_PER_DEAL = 0.02
+CHUNK_ROWS = 1_000_000
+MANIFEST = 'synthetic.json'
+# Exponent of the rank-frequency distributions; 1 is classic Zipf.
+SKEW = 1.1
+
+# Pincodes and cities the geocoder knows; generated pincodes beyond these
+# exercise the gazetteer and city fallbacks.
+KNOWN_PINCODES = ['400078', '410206', '401105', '360001', '421301', '400003', '401303', '400705', '421204',
+                  '400072', '400092', '400104', '400607', '400089', '400701', '400602', '401101', '400065',
+                  '400601', '400706', '400101', '421202', '833214']
+CITIES = ['Mumbai', 'Thane', 'Navi Mumbai', 'Rajkot', 'Kalyan', 'Dombivli', 'Mira Bhayandar', 'Virar', 'Vashi', 'Sion']
+CATEGORIES = ['Kitchen Sinks', 'Paint', 'Tiles', 'Sanitaryware', 'Plumbing', 'Electricals', 'Plywood', 'Hardware',
+              'Lighting', 'Modular Kitchen', 'Bath Fittings', 'Cement']
+SUBCATEGORIES = ['Taps', 'Sinks', 'Floor Tiles', 'Wall Tiles', 'Emulsion', 'Primer', 'Wires', 'Switches', 'Pipes',
+                 'Laminates', 'Hinges', 'LED Panels']
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Ayaan', 'Krishna', 'Ishaan',
+               'Ananya', 'Diya', 'Aadhya', 'Saanvi', 'Pari', 'Myra', 'Anika', 'Navya', 'Riya', 'Kavya']
+LAST_NAMES = ['Sharma', 'Patel', 'Shah', 'Mehta', 'Joshi', 'Desai', 'Kulkarni', 'Iyer', 'Nair', 'Reddy',
+              'Gupta', 'Singh', 'Khan', 'Pawar', 'Jadhav', 'Shinde', 'Naik', 'Rao', 'Bhat', 'Kapoor']
+# Deals and sign-ups fall in the months before the date the dashboard treats as today.
+START_EPOCH = int(pd.Timestamp('2025-01-01').timestamp())
+END_EPOCH = int(pd.Timestamp('2025-04-15').timestamp())
+# Share of deals naming their dealer only by id, which sends the relational map to the id lookup.
+DEALER_ID_ONLY = 0.3
+
+_SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([km]?)\s*$', re.IGNORECASE)
+
+
+def parse_rows(text):
+    """Row count for ``'10k'``, ``'1m'``, ``'2.5M'`` or a plain number."""
+    match = _SIZE.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid row count: {text}")
+    number, unit = match.groups()
+    return int(float(number) * {'': 1, 'k': 1_000, 'm': 1_000_000}[unit.lower()])
+
+
+def _weights(n):
+    weights = 1.0 / np.arange(1, n + 1) ** SKEW
+    return weights / weights.sum()
+
+
+def _pincodes(rng, rows):
+    count = min(max(rows // 500, 50), 3000)
+    generated = rng.choice(np.arange(400001, 422000), count, replace=False).astype(str)
+    pool = list(dict.fromkeys([*KNOWN_PINCODES, *generated]))[:max(count, len(KNOWN_PINCODES))]
+    # Shuffle the tail only, so the busiest pincodes are ones the geocoder knows.
+    head, tail = pool[:5], pool[5:]
+    return np.array(head + list(rng.permutation(tail)), dtype=object)
+
+
+def _joined(rng, choices, n, most):
+    """``' | '``-separated picks of 1 to ``most`` distinct ``choices`` per row."""
+    counts = rng.integers(1, most + 1, n)
+    picks = rng.choice(len(choices), (n, most), p=_weights(len(choices)))
+    choices = np.asarray(choices, dtype=object)
+    return [' | '.join(dict.fromkeys(choices[row[:count]])) for row, count in zip(picks, counts)]
+
+
+def _write(df, path, first):
+    df.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+
+
+def _chunks(total):
+    for start in range(0, total, CHUNK_ROWS):
+        yield start, min(CHUNK_ROWS, total - start)
+
+
+def _users(rng, path, count, pincodes):
+    """Write the users export; returns per-user names, pincodes and cities for the deal exports."""
+    pincode_codes = rng.choice(len(pincodes), count, p=_weights(len(pincodes)))
+    city_codes = rng.integers(0, len(CITIES), count)
+    ids = np.arange(count)
+    names = (pd.Series(np.asarray(FIRST_NAMES, dtype=object)[ids % len(FIRST_NAMES)]) + ' '
+             + pd.Series(np.asarray(LAST_NAMES, dtype=object)[(ids // len(FIRST_NAMES)) % len(LAST_NAMES)])
+             + ' ' + pd.Series(ids).astype(str)).to_numpy(dtype=object)
+    for start, n in _chunks(count):
+        part = slice(start, start + n)
+        _write(pd.DataFrame({
+            'userid': pd.Series(ids[part]).map('u{:08d}'.format),
+            'pincode': pincodes[pincode_codes[part]],
+            'locality': np.where(rng.random(n) < 0.1, None, np.asarray(CITIES, dtype=object)[city_codes[part]]),
+            'state': 'Maharashtra',
+            'createEpoch': rng.integers(START_EPOCH, END_EPOCH, n),
+            'name': names[part],
+            'phone': rng.integers(7_000_000_000, 9_999_999_999, n)
+        }), path, start == 0)
+    return names, pincodes[pincode_codes], np.asarray(CITIES, dtype=object)[city_codes]
+
+
+def _dealers(rng, path, count, pincodes):
+    """Write the dealers export; returns the dealer names."""
+    names = np.array([f'Dealer {i} {LAST_NAMES[i % len(LAST_NAMES)]} Traders' for i in range(count)], dtype=object)
+    for start, n in _chunks(count):
+        codes = rng.choice(len(pincodes), n, p=_weights(len(pincodes)))
+        images = [' | '.join(f'https://img.example.com/d{start + i}/{j}.jpg' for j in range(k)) or None
+                  for i, k in enumerate(rng.integers(0, 4, n))]
+        _write(pd.DataFrame({
+            '_id': [f'd{i:07d}' for i in range(start, start + n)],
+            'coname': names[start:start + n],
+            'pincode': pincodes[codes],
+            'phone_no': rng.integers(7_000_000_000, 9_999_999_999, n),
+            'cat_disp_names': _joined(rng, CATEGORIES, n, 3),
+            'subcat_disp_names': _joined(rng, SUBCATEGORIES, n, 3),
+            'lat': np.round(18.9 + rng.random(n) * 0.6, 6),
+            'long': np.round(72.8 + rng.random(n) * 0.4, 6),
+            'addr1': [f'Shop {i % 200 + 1}' for i in range(start, start + n)],
+            'addr2': 'Main Road',
+            'landmark': 'Near Station',
+            'city': rng.choice(CITIES, n),
+            'Imgurl': images
+        }), path, start == 0)
+    return names
+
+
+def _deals(rng, path, rows, prefix, users, dealer_names):
+    user_names, user_pincodes, user_cities = users
+    user_weights = _weights(len(user_names))
+    dealer_weights = _weights(len(dealer_names))
+    for start, n in _chunks(rows):
+        who = rng.choice(len(user_names), n, p=user_weights)
+        dealer = rng.choice(len(dealer_names), n, p=dealer_weights)
+        created = pd.to_datetime(rng.integers(START_EPOCH, END_EPOCH, n), unit='s')
+        _write(pd.DataFrame({
+            '_id': pd.Series(np.arange(start, start + n)).map(f'{prefix}{{:09d}}'.format),
+            'user_id': pd.Series(who).map('u{:08d}'.format),
+            'user_name': user_names[who],
+            'user_pincode': pd.Series(user_cities[who]) + ', ' + pd.Series(user_pincodes[who]),
+            'req_qty': rng.geometric(0.35, n) - 1,
+            'created_at': created.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'dealerinfo.coname': np.where(rng.random(n) < DEALER_ID_ONLY, None, dealer_names[dealer]),
+            'dealerinfo.dealer_id': pd.Series(dealer).map('d{:07d}'.format)
+        }), path, start == 0)
+
+
+def generate(folder, rows, seed=0):
+    """Write the four synthetic exports for ``rows`` deal rows into ``folder``.
+
+    Returns the manifest: ``rows``, ``seed`` and per file its path, row count
+    and size in bytes. Files already generated with the same ``rows`` and
+    ``seed`` are kept.
+    """
+    os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(folder, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get('rows'), manifest.get('seed')) == (rows, seed) and \
+                all(os.path.exists(entry['path']) for entry in manifest['files'].values()):
+            return manifest
+    rng = np.random.default_rng(seed)
+    counts = {
+        'users': max(int(rows * USERS_PER_DEAL), 10),
+        'dealers': max(int(rows * DEALERS_PER_DEAL), 20),
+        'deals': rows,
+        'deals_full': rows
+    }
+    paths = {name: os.path.join(folder, f'{name}.csv') for name in counts}
+    pincodes = _pincodes(rng, rows)
+    users = _users(rng, paths['users'], counts['users'], pincodes)
+    dealer_names = _dealers(rng, paths['dealers'], counts['dealers'], pincodes)
+    _deals(rng, paths['deals'], rows, 'x', users, dealer_names)
+    _deals(rng, paths['deals_full'], rows, 'f', users, dealer_names)
+    manifest = {
+        'rows': rows,
+        'seed': seed,
+        'files': {name: {'path': paths[name], 'rows': counts[name], 'bytes': os.path.getsize(paths[name])}
+                  for name in counts}
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Generated synthetic exports for {rows} rows in {folder}")
+    return manifest